@@ -1,22 +1,49 @@
 ﻿"""
 API Flask pour le système de recommandation FP-Growth
 """
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, g
 from flask_cors import CORS
 import os
 import time
+import logging
 from datetime import datetime
 
 # Imports des modules locaux
 from database import db
 from data_loader import data_loader
-from fpgrowth_engine import fpgrowth_engine
+from fpgrowth_engine import fpgrowth_engine, FPGrowthEngine, MINING_MODES
+from rule_index import RULE_SIDES, RULE_SORTS
+from serialization import json_response, encode_cursor, decode_cursor, RESPONSE_FORMATS
+from rule_graph import rule_graph_cache, EDGE_METRICS
+from model_store import model_store, SERVING_MODE
+from model_snapshot import model_registry
+from cooccurrence import CooccurrenceModel, SIMILARITY_METRICS
+from materialized import materialize, model_rule_arrays, MATERIALIZE_MAX_LENGTH, MATERIALIZE_TIME_FRACTION
+from cart_sessions import cart_sessions
+from recommend_batcher import recommend_batcher
 from recommender import recommender
-from llm_service import llm_service
+from llm_service import llm_service, LLM_MAX_WORKERS
 from products_manager import products_manager
+from chatbot_pipeline import chatbot_pipeline
+from memory_report import memory_report, memory_guard
+from time_window import time_window
+from segments import segment_models, SEGMENT_COLUMNS
+from customer_history import customer_history, ANONYMOUS_CUSTOMER_ID
+from vocabulary import item_vocabulary
+import out_of_core
+import sampling
+from metrics import (
+    registry, timed_stage, log_event,
+    HTTP_REQUESTS, HTTP_DURATION, HTTP_IN_FLIGHT, MODEL_SIZE
+)
 import pandas as pd
 import uuid
 
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    format='%(asctime)s %(name)s %(levelname)s %(message)s'
+)
+
 # Initialisation de l'application Flask
 # On configure le dossier static pour pointer vers le dossier frontend
 app = Flask(__name__, static_folder='../frontend', static_url_path='')
@@ -46,6 +73,33 @@ def serve_static(path):
 # def serve_product_image(filename):
 #     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
+# ============================================================================
+# MÉTRIQUES
+# ============================================================================
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    # La règle de routage (et non l'URL) garde une cardinalité faible
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    HTTP_DURATION.observe(time.perf_counter() - g.request_start, route=route, method=request.method)
+    return response
+
+@app.teardown_request
+def end_request(exc=None):
+    if 'request_start' in g:
+        HTTP_IN_FLIGHT.dec()
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Exporter les métriques au format Prometheus"""
+    return registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 # État de l'application
 app_state = {
     'data_loaded': False,
@@ -53,6 +107,20 @@ app_state = {
     'last_analysis': None
 }
 
+def pinned_model():
+    """
+    Instantané du modèle épinglé pour toute la durée de la requête
+    
+    Lu une seule fois (sans verrou) : une analyse publiée pendant la requête
+    ne change pas le modèle qu'elle utilise. None si aucune analyse.
+    
+    Mode multi-processus : génération publiée (SharedModel, servie sur les
+    tableaux mappés), quel que soit le worker qui a effectué l'analyse.
+    """
+    if 'model' not in g:
+        g.model = model_store.current() if SERVING_MODE == 'shared' else model_registry.current
+    return g.model
+
 # ============================================================================
 # ROUTES DE SANTÉ ET INFORMATION
 # ============================================================================
@@ -64,7 +132,9 @@ def health_check():
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'data_loaded': app_state['data_loaded'],
-        'analysis_done': app_state['analysis_done']
+        'analysis_done': app_state['analysis_done'],
+        'recommend_batching': recommend_batcher.stats(),
+        'cart_sessions': cart_sessions.stats()
     })
 
 @app.route('/api/info', methods=['GET'])
@@ -203,13 +273,16 @@ def checkout():
     try:
         data = request.get_json()
         cart_items = data.get('items', [])
+        # Sans customer_id, la commande est anonyme : ID générique en base, pas d'historique
+        anonymous = data.get('customer_id') is None
+        customer_id = ANONYMOUS_CUSTOMER_ID if anonymous else data['customer_id']
         
         if not cart_items:
             return jsonify({'success': False, 'error': 'Panier vide'}), 400
             
-        # Créer une nouvelle facture (InvoiceNo)
-        # On utilise un timestamp ou un ID unique
-        invoice_no = f"NEW-{int(time.time())}"
+        # Créer une nouvelle facture (InvoiceNo) : horodatage + suffixe aléatoire,
+        # deux commandes de la même seconde ont des numéros distincts
+        invoice_no = f"NEW-{int(time.time())}-{uuid.uuid4().hex[:8].upper()}"
         invoice_date = datetime.now()
         
         # Préparer les données pour le DataFrame
@@ -222,7 +295,7 @@ def checkout():
                 'Quantity': int(item.get('quantity', 1)),
                 'InvoiceDate': invoice_date,
                 'UnitPrice': float(item.get('price', 0)),
-                'CustomerID': 99999, # ID générique pour les nouveaux clients
+                'CustomerID': customer_id,
                 'Country': 'France'
             })
             
@@ -231,6 +304,12 @@ def checkout():
         # Insérer dans la base de données
         db.insert_transactions(df_new)
         
+        # Mise à jour incrémentale des index : partition du jour, historique du client
+        if len(time_window) > 0:
+            time_window.add_transactions(df_new)
+        if len(customer_history) > 0 and not anonymous:
+            customer_history.add_transactions(df_new)
+        
         # Mettre à jour le DataLoader en mémoire si nécessaire
         # (Optionnel : on pourrait recharger tout, mais c'est lourd. 
         # Pour l'instant, on suppose que le prochain rechargement prendra les nouvelles données)
@@ -259,7 +338,7 @@ def load_data():
         
         # Vérifier si les données sont déjà en mémoire
         if data_loader.df is not None and not data_loader.df.empty:
-            print("✓ Données déjà présentes en mémoire, rechargement évité")
+            log_event('load_skipped', source='memory', rows=len(data_loader.df))
             stats = data_loader.get_statistics()
             app_state['data_loaded'] = True
             
@@ -274,11 +353,19 @@ def load_data():
         # Sinon, charger les données
         data_loader.load_data()
         
-        # Nettoyer les données
+        # Nettoyer les données (et les insérer dans la base si elle est vide)
         df = data_loader.clean_data()
+        MODEL_SIZE.set(len(df), kind='transactions')
         
-        # Insérer dans la base de données
-        db.insert_transactions(df)
+        # Résumés journaliers pour l'extraction par fenêtre temporelle
+        with timed_stage('partition') as info:
+            time_window.rebuild(df)
+            info['rows'] = len(time_window)
+        
+        # Historique d'achat par client pour les recommandations personnalisées
+        with timed_stage('customer_index') as info:
+            customer_history.rebuild(df)
+            info['rows'] = len(customer_history)
         
         # Obtenir les statistiques
         stats = data_loader.get_statistics()
@@ -310,6 +397,15 @@ def clear_data():
         
         # Réinitialiser la mémoire
         data_loader.df = None
+        time_window.clear()
+        segment_models.clear()
+        customer_history.clear()
+        rule_graph_cache.clear()
+        model_registry.clear()
+        model_rule_arrays.clear()
+        cart_sessions.clear()
+        if SERVING_MODE == 'shared':
+            model_store.clear()
         
         # Mettre à jour l'état
         app_state['data_loaded'] = False
@@ -343,7 +439,12 @@ def get_stats():
         return jsonify({
             'success': True,
             'data_stats': stats,
-            'database_stats': db_stats
+            'database_stats': db_stats,
+            'index_stats': {
+                'time_window': time_window.describe(),
+                'customer_history': customer_history.describe(),
+                'vocabulary': item_vocabulary.describe()
+            }
         })
     
     except Exception as e:
@@ -352,6 +453,32 @@ def get_stats():
             'error': str(e)
         }), 500
 
+@app.route('/api/memory', methods=['GET'])
+def get_memory_report():
+    """Obtenir l'empreinte mémoire des données et du modèle"""
+    try:
+        # Modèle en mémoire de ce processus (le modèle partagé est décrit à part)
+        model = model_registry.current
+        response = {
+            'success': True,
+            'memory': memory_report(
+                data_loader,
+                model.engine if model is not None else fpgrowth_engine,
+                model.recommender if model is not None else recommender
+            )
+        }
+        # Mode multi-processus : génération attachée par ce worker (pages partagées)
+        if SERVING_MODE == 'shared':
+            shared = model_store.current()
+            response['shared_model'] = shared.describe() if shared is not None else None
+        return jsonify(response)
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/top-products', methods=['GET'])
 def get_top_products():
     """Obtenir les produits les plus vendus"""
@@ -381,50 +508,309 @@ def get_top_products():
 # ROUTES D'ANALYSE FP-GROWTH
 # ============================================================================
 
+def _threshold_params(data):
+    """
+    Seuils min_support et min_confidence d'une requête d'analyse
+    
+    Returns:
+        (min_support, min_confidence)
+    """
+    min_support = data.get('min_support', 0.01)
+    min_confidence = data.get('min_confidence', 0.5)
+    if isinstance(min_support, bool) or not isinstance(min_support, (int, float)) or not 0 < min_support <= 1:
+        raise ValueError('min_support doit être compris entre 0 (exclu) et 1')
+    if isinstance(min_confidence, bool) or not isinstance(min_confidence, (int, float)) or not 0 <= min_confidence <= 1:
+        raise ValueError('min_confidence doit être compris entre 0 et 1')
+    return min_support, min_confidence
+
 @app.route('/api/analyze', methods=['POST'])
 def analyze_fpgrowth():
     """Effectuer l'analyse FP-Growth"""
     try:
-        if not app_state['data_loaded']:
+        start_time = time.time()
+        
+        # Récupérer les paramètres
+        data = request.get_json() or {}
+        use_out_of_core = bool(data.get('out_of_core'))
+        
+        # Hors mémoire, les transactions sont lues en flux depuis PostgreSQL
+        if not app_state['data_loaded'] and not use_out_of_core:
             return jsonify({
                 'success': False,
                 'error': 'Les données doivent être chargées d\'abord'
             }), 400
         
-        start_time = time.time()
+        try:
+            min_support, min_confidence = _threshold_params(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        top_k = data.get('top_k')
+        min_length = data.get('min_length', 1)
+        mode = data.get('mode', 'support')
+        window_days = data.get('window_days')
+        segment_by = data.get('segment_by')
+        
+        if segment_by is not None and segment_by not in SEGMENT_COLUMNS:
+            return jsonify({
+                'success': False,
+                'error': f"segment_by doit être l'un de {', '.join(SEGMENT_COLUMNS)}"
+            }), 400
         
-        # Récupérer les paramètres
-        data = request.get_json() or {}
-        min_support = data.get('min_support', 0.01)
-        min_confidence = data.get('min_confidence', 0.5)
+        if mode not in MINING_MODES:
+            return jsonify({
+                'success': False,
+                'error': f"mode doit être l'un de {', '.join(MINING_MODES)}"
+            }), 400
+        
+        if top_k is not None and (not isinstance(top_k, int) or top_k <= 0):
+            return jsonify({
+                'success': False,
+                'error': 'top_k doit être un entier positif'
+            }), 400
         
-        # Configurer le moteur
-        fpgrowth_engine.min_support = min_support
-        fpgrowth_engine.min_confidence = min_confidence
+        if isinstance(min_length, bool) or not isinstance(min_length, int) or min_length < 1:
+            return jsonify({
+                'success': False,
+                'error': 'min_length doit être un entier positif'
+            }), 400
+        
+        if top_k and mode != 'support':
+            return jsonify({
+                'success': False,
+                'error': 'top_k ne se combine pas avec un autre mode que support'
+            }), 400
+        
+        materialize_length = data.get('materialize_length', MATERIALIZE_MAX_LENGTH)
+        if isinstance(materialize_length, bool) or not isinstance(materialize_length, int) or materialize_length < 0:
+            return jsonify({
+                'success': False,
+                'error': 'materialize_length doit être un entier positif ou nul'
+            }), 400
+        
+        window = None
+        if window_days is not None:
+            if not isinstance(window_days, int) or window_days <= 0:
+                return jsonify({
+                    'success': False,
+                    'error': 'window_days doit être un entier positif'
+                }), 400
+            if top_k or mode != 'support' or use_out_of_core:
+                return jsonify({
+                    'success': False,
+                    'error': 'window_days ne se combine pas avec top_k, out_of_core ni avec un autre mode que support'
+                }), 400
+            # Les partitions journalières sont construites au chargement ;
+            # à défaut (données déjà en mémoire), une seule fois ici
+            if len(time_window) == 0:
+                time_window.rebuild(data_loader.df)
+            window = {
+                'window_index': time_window,
+                'days': window_days,
+                'end': data.get('window_end'),
+                'half_life_days': data.get('half_life_days')
+            }
+        
+        partitioned = None
+        if use_out_of_core:
+            if top_k or mode != 'support' or window or segment_by:
+                return jsonify({
+                    'success': False,
+                    'error': 'out_of_core ne se combine pas avec top_k, window_days, segment_by ni un autre mode que support'
+                }), 400
+            partition_mb = data.get('partition_mb')
+            if partition_mb is not None and (not isinstance(partition_mb, (int, float)) or partition_mb <= 0):
+                return jsonify({
+                    'success': False,
+                    'error': 'partition_mb doit être un nombre positif'
+                }), 400
+            # Les transactions sont relues en flux depuis PostgreSQL, par partitions
+            partitioned = {
+                'source': out_of_core.db_source(db),
+                'budget_bytes': int(partition_mb * 1024 * 1024) if partition_mb else None
+            }
+        
+        # Préparer les données (inutile en mode fenêtre ou hors mémoire)
+        basket_df = None if window or partitioned else data_loader.get_transaction_dataframe()
+        
+        # Vérifier le budget mémoire (refus ou relèvement de min_support)
+        # En mode top-K, la taille du résultat est bornée par top_k ;
+        # hors mémoire, par la taille des partitions
+        if top_k or window or partitioned:
+            guard = {'allowed': True, 'action': 'not_applicable', 'min_support': min_support}
+        else:
+            guard = memory_guard.check(basket_df, min_support)
+        if not guard['allowed']:
+            return jsonify({
+                'success': False,
+                'error': 'Analyse refusée : la mémoire projetée dépasse le budget configuré',
+                'memory_guard': guard
+            }), 400
+        min_support = guard['min_support']
         
-        # Préparer les données
-        basket_df = data_loader.get_transaction_dataframe()
+        # Moteur neuf : le modèle servi n'est jamais modifié pendant l'analyse
+        engine = FPGrowthEngine(min_support, min_confidence, vocabulary=fpgrowth_engine.vocabulary)
         
         # Effectuer l'analyse
-        results = fpgrowth_engine.analyze(basket_df)
+        mining_start = time.time()
+        results = engine.analyze(
+            basket_df,
+            top_k=top_k,
+            min_length=min_length,
+            mode=mode,
+            compact=data.get('compact'),
+            window=window,
+            out_of_core=partitioned
+        )
+        mining_seconds = time.time() - mining_start
         
         # Sauvegarder dans la base de données
-        db.save_frequent_itemsets(results['itemsets'])
-        db.save_association_rules(results['rules'])
-        
-        # Configurer le recommender
-        recommender.set_rules(results['rules'])
+        with timed_stage('db_save', table='frequent_itemsets') as info:
+            db.save_frequent_itemsets(results['itemsets'], engine.vocabulary)
+            info['rows'] = len(results['itemsets'])
+        with timed_stage('db_save', table='association_rules') as info:
+            db.save_association_rules(results['rules'], engine.vocabulary)
+            info['rows'] = len(results['rules'])
+        MODEL_SIZE.set(len(results['itemsets']), kind='itemsets')
+        MODEL_SIZE.set(len(results['rules']), kind='rules')
+        
+        # Co-occurrences item-item (XᵀX), reconstruites à chaque analyse
+        cooccurrence = None
+        if basket_df is not None:
+            with timed_stage('cooccurrence') as info:
+                cooccurrence = CooccurrenceModel(basket_df, engine.vocabulary)
+                info['rows'] = cooccurrence.describe()['pairs']
+        
+        # Top-N des itemsets fréquents courts, dans un budget proportionnel à l'extraction
+        materialized = None
+        if materialize_length and engine.rules is not None and len(engine.rules) > 0:
+            with timed_stage('materialize') as info:
+                materialized = materialize(
+                    engine.rules,
+                    engine.frequent_itemsets,
+                    max_length=materialize_length,
+                    time_budget=MATERIALIZE_TIME_FRACTION * mining_seconds
+                )
+                info['rows'] = len(materialized)
+        
+        # Publier l'instantané (échange atomique) : les requêtes en cours
+        # terminent sur l'ancien modèle, les suivantes voient le nouveau
+        model = model_registry.publish(engine, {
+            'min_support': min_support,
+            'min_confidence': min_confidence,
+            'mode': engine.mode,
+            'top_k': top_k
+        }, cooccurrence, materialized)
+        
+        # Mode multi-processus : publier le modèle pour tous les workers
+        generation = None
+        if SERVING_MODE == 'shared':
+            with timed_stage('publish') as info:
+                generation = model_store.publish(results['rules'], results['itemsets'], {
+                    'min_support': min_support,
+                    'min_confidence': min_confidence,
+                    'mode': engine.mode,
+                    'top_k': top_k
+                }, materialized, cooccurrence)
+                info['generation'] = generation
         
         app_state['analysis_done'] = True
         app_state['last_analysis'] = datetime.now().isoformat()
         
         elapsed_time = time.time() - start_time
         
-        return jsonify({
+        response = {
             'success': True,
             'message': 'Analyse FP-Growth terminée avec succès',
             'stats': results['stats'],
-            'elapsed_time': f'{elapsed_time:.2f}s'
+            'elapsed_time': f'{elapsed_time:.2f}s',
+            # Hors mémoire, les transactions ne sont pas en mémoire (pas de parcours du DataFrame)
+            'memory': memory_report(data_loader, engine, model.recommender) if partitioned is None else None,
+            'memory_guard': guard,
+            'version': model.version,
+            'materialized': materialized.describe() if materialized is not None else None
+        }
+        if generation is not None:
+            response['generation'] = generation
+        
+        # Un modèle par segment (processus parallèles), en plus du modèle global
+        if segment_by:
+            with timed_stage('segments', column=segment_by) as info:
+                response['segments'] = segment_models.analyze(
+                    data_loader.df,
+                    column=segment_by,
+                    min_support=min_support,
+                    min_confidence=min_confidence,
+                    min_invoices=data.get('min_segment_invoices', 200)
+                )
+                info['rows'] = len(response['segments']['segments'])
+        
+        # Comparer taille et temps des modes complet / fermé / maximal
+        if data.get('compare_modes') and basket_df is not None:
+            response['mode_comparison'] = engine.compare_modes(basket_df)
+        
+        return jsonify(response)
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/analyze/preview', methods=['POST'])
+def preview_fpgrowth():
+    """Aperçu rapide des itemsets et règles sur un échantillon de factures"""
+    try:
+        if not app_state['data_loaded']:
+            return jsonify({
+                'success': False,
+                'error': 'Les données doivent être chargées d\'abord'
+            }), 400
+        
+        data = request.get_json() or {}
+        epsilon = data.get('epsilon')
+        delta = data.get('delta', 0.05)
+        top_n = data.get('top_n', 20)
+        
+        for name, value in (('epsilon', epsilon), ('delta', delta)):
+            if value is None and name == 'epsilon':
+                continue
+            if not isinstance(value, (int, float)) or not 0 < value < 1:
+                return jsonify({
+                    'success': False,
+                    'error': f'{name} doit être compris entre 0 et 1'
+                }), 400
+        
+        try:
+            min_support, min_confidence = _threshold_params(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        verify = bool(data.get('verify', False))
+        seed = data.get('seed', 42)
+        
+        # Moteur séparé : l'aperçu ne remplace pas le modèle servi
+        engine = FPGrowthEngine(min_support, min_confidence, fpgrowth_engine.vocabulary)
+        if verify:
+            # La vérification compte les candidats sur toutes les factures
+            preview = engine.preview(
+                data_loader.get_transaction_dataframe(),
+                epsilon=epsilon, delta=delta, verify=True, seed=seed
+            )
+        else:
+            # Seules les factures tirées sont encodées
+            epsilon, n_sample = sampling.plan_sample(
+                data_loader.df['InvoiceNo'].nunique(), min_support, epsilon, delta
+            )
+            sample_df, n_invoices = data_loader.sample_transaction_dataframe(n_sample, seed)
+            preview = engine.preview(
+                sample_df, epsilon=epsilon, delta=delta, n_invoices=n_invoices
+            )
+        
+        return jsonify({
+            'success': True,
+            'report': preview['report'],
+            'itemsets': engine.format_itemsets_for_json(preview['itemsets'].head(top_n)),
+            'rules': engine.format_rules_for_json(preview['rules'].head(top_n))
         })
     
     except Exception as e:
@@ -433,27 +819,61 @@ def analyze_fpgrowth():
             'error': str(e)
         }), 500
 
+def _page_params(default_limit=20):
+    """
+    Paramètres de pagination communs : taille de page, curseur et forme de réponse
+    
+    top_n reste accepté comme taille de page ; le curseur reprend la
+    position où la page précédente s'est arrêtée, pour la même version du modèle.
+    
+    Returns:
+        (offset, limit, shape)
+    """
+    limit = request.args.get('limit', default=request.args.get('top_n', default=default_limit, type=int), type=int)
+    shape = request.args.get('format', default='rows')
+    if limit <= 0:
+        raise ValueError('limit doit être un entier positif')
+    if shape not in RESPONSE_FORMATS:
+        raise ValueError(f"format doit être l'un de {', '.join(RESPONSE_FORMATS)}")
+    cursor = request.args.get('cursor')
+    offset = decode_cursor(cursor, pinned_model().version) if cursor else 0
+    return offset, limit, shape
+
+def _next_cursor(offset, limit, matched):
+    if offset + limit >= matched:
+        return None
+    return encode_cursor(pinned_model().version, offset + limit)
+
 @app.route('/api/itemsets', methods=['GET'])
 def get_itemsets():
-    """Obtenir les itemsets fréquents"""
+    """Obtenir les itemsets fréquents (filtrés et paginés côté serveur)"""
     try:
-        if not app_state['analysis_done']:
+        model = pinned_model()
+        if model is None:
             return jsonify({
                 'success': False,
                 'error': 'L\'analyse doit être effectuée d\'abord'
             }), 400
         
         # Paramètres
-        top_n = request.args.get('top_n', default=20, type=int)
+        try:
+            offset, limit, shape = _page_params()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         min_length = request.args.get('min_length', default=2, type=int)
+        max_length = request.args.get('max_length', type=int)
+        min_support = request.args.get('min_support', type=float)
         
-        # Obtenir les itemsets
-        top_itemsets = fpgrowth_engine.get_top_itemsets(top_n, min_length)
+        # Positions des itemsets retenus, par support décroissant
+        positions = model.engine.filter_itemsets(min_support, min_length, max_length)
+        page = positions[offset:offset + limit]
         
-        return jsonify({
+        return json_response({
             'success': True,
-            'itemsets': fpgrowth_engine.format_itemsets_for_json(top_itemsets),
-            'total': len(fpgrowth_engine.frequent_itemsets)
+            'itemsets': model.engine.format_itemsets_for_json(positions=page, shape=shape),
+            'total': model.n_itemsets,
+            'matched': len(positions),
+            'next_cursor': _next_cursor(offset, limit, len(positions))
         })
     
     except Exception as e:
@@ -464,25 +884,143 @@ def get_itemsets():
 
 @app.route('/api/rules', methods=['GET'])
 def get_rules():
-    """Obtenir les règles d'association"""
+    """Obtenir les règles d'association (filtrées et paginées côté serveur)"""
     try:
-        if not app_state['analysis_done']:
+        model = pinned_model()
+        if model is None:
             return jsonify({
                 'success': False,
                 'error': 'L\'analyse doit être effectuée d\'abord'
             }), 400
         
         # Paramètres
-        top_n = request.args.get('top_n', default=20, type=int)
+        try:
+            offset, limit, shape = _page_params()
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         min_lift = request.args.get('min_lift', default=1.0, type=float)
+        min_confidence = request.args.get('min_confidence', type=float)
+        min_length = request.args.get('min_length', type=int)
+        max_length = request.args.get('max_length', type=int)
+        
+        # Positions des règles retenues, par confiance puis lift
+        positions = model.engine.filter_rules(min_lift, min_confidence, min_length, max_length)
+        page = positions[offset:offset + limit]
+        
+        return json_response({
+            'success': True,
+            'rules': model.engine.format_rules_for_json(positions=page, shape=shape),
+            'total': model.n_rules,
+            'matched': len(positions),
+            'next_cursor': _next_cursor(offset, limit, len(positions))
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/rules/graph', methods=['GET'])
+def get_rules_graph():
+    """Graphe agrégé des items (nœuds et arcs) construit à partir de toutes les règles"""
+    try:
+        model = pinned_model()
+        if model is None:
+            return jsonify({
+                'success': False,
+                'error': 'L\'analyse doit être effectuée d\'abord'
+            }), 400
         
-        # Obtenir les règles
-        top_rules = fpgrowth_engine.get_top_rules(top_n, min_lift)
+        # Paramètres d'élagage et de voisinage
+        params = {
+            'top_edges': request.args.get('top_edges', type=int),
+            'metric': request.args.get('metric', default='lift'),
+            'min_lift': request.args.get('min_lift', type=float),
+            'community': request.args.get('community', type=int),
+            'item': None,
+            'depth': request.args.get('depth', default=1, type=int)
+        }
+        if params['metric'] not in EDGE_METRICS:
+            return jsonify({
+                'success': False,
+                'error': f"metric doit être l'un de {', '.join(EDGE_METRICS)}"
+            }), 400
+        if (params['top_edges'] is not None and params['top_edges'] <= 0) or not 1 <= params['depth'] <= 3:
+            return jsonify({
+                'success': False,
+                'error': 'top_edges doit être positif et depth compris entre 1 et 3'
+            }), 400
         
+        item = request.args.get('item')
+        if item is not None:
+            params['item'] = model.engine.item_id(item)
+            if params['item'] is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'Item inconnu: {item}'
+                }), 404
+        
+        # Graphe construit une fois par analyse, vues encodées en cache
+        body, etag = rule_graph_cache.view(
+            model.version,
+            model.rule_graph,
+            model.vocabulary,
+            **params
+        )
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        # 304 sans corps si le client a déjà cette version (If-None-Match)
+        return response.make_conditional(request)
+    
+    except Exception as e:
         return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/rules/item/<path:name>', methods=['GET'])
+def get_rules_for_item(name):
+    """Règles contenant un item, paginées et triées côté serveur"""
+    try:
+        model = pinned_model()
+        if model is None:
+            return jsonify({
+                'success': False,
+                'error': 'L\'analyse doit être effectuée d\'abord'
+            }), 400
+        
+        # Paramètres
+        side = request.args.get('side', default='any')
+        sort = request.args.get('sort', default='confidence')
+        offset = request.args.get('offset', default=0, type=int)
+        limit = request.args.get('limit', default=20, type=int)
+        
+        if side not in RULE_SIDES or sort not in RULE_SORTS:
+            return jsonify({
+                'success': False,
+                'error': f"side doit être l'un de {', '.join(RULE_SIDES)} et sort l'un de {', '.join(RULE_SORTS)}"
+            }), 400
+        if offset < 0 or not 0 < limit <= 500:
+            return jsonify({
+                'success': False,
+                'error': 'offset doit être positif et limit compris entre 1 et 500'
+            }), 400
+        
+        rules = model.engine.get_rules_for_item(name, side, sort, offset, limit)
+        total = model.engine.count_rules_for_item(name, side)
+        
+        return json_response({
             'success': True,
-            'rules': fpgrowth_engine.format_rules_for_json(top_rules),
-            'total': len(fpgrowth_engine.rules)
+            'item': name,
+            'side': side,
+            'sort': sort,
+            'rules': model.engine.format_rules_for_json(rules),
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'next_offset': offset + limit if offset + limit < total else None
         })
     
     except Exception as e:
@@ -499,7 +1037,10 @@ def get_rules():
 def get_recommendations():
     """Obtenir des recommandations basées sur des items"""
     try:
-        if not app_state['analysis_done']:
+        # Mode multi-processus : le modèle publié peut venir d'un autre worker
+        model = pinned_model()
+        shared = model if SERVING_MODE == 'shared' else None
+        if model is None:
             return jsonify({
                 'success': False,
                 'error': 'L\'analyse doit être effectuée d\'abord'
@@ -510,6 +1051,29 @@ def get_recommendations():
         items = data.get('items', [])
         top_n = data.get('top_n', 5)
         min_confidence = data.get('min_confidence', 0.5)
+        segment = data.get('segment')
+        customer_id = data.get('customer_id')
+        session_id = data.get('session_id')
+        
+        # Modèles par segment et historique client sont construits dans le
+        # processus de l'analyse ou du chargement : les autres workers ne les ont pas
+        if shared is not None and (segment is not None or customer_id is not None):
+            return jsonify({
+                'success': False,
+                'error': 'segment et customer_id ne sont pas disponibles en mode multi-processus (SERVING_MODE=shared)'
+            }), 400
+        
+        # Mode personnalisé : le panier est complété par l'historique récent du client
+        history_items = []
+        if customer_id is not None:
+            if len(customer_history) == 0 and data_loader.df is not None:
+                customer_history.rebuild(data_loader.df)
+            history_items = customer_history.history(
+                customer_id,
+                max_invoices=data.get('history_invoices'),
+                days=data.get('history_days')
+            )
+            items = list(dict.fromkeys(list(items) + history_items))
         
         if not items:
             return jsonify({
@@ -517,8 +1081,38 @@ def get_recommendations():
                 'error': 'La liste d\'items ne peut pas être vide'
             }), 400
         
-        # Obtenir les recommandations
-        recommendations = recommender.recommend(items, top_n, min_confidence)
+        # Obtenir les recommandations (modèle du segment, sinon modèle global)
+        recommendations = None
+        if segment is not None:
+            recommendations = segment_models.recommend(str(segment), items, top_n, min_confidence)
+        segment_used = segment if recommendations is not None else None
+        
+        # Session de panier : mise à jour incrémentale de l'état du panier précédent
+        # (l'état est propre au processus : en mode multi-processus, un worker qui
+        # ne connaît pas la session repart du panier complet, avec le même résultat)
+        session = None
+        if recommendations is None and session_id is not None:
+            recommendations, session = cart_sessions.recommend(
+                str(session_id), model, items, top_n, min_confidence
+            )
+        
+        materialized = None
+        batched = False
+        if recommendations is None:
+            scorer = shared if shared is not None else model.recommender
+            # Panier fréquent : résultat pré-calculé, sinon calcul direct
+            recommendations = scorer.recommend_materialized(items, top_n, min_confidence)
+            if scorer.materialized is not None:
+                materialized = {'hit': recommendations is not None, **scorer.materialized.stats()}
+            if recommendations is None:
+                # Micro-lots : requêtes concurrentes évaluées ensemble
+                batched = recommend_batcher.enabled and (
+                    len(shared) > 0 if shared is not None else model.rules is not None
+                )
+                if batched:
+                    recommendations = recommend_batcher.recommend(model, items, top_n, min_confidence)
+                else:
+                    recommendations = scorer.recommend(items, top_n, min_confidence)
         
         # Sauvegarder dans la base de données
         if recommendations:
@@ -532,6 +1126,12 @@ def get_recommendations():
         return jsonify({
             'success': True,
             'input_items': items,
+            'history_items': len(history_items),
+            'segment': segment_used,
+            'generation': shared.generation if shared is not None else None,
+            'materialized': materialized,
+            'session': session,
+            'batched': batched,
             'recommendations': recommendations,
             'count': len(recommendations)
         })
@@ -542,11 +1142,101 @@ def get_recommendations():
             'error': str(e)
         }), 500
 
+@app.route('/api/recommend/similar', methods=['POST'])
+def get_similar_items():
+    """Items similaires à un panier (co-occurrences, à défaut règles)"""
+    try:
+        model = pinned_model()
+        if model is None:
+            return jsonify({
+                'success': False,
+                'error': 'L\'analyse doit être effectuée d\'abord'
+            }), 400
+        
+        data = request.get_json() or {}
+        items = data.get('items', [])
+        top_n = data.get('top_n', 5)
+        metric = data.get('metric', 'lift')
+        
+        if not items:
+            return jsonify({
+                'success': False,
+                'error': 'La liste d\'items ne peut pas être vide'
+            }), 400
+        if metric not in SIMILARITY_METRICS:
+            return jsonify({
+                'success': False,
+                'error': f"metric doit être l'un de {', '.join(SIMILARITY_METRICS)}"
+            }), 400
+        
+        if model.cooccurrence is not None:
+            similar = model.cooccurrence.similar(items, top_n, metric)
+        else:
+            similar = model.recommender.recommend_by_similarity(items, top_n)
+        
+        return jsonify({
+            'success': True,
+            'input_items': items,
+            'source': 'cooccurrence' if model.cooccurrence is not None else 'rules',
+            'similar': similar,
+            'count': len(similar)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/recommend/explain', methods=['POST'])
+def explain_recommendations():
+    """Règles qui justifient une liste de recommandations (une entrée par recommandation)"""
+    try:
+        model = pinned_model()
+        if model is None:
+            return jsonify({
+                'success': False,
+                'error': 'L\'analyse doit être effectuée d\'abord'
+            }), 400
+        
+        data = request.get_json() or {}
+        recommendations = data.get('recommendations')
+        
+        # Sans liste fournie, expliquer les recommandations du panier
+        if recommendations is None and data.get('items'):
+            recommendations = model.recommender.recommend(
+                data['items'], data.get('top_n', 5), data.get('min_confidence', 0.5)
+            )
+        
+        if not isinstance(recommendations, list) or any(
+            not isinstance(rec, dict) or 'item' not in rec or 'based_on' not in rec
+            for rec in recommendations
+        ):
+            return jsonify({
+                'success': False,
+                'error': 'recommendations doit être une liste de {item, based_on}'
+            }), 400
+        
+        explanations = model.recommender.explain_recommendations(recommendations)
+        
+        return jsonify({
+            'success': True,
+            'explanations': explanations,
+            'count': len(explanations)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/frequently-bought-together', methods=['POST'])
 def frequently_bought_together():
     """Trouver les items fréquemment achetés ensemble"""
     try:
-        if not app_state['analysis_done']:
+        model = pinned_model()
+        if model is None:
             return jsonify({
                 'success': False,
                 'error': 'L\'analyse doit être effectuée d\'abord'
@@ -562,7 +1252,7 @@ def frequently_bought_together():
                 'error': 'Un item doit être fourni'
             }), 400
         
-        together = recommender.get_frequently_bought_together(item, top_n)
+        together = model.recommender.get_frequently_bought_together(item, top_n)
         
         return jsonify({
             'success': True,
@@ -617,6 +1307,74 @@ def explain_recommendation_llm():
         }), 500
 
 
+@app.route('/api/llm/explain-recommendations', methods=['POST'])
+def explain_recommendations_batch_llm():
+    """Générer les explications de toute une liste de recommandations"""
+    try:
+        data = request.get_json()
+        basket_items = data.get('basket_items', [])
+        recommendations = data.get('recommendations')
+        max_workers = data.get('max_workers', 4)
+        timeout = data.get('timeout', 20.0)
+        mode = data.get('mode', 'auto')
+        
+        if not basket_items:
+            return jsonify({
+                'success': False,
+                'error': 'Les items du panier sont requis'
+            }), 400
+        
+        # Sans liste fournie, utiliser les recommandations FP-Growth du panier
+        model = pinned_model()
+        if recommendations is None and model is not None:
+            recommendations = model.recommender.recommend(basket_items, data.get('top_n', 5))
+        
+        if not recommendations:
+            return jsonify({
+                'success': False,
+                'error': 'Aucune recommandation à expliquer'
+            }), 400
+        
+        if mode not in ('auto', 'parallel', 'combined'):
+            return jsonify({
+                'success': False,
+                'error': f'Mode inconnu: {mode}'
+            }), 400
+        
+        if isinstance(max_workers, bool) or not isinstance(max_workers, int) or max_workers < 1:
+            return jsonify({
+                'success': False,
+                'error': 'max_workers doit être un entier positif'
+            }), 400
+        
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+            return jsonify({
+                'success': False,
+                'error': 'timeout doit être un nombre positif de secondes'
+            }), 400
+        # Borné côté serveur : un client ne fixe pas le nombre d'appels LLM simultanés
+        max_workers = min(max_workers, LLM_MAX_WORKERS)
+        
+        result = llm_service.explain_recommendations_batch(
+            basket_items=basket_items,
+            recommendations=recommendations,
+            max_workers=max_workers,
+            timeout=timeout,
+            mode=mode
+        )
+        
+        return jsonify({
+            'success': True,
+            **result
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/llm/detect-context', methods=['POST'])
 def detect_shopping_context():
     """Détecter le contexte d'achat à partir du panier"""
@@ -659,48 +1417,20 @@ def chatbot_interaction():
                 'error': 'Le message ne peut pas être vide'
             }), 400
         
-        # Récupérer TOUS les produits disponibles avec métadonnées
-        available_products = None
-        recommendations = None
-        
-        if app_state.get('data_loaded'):
-            try:
-                # Récupérer beaucoup plus de produits (top 200)
-                top_products = data_loader.get_top_products(200)
-                
-                # Enrichir avec les métadonnées (prix, description)
-                metadata = products_manager.get_all_products()
-                products_with_info = []
-                for name in top_products.keys():
-                    product_meta = metadata.get(name, {})
-                    price = product_meta.get('price', 0)
-                    products_with_info.append(f"{name} ({price}€)")
-                
-                available_products = products_with_info
-                
-                # Si le panier n'est pas vide, obtenir des recommandations FP-Growth
-                if user_cart and len(user_cart) > 0:
-                    try:
-                        cart_names = [item['name'] if isinstance(item, dict) else item for item in user_cart]
-                        recs = data_loader.get_recommendations(cart_names, top_n=10)
-                        if recs:
-                            recommendations = [rec['product'] for rec in recs[:5]]
-                    except:
-                        pass
-            except:
-                pass
-        
-        response = llm_service.chatbot_response(
+        model = pinned_model()
+        result = chatbot_pipeline.run(
             user_message=user_message,
             conversation_history=conversation_history,
-            available_products=available_products,
             user_cart=user_cart,
-            fp_recommendations=recommendations
+            data_loaded=app_state.get('data_loaded', False),
+            analysis_done=model is not None,
+            recommender=model.recommender if model is not None else None
         )
         
         return jsonify({
             'success': True,
-            'response': response
+            'response': result['response'],
+            'metadata': result['metadata']
         })
     
     except Exception as e:
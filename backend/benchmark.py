@@ -0,0 +1,219 @@
+"""
+Suite de benchmarks du pipeline FP-Growth sur données synthétiques
+
+Usage:
+    python benchmark.py --scales 0.05 0.1 0.25 --output bench_results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import mlxtend
+
+from synthetic_data import generate_transactions
+from data_loader import DataLoader
+from fpgrowth_engine import FPGrowthEngine
+from recommender import Recommender
+from cooccurrence import CooccurrenceModel
+
+
+def time_call(func, repeat=3, setup=None):
+    """
+    Mesurer une fonction plusieurs fois
+
+    Args:
+        func: Fonction à mesurer (reçoit le résultat de setup s'il est fourni)
+        repeat: Nombre d'exécutions
+        setup: Préparation non chronométrée exécutée avant chaque appel
+
+    Returns:
+        (statistiques en secondes, résultat du dernier appel)
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        # Les messages de progression ne doivent pas polluer la sortie JSON
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func(arg) if setup else func()
+            timings.append(time.perf_counter() - start)
+
+    return {
+        'runs': repeat,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'max': max(timings)
+    }, result
+
+
+def sample_baskets(basket_df, n_queries, seed, max_items=3):
+    """Tirer des paniers de requête à partir de factures réelles"""
+    rng = np.random.default_rng(seed)
+    columns = np.asarray(basket_df.columns)
+    values = basket_df.values
+    rows = rng.choice(len(values), size=min(n_queries, len(values)), replace=False)
+
+    baskets = []
+    for row in rows:
+        items = columns[values[row]]
+        if len(items) == 0:
+            continue
+        k = min(len(items), int(rng.integers(1, max_items + 1)))
+        baskets.append(list(rng.choice(items, size=k, replace=False)))
+    return baskets
+
+
+def time_queries(func, baskets):
+    """Latence par requête (en secondes) sur une liste de paniers"""
+    timings = []
+    for basket in baskets:
+        start = time.perf_counter()
+        func(basket)
+        timings.append(time.perf_counter() - start)
+
+    timings = np.array(timings)
+    return {
+        'queries': len(timings),
+        'mean': float(timings.mean()),
+        'p50': float(np.percentile(timings, 50)),
+        'p95': float(np.percentile(timings, 95)),
+        'max': float(timings.max())
+    }
+
+
+def benchmark_scale(scale, seed=42, repeat=3, min_support=0.01, min_confidence=0.3, n_queries=50):
+    """Exécuter tous les benchmarks pour un facteur d'échelle"""
+    start = time.perf_counter()
+    raw_df = generate_transactions(scale=scale, seed=seed)
+    generation_time = time.perf_counter() - start
+
+    stages = {}
+
+    def fresh_loader():
+        loader = DataLoader()
+        loader.df = raw_df.copy()
+        return loader
+
+    stages['clean_data'], clean_df = time_call(
+        lambda loader: loader.clean_data(persist=False), repeat, setup=fresh_loader
+    )
+
+    loader = DataLoader()
+    loader.df = clean_df
+    stages['get_transaction_dataframe'], basket_df = time_call(loader.get_transaction_dataframe, repeat)
+
+    engine = FPGrowthEngine(min_support=min_support, min_confidence=min_confidence)
+    stages['analyze'], results = time_call(lambda: engine.analyze(basket_df), repeat)
+    stages['generate_rules'], rules = time_call(engine.generate_rules, repeat)
+
+    # Mode top-K avec K = nombre d'itemsets obtenus au seuil fixe, pour comparaison
+    stages['find_frequent_itemsets'], _ = time_call(lambda: engine.find_frequent_itemsets(basket_df), repeat)
+    top_k_engine = FPGrowthEngine(min_confidence=min_confidence)
+    stages['find_top_k_itemsets'], _ = time_call(
+        lambda: top_k_engine.find_top_k_itemsets(basket_df, len(results['itemsets'])), repeat
+    )
+    stages['find_top_k_itemsets']['k'] = len(results['itemsets'])
+    stages['find_top_k_itemsets']['min_support_reached'] = top_k_engine.min_support
+
+    # Taille et temps des modes complet / fermé / maximal
+    mode_comparison = engine.compare_modes(basket_df)
+
+    recommender = Recommender(rules)
+    baskets = sample_baskets(basket_df, n_queries, seed)
+    stages['recommend'] = time_queries(lambda b: recommender.recommend(b, 5, 0.0), baskets)
+    stages['recommend_by_similarity'] = time_queries(lambda b: recommender.recommend_by_similarity(b, 5), baskets)
+    stages['get_frequently_bought_together'] = time_queries(
+        lambda b: recommender.get_frequently_bought_together(b[0], 5), baskets
+    )
+
+    # Similarité par co-occurrences (XᵀX) comparée au parcours des règles
+    stages['cooccurrence_model'], cooccurrence = time_call(lambda: CooccurrenceModel(basket_df), repeat)
+    stages['recommend_by_cooccurrence'] = time_queries(lambda b: cooccurrence.similar(b, 5), baskets)
+    similarity_coverage = {
+        'rules': float(np.mean([bool(recommender.recommend_by_similarity(b, 5)) for b in baskets])),
+        'cooccurrence': float(np.mean([bool(cooccurrence.similar(b, 5)) for b in baskets])),
+        'pairs': cooccurrence.describe()['pairs']
+    }
+
+    return {
+        'scale': scale,
+        'dataset': {
+            'raw_rows': len(raw_df),
+            'clean_rows': len(clean_df),
+            'invoices': int(basket_df.shape[0]),
+            'products': int(basket_df.shape[1]),
+            'generation_seconds': generation_time
+        },
+        'model': {
+            'itemsets': len(results['itemsets']),
+            'rules': len(rules)
+        },
+        'mining_modes': mode_comparison,
+        'similarity_coverage': similarity_coverage,
+        'stages': stages
+    }
+
+
+def run_benchmarks(scales, seed=42, repeat=3, min_support=0.01, min_confidence=0.3, n_queries=50):
+    """Exécuter la suite complète et retourner un document JSON-sérialisable"""
+    return {
+        'benchmark': 'fpgrowth-pipeline',
+        'created_at': datetime.now().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'mlxtend': mlxtend.__version__
+        },
+        'config': {
+            'scales': scales,
+            'seed': seed,
+            'repeat': repeat,
+            'min_support': min_support,
+            'min_confidence': min_confidence,
+            'n_queries': n_queries
+        },
+        'results': [
+            benchmark_scale(scale, seed, repeat, min_support, min_confidence, n_queries)
+            for scale in scales
+        ]
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks du pipeline FP-Growth')
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.05, 0.1, 0.25])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-support', type=float, default=0.01)
+    parser.add_argument('--min-confidence', type=float, default=0.3)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--output', default=None, help='Fichier JSON de sortie (stdout par défaut)')
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        args.scales,
+        seed=args.seed,
+        repeat=args.repeat,
+        min_support=args.min_support,
+        min_confidence=args.min_confidence,
+        n_queries=args.queries
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"✓ Résultats écrits dans {args.output}")
+    else:
+        print(output)
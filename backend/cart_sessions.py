@@ -0,0 +1,216 @@
+"""
+Recommandations incrémentales par session de panier
+
+Le tableau de bord rappelle /api/recommend avec le panier complet après
+chaque ajout. Avec un session_id, le serveur garde l'état de score du
+panier précédent :
+
+- progress : pour chaque règle, nombre de ses antécédents présents ;
+- candidates : pour chaque conséquent des règles satisfaites, les règles
+  qui le proposent (avec la position de la paire règle/conséquent) ;
+- best : règle retenue pour chaque candidat (première règle de confiance
+  maximale) et première paire rencontrée (départage des égalités).
+
+Le panier reçu est comparé au précédent ; chaque item ajouté ou retiré ne
+réévalue que les règles dont il est un antécédent. Le résultat est celui
+de Recommender.recommend sur le panier complet. Les sessions sont gardées
+dans un cache LRU borné, avec expiration après SESSION_TTL_SECONDS
+d'inactivité ; un nouveau modèle publié réinitialise l'état.
+"""
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from materialized import model_rule_arrays
+
+# Nombre maximum de sessions gardées et durée d'inactivité avant expiration
+SESSION_MAX = int(os.getenv('CART_SESSION_MAX', 10000))
+SESSION_TTL_SECONDS = float(os.getenv('CART_SESSION_TTL_SECONDS', 1800))
+
+
+class CartState:
+    """État de score d'un panier, pour une version du modèle"""
+
+    def __init__(self, version):
+        self.version = version
+        self.basket = {}
+        self.progress = {}
+        self.candidates = {}
+        self.best = {}
+        self.lock = threading.Lock()
+        self.touched = time.monotonic()
+
+
+class CartSessions:
+    """Sessions de panier (LRU + TTL)"""
+
+    def __init__(self, max_sessions=SESSION_MAX, ttl=SESSION_TTL_SECONDS):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def clear(self):
+        with self._lock:
+            self._sessions = OrderedDict()
+
+    def _state(self, session_id, version):
+        """État de la session (nouveau si absent, expiré ou d'une autre version du modèle)"""
+        now = time.monotonic()
+        with self._lock:
+            # Les moins récemment utilisées sont en tête
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if now - oldest.touched <= self.ttl:
+                    break
+                self._sessions.popitem(last=False)
+                self.expired += 1
+
+            state = self._sessions.get(session_id)
+            new = state is None or state.version != version
+            if new:
+                state = CartState(version)
+                self._sessions[session_id] = state
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            state.touched = now
+        return state, new
+
+    @staticmethod
+    def _update_best(state, arrays, item):
+        rules = state.candidates[item]
+        confidence = arrays['confidence']
+        best = min(rules, key=lambda rule: (-confidence[rule], rule))
+        state.best[item] = (best, min(rules.values()))
+
+    def _match(self, state, arrays, rule):
+        """Ajouter les conséquents d'une règle devenue satisfaite"""
+        confidence = arrays['confidence']
+        offsets = arrays['consequent_offsets']
+        for pair in range(offsets[rule], offsets[rule + 1]):
+            item = int(arrays['consequent_items'][pair])
+            state.candidates.setdefault(item, {})[rule] = pair
+            current = state.best.get(item)
+            if current is None:
+                state.best[item] = (rule, pair)
+                continue
+            best, inserted = current
+            if (-confidence[rule], rule) < (-confidence[best], best):
+                best = rule
+            state.best[item] = (best, min(inserted, pair))
+
+    def _unmatch(self, state, arrays, rule):
+        """Retirer les conséquents d'une règle qui n'est plus satisfaite"""
+        offsets = arrays['consequent_offsets']
+        for pair in range(offsets[rule], offsets[rule + 1]):
+            item = int(arrays['consequent_items'][pair])
+            rules = state.candidates[item]
+            del rules[rule]
+            if not rules:
+                del state.candidates[item]
+                del state.best[item]
+            elif state.best[item][0] == rule or state.best[item][1] == pair:
+                self._update_best(state, arrays, item)
+
+    def _toggle(self, state, arrays, position, added):
+        """Réévaluer les règles dont l'item est un antécédent ; retourne leur nombre"""
+        index = arrays['antecedents_t']
+        rules = index.indices[index.indptr[position]:index.indptr[position + 1]].tolist()
+        lengths = arrays['lengths']
+        for rule in rules:
+            count = state.progress.get(rule, 0)
+            if added:
+                count += 1
+                state.progress[rule] = count
+                if count == lengths[rule]:
+                    self._match(state, arrays, rule)
+            else:
+                if count == lengths[rule]:
+                    self._unmatch(state, arrays, rule)
+                count -= 1
+                if count:
+                    state.progress[rule] = count
+                else:
+                    del state.progress[rule]
+        return len(rules)
+
+    def recommend(self, session_id, model, items, top_n=5, min_confidence=0.5):
+        """
+        Recommandations du panier d'une session, mises à jour par différence
+
+        Args:
+            session_id: Identifiant de session du panier
+            model: ModelSnapshot ou SharedModel servi
+            items: Panier complet (noms d'items)
+            top_n: Nombre de recommandations
+            min_confidence: Confiance minimum
+
+        Returns:
+            (recommandations au format de Recommender.recommend, dict de mesures)
+        """
+        universe, positions, arrays = model_rule_arrays.get(model)
+        vocabulary = model.vocabulary
+        basket = set(vocabulary.encode(items)) if vocabulary is not None else set(items)
+        state, new = self._state(session_id, model.version)
+
+        with state.lock:
+            added = basket - state.basket.keys()
+            removed = state.basket.keys() - basket
+            evaluated = 0
+            for item in removed:
+                position = state.basket.pop(item)
+                if position is not None:
+                    evaluated += self._toggle(state, arrays, position, added=False)
+            for item in added:
+                position = positions.get(item)
+                state.basket[item] = position
+                if position is not None:
+                    evaluated += self._toggle(state, arrays, position, added=True)
+
+            # Même ordre que recommend : confiance, lift, puis ordre d'insertion
+            confidence, lift = arrays['confidence'], arrays['lift']
+            in_basket = set(state.basket.values())
+            ranked = heapq.nsmallest(
+                top_n,
+                (
+                    (-confidence[rule], -lift[rule], inserted, item, rule)
+                    for item, (rule, inserted) in state.best.items()
+                    if item not in in_basket and confidence[rule] >= min_confidence
+                )
+            )
+            candidates = len(state.best)
+
+        recommendations = model.recommender.format_recommendations(
+            [(universe[item], rule) for _, _, _, item, rule in ranked]
+        )
+        return recommendations, {
+            'new': new,
+            'added': len(added),
+            'removed': len(removed),
+            'rules_evaluated': evaluated,
+            'candidates': candidates
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'ttl_seconds': self.ttl,
+                'expired': self.expired,
+                'evicted': self.evicted
+            }
+
+
+# Instance globale
+cart_sessions = CartSessions()
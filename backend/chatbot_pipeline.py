@@ -0,0 +1,203 @@
+"""
+Orchestration concurrente des requêtes chatbot (catalogue, FP-Growth, LLM)
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Optional
+
+from data_loader import data_loader
+from recommender import Recommender, recommender as default_recommender
+from products_manager import products_manager
+from llm_service import llm_service
+from metrics import CHATBOT_STAGE_ABANDONED, CHATBOT_STAGE_RUNNING
+
+
+class ChatbotPipeline:
+    """
+    Prépare les entrées du LLM (catalogue et recommandations du panier) en
+    parallèle, chacune avec sa propre échéance. Une étape en retard est
+    abandonnée : le LLM est appelé avec les entrées disponibles.
+
+    Chaque type d'étape a son propre pool : une étape lente n'occupe pas les
+    threads des autres. Une étape abandonnée continue jusqu'à sa fin ; tant
+    que son pool est occupé par de telles exécutions, l'étape est ignorée
+    ('saturated') au lieu d'être mise en file derrière elles.
+    """
+
+    def __init__(self,
+                 catalog_deadline: float = 1.0,
+                 recommendations_deadline: float = 0.5,
+                 catalog_size: int = 200,
+                 stage_workers: int = 2):
+        self.catalog_deadline = catalog_deadline
+        self.recommendations_deadline = recommendations_deadline
+        self.catalog_size = catalog_size
+        self.stage_workers = stage_workers
+        self._executors = {}
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, name, func):
+        """Soumettre une étape à son pool (None si le pool est occupé)"""
+        with self._lock:
+            if self._running.get(name, 0) >= self.stage_workers:
+                return None
+            executor = self._executors.get(name)
+            if executor is None:
+                executor = self._executors[name] = ThreadPoolExecutor(
+                    max_workers=self.stage_workers, thread_name_prefix=f'chatbot-{name}'
+                )
+            self._running[name] = self._running.get(name, 0) + 1
+            CHATBOT_STAGE_RUNNING.inc(stage=name)
+
+        future = executor.submit(func)
+        future.add_done_callback(lambda _: self._release(name))
+        return future
+
+    def _release(self, name):
+        with self._lock:
+            self._running[name] -= 1
+            CHATBOT_STAGE_RUNNING.dec(stage=name)
+
+    def build_catalog(self) -> List[str]:
+        """Construire le catalogue 'NOM (prix€)' à partir des produits les plus vendus"""
+        top_products = data_loader.get_top_products(self.catalog_size)
+        metadata = products_manager.get_all_products()
+
+        products_with_info = []
+        for name in top_products.keys():
+            price = metadata.get(name, {}).get('price', 0)
+            products_with_info.append(f"{name} ({price}€)")
+
+        return products_with_info
+
+    def cart_recommendations(self, cart_names: List[str], top_n: int = 5,
+                             recommender: Optional[Recommender] = None) -> List[str]:
+        """Obtenir les recommandations FP-Growth pour le panier"""
+        recs = (recommender or default_recommender).recommend(cart_names, top_n=top_n)
+        return [rec['item'] for rec in recs]
+
+    def _run_stages(self, stages: Dict) -> Dict:
+        """
+        Exécuter les étapes en parallèle en respectant leurs échéances
+
+        Args:
+            stages: {nom: (callable, échéance en secondes)}
+
+        Returns:
+            {nom: {'status', 'elapsed_ms', 'value'}}
+        """
+        start = time.perf_counter()
+        futures = {}
+        results = {}
+        for name, (func, deadline) in stages.items():
+            future = self._submit(name, func)
+            if future is None:
+                results[name] = {'status': 'saturated', 'elapsed_ms': 0.0, 'value': None}
+            else:
+                futures[future] = (name, start + deadline)
+
+        pending = set(futures)
+        while pending:
+            now = time.perf_counter()
+            # Abandonner les étapes dont l'échéance est dépassée
+            for future in [f for f in pending if futures[f][1] <= now]:
+                pending.discard(future)
+                # Une étape déjà démarrée ne peut pas être interrompue : elle est comptée
+                if not future.done() and not future.cancel():
+                    CHATBOT_STAGE_ABANDONED.inc(stage=futures[future][0])
+                results[futures[future][0]] = {
+                    'status': 'timeout',
+                    'elapsed_ms': round((now - start) * 1000, 2),
+                    'value': None
+                }
+            if not pending:
+                break
+
+            next_deadline = min(futures[f][1] for f in pending)
+            done, pending = wait(pending, timeout=next_deadline - now, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = futures[future][0]
+                elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+                try:
+                    results[name] = {'status': 'ok', 'elapsed_ms': elapsed_ms, 'value': future.result()}
+                except Exception as e:
+                    results[name] = {'status': 'error', 'elapsed_ms': elapsed_ms, 'value': None, 'error': str(e)}
+
+        return results
+
+    def run(self,
+            user_message: str,
+            conversation_history: Optional[List[Dict]] = None,
+            user_cart: Optional[List] = None,
+            data_loaded: bool = False,
+            analysis_done: bool = False,
+            recommender: Optional[Recommender] = None) -> Dict:
+        """
+        Traiter un message chatbot
+
+        Args:
+            recommender: Recommender du modèle épinglé par la requête
+                         (le recommender global par défaut)
+
+        Returns:
+            dict avec la réponse du LLM et les métadonnées (statut et durée de chaque étape)
+        """
+        start = time.perf_counter()
+        cart_names = [item['name'] if isinstance(item, dict) else item for item in (user_cart or [])]
+
+        stages = {}
+        if data_loaded:
+            stages['catalog'] = (self.build_catalog, self.catalog_deadline)
+        if analysis_done and cart_names:
+            stages['recommendations'] = (
+                lambda: self.cart_recommendations(cart_names, recommender=recommender),
+                self.recommendations_deadline
+            )
+
+        results = self._run_stages(stages) if stages else {}
+
+        stage_metadata = {
+            name: {k: v for k, v in result.items() if k != 'value'}
+            for name, result in results.items()
+        }
+        for name in ('catalog', 'recommendations'):
+            stage_metadata.setdefault(name, {'status': 'skipped', 'elapsed_ms': 0.0})
+
+        available_products = results.get('catalog', {}).get('value')
+        recommendations = results.get('recommendations', {}).get('value')
+
+        llm_start = time.perf_counter()
+        response = llm_service.chatbot_response(
+            user_message=user_message,
+            conversation_history=conversation_history,
+            available_products=available_products,
+            user_cart=user_cart,
+            fp_recommendations=recommendations
+        )
+        stage_metadata['llm'] = {
+            'status': 'ok',
+            'elapsed_ms': round((time.perf_counter() - llm_start) * 1000, 2)
+        }
+
+        return {
+            'response': response,
+            'metadata': {
+                'stages': stage_metadata,
+                'degraded': any(
+                    s['status'] in ('timeout', 'error', 'saturated') for s in stage_metadata.values()
+                ),
+                'total_ms': round((time.perf_counter() - start) * 1000, 2)
+            }
+        }
+
+
+# Instance globale
+chatbot_pipeline = ChatbotPipeline(
+    catalog_deadline=float(os.getenv('CHATBOT_CATALOG_DEADLINE', '1.0')),
+    recommendations_deadline=float(os.getenv('CHATBOT_RECOMMENDATIONS_DEADLINE', '0.5')),
+    stage_workers=int(os.getenv('CHATBOT_STAGE_WORKERS', '2'))
+)
@@ -0,0 +1,152 @@
+"""
+Modèle de co-occurrence item-item (produit matriciel creux XᵀX)
+
+X est la matrice panier creuse (factures × items). C = XᵀX donne, hors
+diagonale, le nombre de factures contenant chaque paire d'items et, sur la
+diagonale, le nombre de factures de chaque item. Lift, Jaccard et cosinus
+sont calculés en une fois sur les paires non nulles et gardés sous forme de
+matrices creuses de même structure.
+
+La similarité d'un panier est la somme des lignes de ses items : quelques
+lignes creuses, sans parcours des règles. Contrairement aux règles, toutes
+les paires observées sont connues, quels que soient les seuils de
+support et de confiance.
+"""
+import numpy as np
+from scipy import sparse
+
+SIMILARITY_METRICS = ('lift', 'jaccard', 'cosine')
+
+
+class CooccurrenceModel:
+    """Co-occurrences et similarités item-item d'une matrice panier"""
+
+    def __init__(self, basket_df, vocabulary=None, min_count=1):
+        """
+        Args:
+            basket_df: DataFrame one-hot encoding (factures × items)
+            vocabulary: Vocabulaire si les colonnes sont des identifiants (None = noms)
+            min_count: Nombre minimum de factures communes pour garder une paire
+        """
+        self.vocabulary = vocabulary
+        self.items = basket_df.columns.tolist()
+        self._positions = {item: j for j, item in enumerate(self.items)}
+        self.n_invoices = basket_df.shape[0]
+
+        X = sparse.csr_matrix(basket_df.to_numpy(dtype=bool), dtype=np.int32)
+        counts = (X.T @ X).tocsr()
+        self.item_counts = counts.diagonal().astype(np.int64)
+
+        counts.setdiag(0)
+        if min_count > 1:
+            counts.data[counts.data < min_count] = 0
+        counts.eliminate_zeros()
+        counts.sort_indices()
+        self.counts = counts
+
+        # Métriques des paires non nulles, calculées en vectoriel
+        rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+        together = counts.data.astype(float)
+        count_i = self.item_counts[rows].astype(float)
+        count_j = self.item_counts[counts.indices].astype(float)
+        values = {
+            'lift': together * self.n_invoices / (count_i * count_j),
+            'jaccard': together / (count_i + count_j - together),
+            'cosine': together / np.sqrt(count_i * count_j)
+        }
+        self.metrics = {
+            metric: sparse.csr_matrix((data, counts.indices, counts.indptr), shape=counts.shape)
+            for metric, data in values.items()
+        }
+
+    def __len__(self):
+        return len(self.items)
+
+    def arrays(self):
+        """Tableaux à publier avec le modèle (matrices au format CSR, structure commune)"""
+        arrays = {
+            'cooccurrence_items': np.asarray(self.items, dtype=np.int64),
+            'cooccurrence_item_counts': self.item_counts,
+            'cooccurrence_indptr': self.counts.indptr,
+            'cooccurrence_indices': self.counts.indices,
+            'cooccurrence_counts': self.counts.data
+        }
+        for metric, matrix in self.metrics.items():
+            arrays[f'cooccurrence_{metric}'] = matrix.data
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, vocabulary, n_invoices):
+        """Modèle reconstruit à partir des tableaux publiés par arrays()"""
+        model = cls.__new__(cls)
+        model.vocabulary = vocabulary
+        model.items = arrays['cooccurrence_items'].tolist()
+        model._positions = {item: j for j, item in enumerate(model.items)}
+        model.n_invoices = n_invoices
+        model.item_counts = arrays['cooccurrence_item_counts']
+
+        shape = (len(model.items), len(model.items))
+        structure = (arrays['cooccurrence_indices'], arrays['cooccurrence_indptr'])
+        model.counts = sparse.csr_matrix((arrays['cooccurrence_counts'], *structure), shape=shape)
+        model.metrics = {
+            metric: sparse.csr_matrix((arrays[f'cooccurrence_{metric}'], *structure), shape=shape)
+            for metric in SIMILARITY_METRICS
+        }
+        return model
+
+    def _encode(self, names):
+        if self.vocabulary is not None:
+            names = self.vocabulary.encode(names)
+        return sorted({self._positions[item] for item in names if item in self._positions})
+
+    def _name(self, position):
+        item = self.items[position]
+        return item if self.vocabulary is None else self.vocabulary.name_of(item)
+
+    def similar(self, items, top_n=5, metric='lift'):
+        """
+        Items les plus similaires à un panier
+
+        Args:
+            items: Noms des items du panier
+            top_n: Nombre de résultats
+            metric: 'lift', 'jaccard' ou 'cosine'
+
+        Returns:
+            Liste de {'item', 'score', 'cooccurrences', 'support'} par score décroissant
+        """
+        if metric not in SIMILARITY_METRICS:
+            raise ValueError(f"metric doit être l'un de {', '.join(SIMILARITY_METRICS)}")
+        positions = self._encode(items)
+        if not positions:
+            return []
+
+        # Somme des lignes creuses des items du panier
+        scores = np.asarray(self.metrics[metric][positions].sum(axis=0)).ravel()
+        together = np.asarray(self.counts[positions].sum(axis=0)).ravel()
+        scores[positions] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_n:
+            candidates = candidates[np.argpartition(-scores[candidates], top_n - 1)[:top_n]]
+        # Ordre déterministe : score décroissant, puis position
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+
+        return [
+            {
+                'item': self._name(j),
+                'score': float(scores[j]),
+                'cooccurrences': int(together[j]),
+                'support': float(self.item_counts[j] / max(self.n_invoices, 1))
+            }
+            for j in candidates
+        ]
+
+    def describe(self):
+        return {
+            'items': len(self.items),
+            'invoices': self.n_invoices,
+            'pairs': int(self.counts.nnz // 2),
+            'nbytes': int(sum(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes for m in self.metrics.values())
+                          + self.counts.data.nbytes)
+        }
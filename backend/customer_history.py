@@ -0,0 +1,139 @@
+"""
+Index de l'historique d'achat des clients pour les recommandations personnalisées
+
+Chaque client garde ses dernières factures sous forme de tuples
+d'identifiants d'items : la lecture de l'historique ne parcourt que ces
+factures, sans requête sur la table des transactions.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from vocabulary import ItemVocabulary, item_vocabulary
+
+# CustomerID générique des commandes anonymes (/api/checkout) : jamais indexé
+ANONYMOUS_CUSTOMER_ID = 99999
+
+
+def customer_key(value):
+    """Clé normalisée d'un client (CustomerID est lu en float depuis Excel)"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class CustomerHistoryIndex:
+    """Dernières factures de chaque client"""
+
+    def __init__(self, max_invoices=20, vocabulary=None):
+        self.max_invoices = max_invoices
+        self.vocabulary = vocabulary if vocabulary is not None else ItemVocabulary()
+        # client -> deque de (date, tuple d'ids d'items), de la plus ancienne à la plus récente
+        self.customers = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.customers)
+
+    def clear(self):
+        with self._lock:
+            self.customers = {}
+
+    def add_transactions(self, df):
+        """
+        Ajouter les factures de df à l'historique de leurs clients
+
+        Les lignes sans CustomerID ou anonymes sont ignorées. Au-delà de max_invoices,
+        les factures les plus anciennes d'un client sont oubliées.
+
+        Returns:
+            Nombre de factures ajoutées
+        """
+        if df is None or len(df) == 0:
+            return 0
+
+        df = df[
+            df['CustomerID'].notna()
+            & (pd.to_numeric(df['CustomerID'], errors='coerce') != ANONYMOUS_CUSTOMER_ID)
+        ]
+        codes, names = pd.factorize(df['Description'].astype(str).str.strip().str.upper())
+        frame = pd.DataFrame({
+            'customer': df['CustomerID'].values,
+            'invoice': df['InvoiceNo'].astype(str).values,
+            'date': pd.to_datetime(df['InvoiceDate']).values,
+            'code': codes
+        })
+        frame = frame[frame['code'] >= 0].drop_duplicates(['invoice', 'code'])
+        # Ordre chronologique : la deque garde naturellement les plus récentes
+        frame = frame.sort_values(['date', 'invoice', 'code'], kind='stable')
+
+        invoices = frame['invoice'].values
+        starts = np.flatnonzero(np.r_[True, invoices[1:] != invoices[:-1]])
+        ends = np.r_[starts[1:], len(invoices)]
+        customers = frame['customer'].values
+        dates = frame['date'].values
+
+        self.vocabulary.update(names)
+        ids = self.vocabulary.encode_values(names)
+        items = ids[frame['code'].values]
+
+        with self._lock:
+            for start, end in zip(starts, ends):
+                key = customer_key(customers[start])
+                history = self.customers.get(key)
+                if history is None:
+                    history = self.customers[key] = deque(maxlen=self.max_invoices)
+                history.append((pd.Timestamp(dates[start]), tuple(sorted(set(items[start:end].tolist())))))
+
+        return len(starts)
+
+    def rebuild(self, df):
+        """Reconstruire l'index à partir de toutes les transactions"""
+        self.clear()
+        return self.add_transactions(df)
+
+    def history(self, customer_id, max_invoices=None, days=None):
+        """
+        Items achetés récemment par un client, du plus récent au plus ancien
+
+        Args:
+            customer_id: Identifiant du client
+            max_invoices: Nombre de dernières factures à considérer
+            days: Ne garder que les factures des N jours précédant la dernière
+
+        Returns:
+            Liste de noms d'items (vide si le client est inconnu)
+        """
+        with self._lock:
+            invoices = list(self.customers.get(customer_key(customer_id), ()))
+        if not invoices:
+            return []
+
+        if max_invoices:
+            invoices = invoices[-max_invoices:]
+        if days:
+            since = invoices[-1][0] - pd.Timedelta(days=days)
+            invoices = [invoice for invoice in invoices if invoice[0] >= since]
+
+        seen = {}
+        for _, items in reversed(invoices):
+            for item in items:
+                seen.setdefault(item, None)
+        return self.vocabulary.decode(seen)
+
+    def describe(self):
+        """Résumé de l'index"""
+        with self._lock:
+            return {
+                'customers': len(self.customers),
+                'invoices': sum(len(h) for h in self.customers.values()),
+                'items': len(self.vocabulary),
+                'max_invoices': self.max_invoices
+            }
+
+
+# Instance globale
+customer_history = CustomerHistoryIndex(vocabulary=item_vocabulary)
@@ -2,93 +2,130 @@
 Module de chargement et préparation des données
 """
 import pandas as pd
+import numpy as np
 import os
 from datetime import datetime
 from database import db
+from metrics import timed_stage, log_event
+from vocabulary import item_vocabulary
 
 class DataLoader:
-    def __init__(self, file_path='data/Online Retail.xlsx'):
+    def __init__(self, file_path='data/Online Retail.xlsx', vocabulary=None):
         self.file_path = file_path
         self.df = None
+        # Vocabulaire d'items : si fourni, les colonnes de la matrice panier sont des identifiants
+        self.vocabulary = vocabulary
     
     def load_data(self):
         """Charger les données (DB ou Excel)"""
         # 1. Essayer de charger depuis la DB
         try:
-            print("Vérification des données dans la base de données...")
-            df_db = db.get_all_transactions()
+            with timed_stage('load', source='database') as info:
+                df_db = db.get_all_transactions()
+                info['rows'] = len(df_db)
             if not df_db.empty:
-                print(f"✓ {len(df_db)} transactions chargées depuis la base de données")
                 self.df = df_db
                 # Convertir les types si nécessaire
                 self.df['InvoiceDate'] = pd.to_datetime(self.df['InvoiceDate'])
                 return self.df
         except Exception as e:
-            print(f"Info: Base de données vide ou inaccessible ({e})")
+            log_event('load_skipped', source='database', reason=str(e))
 
         # 2. Sinon charger depuis Excel
-        print(f"Chargement des données depuis {self.file_path}...")
-        self.df = pd.read_excel(self.file_path)
-        print(f"✓ {len(self.df)} lignes chargées depuis Excel")
+        with timed_stage('load', source='excel', path=self.file_path) as info:
+            self.df = pd.read_excel(self.file_path)
+            info['rows'] = len(self.df)
         return self.df
     
-    def clean_data(self):
-        """Nettoyer les données"""
+    def clean_data(self, persist=True):
+        """
+        Nettoyer les données
+        
+        Args:
+            persist: Sauvegarder le résultat dans PostgreSQL si la table est vide
+        """
         if self.df is None:
             raise ValueError("Les données doivent être chargées d'abord")
         
-        print("Nettoyage des données...")
-        initial_count = len(self.df)
-        
-        # Supprimer les lignes avec des valeurs manquantes critiques
-        self.df = self.df.dropna(subset=['InvoiceNo', 'StockCode', 'Description'])
-        
-        # Supprimer les transactions annulées (InvoiceNo commence par 'C')
-        self.df = self.df[~self.df['InvoiceNo'].astype(str).str.startswith('C')]
-        
-        # Supprimer les quantités négatives ou nulles
-        self.df = self.df[self.df['Quantity'] > 0]
+        with timed_stage('clean') as info:
+            self._clean(info)
         
-        # Supprimer les prix négatifs ou nuls
-        self.df = self.df[self.df['UnitPrice'] > 0]
+        if self.vocabulary is not None:
+            added = self.vocabulary.update(self.df['Description'].cat.categories)
+            log_event('vocabulary', version=self.vocabulary.version, items=len(self.vocabulary), added=added)
         
-        # Nettoyer les descriptions
-        self.df['Description'] = self.df['Description'].str.strip().str.upper()
-        
-        # Convertir les types
-        self.df['InvoiceNo'] = self.df['InvoiceNo'].astype(str)
-        self.df['StockCode'] = self.df['StockCode'].astype(str)
-        
-        final_count = len(self.df)
-        removed = initial_count - final_count
-        print(f"✓ {removed} lignes supprimées, {final_count} lignes restantes")
+        if not persist:
+            return self.df
         
         # Sauvegarder dans la base de données si ce n'est pas déjà fait
         try:
-            print("Sauvegarde des données nettoyées dans PostgreSQL...")
             # On vérifie d'abord si la table est vide pour éviter les doublons
             existing_count = db.execute_query("SELECT COUNT(*) as count FROM transactions")[0]['count']
             if existing_count == 0:
-                db.insert_transactions(self.df)
-                print("✓ Données sauvegardées dans la base de données")
+                with timed_stage('db_save', table='transactions') as info:
+                    db.insert_transactions(self.df)
+                    info['rows'] = len(self.df)
             else:
-                print("ℹ️ Données déjà présentes dans la base")
+                log_event('db_save_skipped', table='transactions', existing_rows=existing_count)
         except Exception as e:
-            print(f"Erreur lors de la sauvegarde DB: {e}")
+            log_event('db_save_failed', table='transactions', reason=str(e))
 
         return self.df
     
+    def _clean(self, info):
+        """
+        Appliquer les filtres de nettoyage à self.df
+        
+        Les filtres sont combinés en un seul masque (une seule copie du
+        DataFrame) ; les colonnes texte deviennent des catégories, normalisées
+        une fois par valeur distincte plutôt qu'une fois par ligne.
+        """
+        df = self.df
+        initial_count = len(df)
+        
+        # Transactions annulées : InvoiceNo commence par 'C' (testé par facture, pas par ligne)
+        invoice_codes, invoices = pd.factorize(df['InvoiceNo'])
+        cancelled = np.append(invoices.astype(str).str.startswith('C'), False)
+        
+        mask = (
+            # Valeurs manquantes critiques
+            df['InvoiceNo'].notna().to_numpy()
+            & df['StockCode'].notna().to_numpy()
+            & df['Description'].notna().to_numpy()
+            & ~cancelled[invoice_codes]
+            # Quantités et prix négatifs ou nuls
+            & (df['Quantity'] > 0).to_numpy()
+            & (df['UnitPrice'] > 0).to_numpy()
+        )
+        
+        # Convertir les types, colonne par colonne (pas de copie filtrée du DataFrame entier)
+        def column(name):
+            return df[name][mask]
+        
+        self.df = pd.DataFrame({
+            'InvoiceNo': _categorical(column('InvoiceNo')),
+            'StockCode': _categorical(column('StockCode')),
+            'Description': _categorical(column('Description'), normalize=lambda s: s.str.strip().str.upper()),
+            'Quantity': pd.to_numeric(column('Quantity'), downcast='integer'),
+            'InvoiceDate': pd.to_datetime(column('InvoiceDate')),
+            # Les prix restent en float64 : les montants agrégés (CA) doivent rester exacts
+            'UnitPrice': column('UnitPrice').astype('float64'),
+            # Identifiants à 5 chiffres : exacts en float32
+            'CustomerID': pd.to_numeric(column('CustomerID'), errors='coerce').astype('float32'),
+            'Country': _categorical(column('Country'))
+        }, index=df.index[mask])
+        
+        info['removed'] = initial_count - len(self.df)
+        info['rows'] = len(self.df)
+        info['bytes'] = int(self.df.memory_usage(index=True, deep=True).sum())
+    
     def prepare_for_fpgrowth(self):
         """Préparer les données pour l'algorithme FP-Growth"""
         if self.df is None:
             raise ValueError("Les données doivent être chargées et nettoyées d'abord")
         
-        print("Préparation des données pour FP-Growth...")
-        
         # Grouper par facture et créer des listes de produits
-        transactions = self.df.groupby('InvoiceNo')['Description'].apply(list).values.tolist()
-        
-        print(f"✓ {len(transactions)} transactions préparées")
+        transactions = self.df.groupby('InvoiceNo', observed=True)['Description'].apply(list).values.tolist()
         
         return transactions
     
@@ -97,29 +134,83 @@ class DataLoader:
         if self.df is None:
             raise ValueError("Les données doivent être chargées et nettoyées d'abord")
         
-        print("Création du DataFrame one-hot encoding...")
+        with timed_stage('encode') as info:
+            basket_sets, _ = self._encode(info)
         
+        return basket_sets
+    
+    def sample_transaction_dataframe(self, sample_size, seed=42):
+        """
+        Matrice one-hot d'un échantillon aléatoire de factures
+        
+        Seules les factures tirées sont encodées ; le filtre des produits
+        rares reste celui de toutes les factures, les colonnes sont donc
+        celles de get_transaction_dataframe.
+        
+        Args:
+            sample_size: Nombre de factures à tirer (toutes si supérieur)
+            seed: Graine de l'échantillonnage
+        
+        Returns:
+            (DataFrame de l'échantillon, nombre de factures de la matrice complète)
+        """
+        if self.df is None:
+            raise ValueError("Les données doivent être chargées et nettoyées d'abord")
+        
+        with timed_stage('encode', sample_size=sample_size) as info:
+            return self._encode(info, sample_size, seed)
+    
+    def _encode(self, info, sample_size=None, seed=42):
         # OPTIMISATION: Filtrer les produits trop rares (< 0.5% des factures)
         total_invoices = self.df['InvoiceNo'].nunique()
         min_occurrences = int(total_invoices * 0.005)  # 0.5%
         
-        product_counts = self.df.groupby('Description')['InvoiceNo'].nunique()
+        product_counts = self.df.groupby('Description', observed=True)['InvoiceNo'].nunique()
         frequent_products = product_counts[product_counts >= min_occurrences].index
         
-        print(f"  Filtrage: {len(frequent_products)}/{len(product_counts)} produits gardés (apparaissant dans ≥{min_occurrences} factures)")
-        
         # Ne garder que les produits fréquents
         df_filtered = self.df[self.df['Description'].isin(frequent_products)]
         
+        # Factures de la matrice complète : celles qui gardent au moins un produit
+        invoices = df_filtered['InvoiceNo'].unique()
+        n_invoices = len(invoices)
+        sampled = sample_size is not None and sample_size < n_invoices
+        if sampled:
+            rng = np.random.default_rng(seed)
+            chosen = invoices[rng.choice(n_invoices, size=sample_size, replace=False)]
+            df_filtered = df_filtered[df_filtered['InvoiceNo'].isin(chosen)]
+        
         # Créer un DataFrame avec InvoiceNo et Description (OPTIMISÉ)
-        basket = df_filtered.groupby(['InvoiceNo', 'Description'])['Quantity'].sum().unstack(fill_value=0)
+        basket = df_filtered.groupby(
+            ['InvoiceNo', 'Description'], observed=True
+        )['Quantity'].sum().unstack(fill_value=0)
+        if sampled:
+            # Un produit absent de l'échantillon garde sa colonne
+            basket = basket.reindex(columns=frequent_products, fill_value=0)
         
         # Convertir en booléen (présence/absence) - méthode optimisée
         basket_sets = (basket > 0).astype(bool)
         
-        print(f"✓ DataFrame créé: {basket_sets.shape[0]} factures × {basket_sets.shape[1]} produits")
+        # Colonnes = identifiants d'items : l'extraction et les règles hachent des entiers.
+        # Les données chargées depuis PostgreSQL ne passent pas par clean_data :
+        # les noms encore inconnus du vocabulaire y sont ajoutés ici
+        if self.vocabulary is not None:
+            added = self.vocabulary.update(basket_sets.columns)
+            if added:
+                log_event('vocabulary', version=self.vocabulary.version, items=len(self.vocabulary), added=added)
+            ids = self.vocabulary.encode_values(basket_sets.columns.astype(str))
+            if (ids < 0).any():
+                raise ValueError(f"{int((ids < 0).sum())} produits absents du vocabulaire d'items")
+            basket_sets.columns = pd.Index(ids)
         
-        return basket_sets
+        info.update({
+            'products_kept': len(frequent_products),
+            'products_total': len(product_counts),
+            'min_occurrences': min_occurrences,
+            'rows': basket_sets.shape[0],
+            'columns': basket_sets.shape[1]
+        })
+        return basket_sets, n_invoices
     
     def get_statistics(self):
         """Obtenir des statistiques sur les données"""
@@ -148,12 +239,27 @@ class DataLoader:
         if self.df is None:
             raise ValueError("Les données doivent être chargées d'abord")
         
-        top_products = self.df.groupby('Description').agg({
+        top_products = self.df.groupby('Description', observed=True).agg({
             'Quantity': 'sum',
             'InvoiceNo': 'nunique'
         }).sort_values('Quantity', ascending=False).head(n)
         
         return top_products.to_dict('index')
 
+def _categorical(values, normalize=None):
+    """
+    Convertir une colonne texte en catégorie triée, en normalisant chaque valeur distincte une seule fois
+    
+    Les valeurs qui deviennent identiques après conversion en texte (ex: 536365
+    lu comme entier et '536365') ou après normalisation partagent une catégorie.
+    """
+    codes, uniques = pd.factorize(values)
+    labels = pd.Series(uniques.astype(str), dtype=object)
+    if normalize is not None:
+        labels = normalize(labels)
+    categories = pd.Index(labels.unique()).sort_values()
+    remap = np.append(categories.get_indexer(labels), -1)
+    return pd.Categorical.from_codes(remap[codes], categories=categories)
+
 # Instance globale
-data_loader = DataLoader()
+data_loader = DataLoader(vocabulary=item_vocabulary)
@@ -6,6 +6,7 @@ import pandas as pd
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
+from metrics import timed_db
 
 class Database:
     def __init__(self):
@@ -35,7 +36,7 @@ class Database:
     
     def execute_query(self, query, params=None, fetch=True):
         """Exécuter une requête SQL"""
-        with self.get_connection() as conn:
+        with timed_db(self._operation(query)), self.get_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute(query, params)
                 if fetch:
@@ -44,11 +45,17 @@ class Database:
     
     def execute_many(self, query, data):
         """Exécuter une requête avec plusieurs ensembles de paramètres"""
-        with self.get_connection() as conn:
+        with timed_db(self._operation(query) + '_many'), self.get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.executemany(query, data)
                 return cursor.rowcount
     
+    @staticmethod
+    def _operation(query):
+        """Nom d'opération pour les métriques (premier mot-clé SQL)"""
+        parts = query.split(None, 1)
+        return parts[0].lower() if parts else 'unknown'
+    
     def get_stats(self):
         """Obtenir les statistiques de la base de données"""
         query = "SELECT * FROM stats_view"
@@ -78,8 +85,14 @@ class Database:
         ]
         return self.execute_many(query, data)
     
-    def save_frequent_itemsets(self, itemsets_df):
-        """Sauvegarder les itemsets fréquents"""
+    def save_frequent_itemsets(self, itemsets_df, vocabulary=None):
+        """
+        Sauvegarder les itemsets fréquents
+        
+        Args:
+            itemsets_df: DataFrame des itemsets
+            vocabulary: Vocabulaire pour retrouver les noms si les itemsets sont des identifiants
+        """
         # Supprimer les anciens itemsets
         self.execute_query("DELETE FROM frequent_itemsets", fetch=False)
         
@@ -89,7 +102,7 @@ class Database:
         """
         data = [
             (
-                ','.join(map(str, row['itemsets'])),
+                _label(row['itemsets'], vocabulary),
                 float(row['support']),
                 len(row['itemsets'])
             )
@@ -97,8 +110,14 @@ class Database:
         ]
         return self.execute_many(query, data)
     
-    def save_association_rules(self, rules_df):
-        """Sauvegarder les règles d'association"""
+    def save_association_rules(self, rules_df, vocabulary=None):
+        """
+        Sauvegarder les règles d'association
+        
+        Args:
+            rules_df: DataFrame des règles
+            vocabulary: Vocabulaire pour retrouver les noms si les règles sont des identifiants
+        """
         # Supprimer les anciennes règles
         self.execute_query("DELETE FROM association_rules", fetch=False)
         
@@ -109,8 +128,8 @@ class Database:
         """
         data = [
             (
-                ','.join(map(str, row['antecedents'])),
-                ','.join(map(str, row['consequents'])),
+                _label(row['antecedents'], vocabulary),
+                _label(row['consequents'], vocabulary),
                 float(row['support']),
                 float(row['confidence']),
                 float(row['lift']),
@@ -157,9 +176,28 @@ class Database:
                 country as "Country"
             FROM transactions
         """
-        with self.get_connection() as conn:
+        with timed_db('select_transactions'), self.get_connection() as conn:
             return pd.read_sql_query(query, conn)
 
+    def stream_transactions(self, batch_size=10000):
+        """
+        Lire les lignes (facture, description) en flux, triées par facture
+
+        Un curseur nommé (côté serveur) ne transfère que batch_size lignes
+        à la fois : la table n'est jamais chargée en entier en mémoire.
+        """
+        query = """
+            SELECT invoice_no, description
+            FROM transactions
+            WHERE quantity > 0 AND unit_price > 0 AND invoice_no NOT LIKE 'C%'
+            ORDER BY invoice_no
+        """
+        with timed_db('stream_transactions'), self.get_connection() as conn:
+            with conn.cursor(name='stream_transactions') as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query)
+                yield from cursor
+
     def clear_all_data(self):
         """Supprimer toutes les données de la base"""
         queries = [
@@ -168,11 +206,17 @@ class Database:
             "TRUNCATE TABLE association_rules CASCADE",
             "TRUNCATE TABLE recommendations CASCADE"
         ]
-        with self.get_connection() as conn:
+        with timed_db('truncate'), self.get_connection() as conn:
             with conn.cursor() as cursor:
                 for query in queries:
                     cursor.execute(query)
         return True
 
+def _label(items, vocabulary=None):
+    """Représentation texte d'un itemset ('A,B,C')"""
+    if vocabulary is not None:
+        items = vocabulary.decode(items)
+    return ','.join(map(str, items))
+
 # Instance globale
 db = Database()
\ No newline at end of file
@@ -1,17 +1,49 @@
 ﻿"""
 Moteur FP-Growth pour l'extraction d'itemsets fréquents et de règles d'association
 """
-from mlxtend.frequent_patterns import fpgrowth, association_rules
+from mlxtend.frequent_patterns import fpgrowth, fpmax, association_rules
 from mlxtend.preprocessing import TransactionEncoder
 import pandas as pd
 import numpy as np
+import time
+from collections import defaultdict
+from itertools import combinations
+from metrics import timed_stage
+from fptree import encode_transactions, mine_top_k, mine_closed
+from vocabulary import item_vocabulary
+import rule_compaction
+import sampling
+import serialization
+import out_of_core
+from rule_index import RuleIndex
+
+# Modes d'extraction : tous les itemsets fréquents, fermés ou maximaux
+MINING_MODES = ('support', 'closed', 'maximal')
 
 class FPGrowthEngine:
-    def __init__(self, min_support=0.01, min_confidence=0.5):
+    def __init__(self, min_support=0.01, min_confidence=0.5, vocabulary=None):
         self.min_support = min_support
         self.min_confidence = min_confidence
+        # Vocabulaire des identifiants d'items (colonnes de la matrice panier) ;
+        # None si les colonnes sont directement des noms
+        self.vocabulary = vocabulary
         self.frequent_itemsets = None
         self.rules = None
+        self.last_basket_nbytes = None
+        self.mode = 'support'
+        # Supports des sous-ensembles absents des itemsets extraits (mode top-K),
+        # nécessaires au calcul des règles
+        self.subset_supports = None
+        # Index item -> positions dans frequent_itemsets (mode fermé)
+        self._closed_index = None
+        # Listes item -> positions des règles (reconstruites avec les règles)
+        self.rule_index = None
+        # Rapport de la dernière compaction des règles
+        self.compaction = None
+        # Fenêtre temporelle de la dernière extraction (None = tout l'historique)
+        self.window = None
+        # Rapport de la dernière extraction hors mémoire
+        self.out_of_core = None
     
     def find_frequent_itemsets(self, basket_df):
         """
@@ -23,25 +55,272 @@ class FPGrowthEngine:
         Returns:
             DataFrame des itemsets fréquents
         """
-        print(f"Recherche des itemsets fréquents (min_support={self.min_support})...")
+        self.last_basket_nbytes = int(basket_df.memory_usage(index=True).sum())
+        self.mode = 'support'
+        self.subset_supports = None
+        
+        with timed_stage('mine', min_support=self.min_support) as info:
+            # Appliquer FP-Growth
+            self.frequent_itemsets = fpgrowth(
+                basket_df, 
+                min_support=self.min_support, 
+                use_colnames=True
+            )
+            
+            # Trier par support décroissant
+            self.frequent_itemsets = self.frequent_itemsets.sort_values(
+                'support', 
+                ascending=False
+            ).reset_index(drop=True)
+            
+            info['rows'] = len(self.frequent_itemsets)
+        
+        return self.frequent_itemsets
+    
+    def find_closed_itemsets(self, basket_df):
+        """
+        Trouver les itemsets fréquents fermés (aucun sur-ensemble de même support)
+        
+        Les itemsets non fermés sont élagués pendant l'extraction ; le support de
+        tout itemset fréquent reste disponible via get_itemset_support.
+        
+        Args:
+            basket_df: DataFrame one-hot encoding (factures × produits)
+        
+        Returns:
+            DataFrame des itemsets fermés
+        """
+        self.last_basket_nbytes = int(basket_df.memory_usage(index=True).sum())
+        self.mode = 'closed'
+        self.subset_supports = None
+        
+        with timed_stage('mine', mode='closed', min_support=self.min_support) as info:
+            transactions, n_transactions = encode_transactions(basket_df)
+            closed = mine_closed(transactions, self.min_support * n_transactions)
+            
+            columns = basket_df.columns.tolist()
+            self.frequent_itemsets = pd.DataFrame({
+                'support': [count / n_transactions for _, count in closed],
+                'itemsets': [frozenset(columns[i] for i in items) for items, _ in closed]
+            }, columns=['support', 'itemsets']).sort_values(
+                'support',
+                ascending=False
+            ).reset_index(drop=True)
+            
+            self._closed_index = defaultdict(list)
+            for position, itemset in enumerate(self.frequent_itemsets['itemsets']):
+                for item in itemset:
+                    self._closed_index[item].append(position)
+            
+            info['rows'] = len(self.frequent_itemsets)
+        
+        return self.frequent_itemsets
+    
+    def find_maximal_itemsets(self, basket_df):
+        """
+        Trouver les itemsets fréquents maximaux (aucun sur-ensemble fréquent), via FPMax
+        
+        Les supports des sous-ensembles ne sont pas déductibles des maximaux :
+        ceux nécessaires aux règles sont comptés sur la matrice panier.
+        
+        Args:
+            basket_df: DataFrame one-hot encoding (factures × produits)
+        
+        Returns:
+            DataFrame des itemsets maximaux
+        """
+        self.last_basket_nbytes = int(basket_df.memory_usage(index=True).sum())
+        self.mode = 'maximal'
+        
+        with timed_stage('mine', mode='maximal', min_support=self.min_support) as info:
+            maximal = fpmax(basket_df, min_support=self.min_support)
+            
+            columns = basket_df.columns.tolist()
+            itemsets = [(tuple(sorted(items)), support) for items, support in zip(maximal['itemsets'], maximal['support'])]
+            self.frequent_itemsets = pd.DataFrame({
+                'support': [support for _, support in itemsets],
+                'itemsets': [frozenset(columns[i] for i in items) for items, _ in itemsets]
+            }, columns=['support', 'itemsets']).sort_values(
+                'support',
+                ascending=False
+            ).reset_index(drop=True)
+            self.subset_supports = self._count_missing_subsets(basket_df, itemsets)
+            
+            info['rows'] = len(self.frequent_itemsets)
+        
+        return self.frequent_itemsets
+    
+    def get_itemset_support(self, items):
+        """
+        Support d'un itemset fréquent, calculé à la demande
+        
+        En mode fermé, c'est le plus grand support des fermés qui le contiennent.
+        
+        Returns:
+            support, ou None si l'itemset n'est pas fréquent
+        """
+        itemset = frozenset(items)
+        if self.frequent_itemsets is None or not itemset:
+            return None
+        
+        if self.mode == 'closed':
+            postings = [self._closed_index.get(item) for item in itemset]
+            if not all(postings):
+                return None
+            shortest = min(postings, key=len)
+            itemsets = self.frequent_itemsets['itemsets'].values
+            supports = self.frequent_itemsets['support'].values
+            # Fermés triés par support décroissant : le premier sur-ensemble est le bon
+            for position in shortest:
+                if itemset <= itemsets[position]:
+                    return float(supports[position])
+            return None
+        
+        frames = [self.frequent_itemsets]
+        if self.subset_supports is not None:
+            frames.append(self.subset_supports)
+        for frame in frames:
+            for candidate, support in zip(frame['itemsets'], frame['support']):
+                if candidate == itemset:
+                    return float(support)
+        return None
+    
+    def find_windowed_itemsets(self, window_index, days, end=None, half_life_days=None):
+        """
+        Trouver les itemsets fréquents des N derniers jours
+        
+        Combine les partitions journalières de window_index, avec une
+        décroissance exponentielle optionnelle des jours les plus anciens.
+        
+        Args:
+            window_index: TimeWindowIndex des transactions
+            days: Taille de la fenêtre en jours
+            end: Dernier jour inclus (par défaut le plus récent)
+            half_life_days: Demi-vie de la décroissance (None = poids égaux)
+        
+        Returns:
+            DataFrame des itemsets fréquents
+        """
+        self.last_basket_nbytes = None
+        self.mode = 'support'
+        self.subset_supports = None
         
-        # Appliquer FP-Growth
-        self.frequent_itemsets = fpgrowth(
-            basket_df, 
-            min_support=self.min_support, 
-            use_colnames=True
-        )
+        with timed_stage('mine', mode='window', window_days=days, half_life_days=half_life_days,
+                         min_support=self.min_support) as info:
+            itemsets, self.window = window_index.mine(self.min_support, days, end, half_life_days)
+            
+            self.frequent_itemsets = pd.DataFrame({
+                'support': [support for _, support in itemsets],
+                'itemsets': [items for items, _ in itemsets]
+            }, columns=['support', 'itemsets']).sort_values(
+                'support',
+                ascending=False
+            ).reset_index(drop=True)
+            
+            info['rows'] = len(self.frequent_itemsets)
+            info['partitions'] = self.window['partitions']
         
-        # Trier par support décroissant
-        self.frequent_itemsets = self.frequent_itemsets.sort_values(
-            'support', 
-            ascending=False
-        ).reset_index(drop=True)
+        return self.frequent_itemsets
+    
+    def find_out_of_core_itemsets(self, source, budget_bytes=None, spill_dir=None):
+        """
+        Trouver les itemsets fréquents sans charger les transactions en mémoire
         
-        print(f"✓ {len(self.frequent_itemsets)} itemsets fréquents trouvés")
+        Extraction SON en trois passes sur source : les partitions tiennent
+        dans budget_bytes et les candidats locaux sont déversés sur disque.
+        Le résultat est identique à find_frequent_itemsets.
+        
+        Args:
+            source: Fonction retournant un itérateur de (facture, description)
+                    triés par facture (out_of_core.db_source ou frame_source)
+            budget_bytes: Mémoire maximum d'une partition (None = configuration)
+            spill_dir: Dossier des candidats déversés (None = configuration)
+        
+        Returns:
+            DataFrame des itemsets fréquents
+        """
+        if self.vocabulary is None:
+            raise ValueError("L'extraction hors mémoire nécessite un vocabulaire d'items")
+        
+        self.last_basket_nbytes = None
+        self.mode = 'support'
+        self.subset_supports = None
+        
+        with timed_stage('mine', mode='out_of_core', min_support=self.min_support,
+                         budget_bytes=budget_bytes) as info:
+            itemsets, self.out_of_core = out_of_core.mine_out_of_core(
+                source, self.vocabulary, self.min_support, budget_bytes, spill_dir
+            )
+            
+            self.frequent_itemsets = pd.DataFrame({
+                'support': [support for _, support in itemsets],
+                'itemsets': [items for items, _ in itemsets]
+            }, columns=['support', 'itemsets']).sort_values(
+                'support',
+                ascending=False
+            ).reset_index(drop=True)
+            
+            info['rows'] = len(self.frequent_itemsets)
+            info['partitions'] = self.out_of_core['partitions']
+            info['candidates'] = self.out_of_core['candidates']
         
         return self.frequent_itemsets
     
+    def find_top_k_itemsets(self, basket_df, k, min_length=1):
+        """
+        Trouver les K itemsets les plus fréquents, sans seuil de support
+        
+        Le seuil interne remonte pendant le parcours du FP-tree ; le support
+        du K-ième itemset devient le min_support du moteur.
+        
+        Args:
+            basket_df: DataFrame one-hot encoding (factures × produits)
+            k: Nombre d'itemsets à retourner
+            min_length: Longueur minimum des itemsets retournés
+        
+        Returns:
+            DataFrame des itemsets fréquents
+        """
+        self.last_basket_nbytes = int(basket_df.memory_usage(index=True).sum())
+        self.mode = 'top_k'
+        
+        with timed_stage('mine', mode='top_k', top_k=k, min_length=min_length) as info:
+            transactions, n_transactions = encode_transactions(basket_df)
+            top, border = mine_top_k(transactions, k, min_length)
+            
+            columns = basket_df.columns.tolist()
+            self.frequent_itemsets = pd.DataFrame({
+                'support': [count / n_transactions for _, count in top],
+                'itemsets': [frozenset(columns[i] for i in items) for items, _ in top]
+            })
+            self.min_support = border / n_transactions if n_transactions else 0
+            self.subset_supports = self._count_missing_subsets(basket_df, top)
+            
+            info['rows'] = len(self.frequent_itemsets)
+            info['min_support_reached'] = self.min_support
+        
+        return self.frequent_itemsets
+    
+    def _count_missing_subsets(self, basket_df, itemsets):
+        """Compter les sous-ensembles des itemsets qui ne figurent pas dans le résultat"""
+        present = {frozenset(items) for items, _ in itemsets}
+        missing = set()
+        for items, _ in itemsets:
+            for size in range(1, len(items)):
+                for subset in combinations(items, size):
+                    subset = frozenset(subset)
+                    if subset not in present:
+                        missing.add(subset)
+        
+        values = basket_df.values
+        columns = basket_df.columns.tolist()
+        n_transactions = max(1, values.shape[0])
+        missing = list(missing)
+        return pd.DataFrame({
+            'support': [values[:, sorted(subset)].all(axis=1).sum() / n_transactions for subset in missing],
+            'itemsets': [frozenset(columns[i] for i in subset) for subset in missing]
+        })
+    
     def generate_rules(self, metric='confidence', min_threshold=None):
         """
         Générer les règles d'association
@@ -59,25 +338,226 @@ class FPGrowthEngine:
         if min_threshold is None:
             min_threshold = self.min_confidence
         
-        print(f"Génération des règles d'association (min_{metric}={min_threshold})...")
+        if self.mode == 'closed':
+            return self._generate_rules_from_closed(metric, min_threshold)
         
-        # Générer les règles
-        self.rules = association_rules(
-            self.frequent_itemsets,
-            metric=metric,
-            min_threshold=min_threshold
-        )
+        with timed_stage('rules', metric=metric, min_threshold=min_threshold) as info:
+            base = self.frequent_itemsets
+            if self.subset_supports is not None and len(self.subset_supports) > 0:
+                base = pd.concat([base, self.subset_supports], ignore_index=True)
+            
+            # Générer les règles
+            self.rules = association_rules(
+                base,
+                metric=metric,
+                min_threshold=min_threshold
+            )
+            
+            # Ne garder que les règles issues des itemsets extraits
+            if base is not self.frequent_itemsets and len(self.rules) > 0:
+                kept = set(self.frequent_itemsets['itemsets'])
+                self.rules = self.rules[[
+                    (a | c) in kept
+                    for a, c in zip(self.rules['antecedents'], self.rules['consequents'])
+                ]]
+            
+            # Trier par confiance et lift
+            self.rules = self.rules.sort_values(
+                ['confidence', 'lift'], 
+                ascending=False
+            ).reset_index(drop=True)
+            self.rule_index = RuleIndex(self.rules)
+            
+            info['rows'] = len(self.rules)
+        
+        return self.rules
+    
+    def _generate_rules_from_closed(self, metric, min_threshold):
+        """
+        Générer les règles A → C \\ A pour chaque itemset fermé C
+        
+        Les supports des antécédents et conséquents (non fermés en général) sont
+        déduits à la demande des fermés. Les règles dont l'union n'est pas fermée
+        sont omises : elles ont le même support et la même confiance qu'une règle
+        produite vers la fermeture de leur union.
+        """
+        with timed_stage('rules', mode='closed', metric=metric, min_threshold=min_threshold) as info:
+            memo = {}
+            
+            def support_of(itemset):
+                if itemset not in memo:
+                    memo[itemset] = self.get_itemset_support(itemset)
+                return memo[itemset]
+            
+            antecedents, consequents, s_a, s_c, s_ac = [], [], [], [], []
+            for itemset, support in zip(self.frequent_itemsets['itemsets'], self.frequent_itemsets['support']):
+                if len(itemset) < 2:
+                    continue
+                for size in range(len(itemset) - 1, 0, -1):
+                    for combo in combinations(itemset, size):
+                        antecedent = frozenset(combo)
+                        consequent = itemset - antecedent
+                        antecedents.append(antecedent)
+                        consequents.append(consequent)
+                        s_a.append(support_of(antecedent))
+                        s_c.append(support_of(consequent))
+                        s_ac.append(support)
+            
+            s_a = np.array(s_a, dtype=float)
+            s_c = np.array(s_c, dtype=float)
+            s_ac = np.array(s_ac, dtype=float)
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                confidence = s_ac / s_a
+                lift = confidence / s_c
+                leverage = s_ac - s_a * s_c
+                conviction = np.where(confidence < 1.0, (1.0 - s_c) / (1.0 - confidence), np.inf)
+                denominator = np.maximum(s_ac * (1 - s_a), s_a * (s_c - s_ac))
+                zhangs_metric = np.where(denominator == 0, 0, leverage / denominator)
+            
+            rules = pd.DataFrame({
+                'antecedents': antecedents,
+                'consequents': consequents,
+                'antecedent support': s_a,
+                'consequent support': s_c,
+                'support': s_ac,
+                'confidence': confidence,
+                'lift': lift,
+                'leverage': leverage,
+                'conviction': conviction,
+                'zhangs_metric': zhangs_metric
+            })
+            
+            if metric not in rules.columns:
+                raise ValueError(f"Métrique inconnue: {metric}")
+            
+            self.rules = rules[rules[metric] >= min_threshold].sort_values(
+                ['confidence', 'lift'],
+                ascending=False
+            ).reset_index(drop=True)
+            self.rule_index = RuleIndex(self.rules)
+            
+            info['rows'] = len(self.rules)
+        
+        return self.rules
+    
+    def compact_rules(self, min_lift=1.0, criteria=('confidence', 'lift'), min_improvement=0.0,
+                      measure_latency=True):
+        """
+        Supprimer les règles non productives et redondantes de self.rules
+        
+        Args:
+            min_lift: Lift minimum d'une règle productive
+            criteria: Métriques sur lesquelles une règle plus longue doit faire mieux
+                      que ses généralisations
+            min_improvement: Gain minimum exigé sur au moins un critère
+            measure_latency: Mesurer la latence de recommend avant/après
+        
+        Returns:
+            DataFrame des règles compactées
+        """
+        if self.rules is None:
+            raise ValueError("Les règles doivent être générées d'abord")
         
-        # Trier par confiance et lift
-        self.rules = self.rules.sort_values(
-            ['confidence', 'lift'], 
-            ascending=False
-        ).reset_index(drop=True)
+        with timed_stage('compact', min_lift=min_lift) as info:
+            before = self.rules
+            self.rules, self.compaction = rule_compaction.compact_rules(before, min_lift, tuple(criteria), min_improvement)
+            self.rule_index = RuleIndex(self.rules)
+            info['rows'] = len(self.rules)
+            info['removed'] = self.compaction['rules_before'] - self.compaction['rules_after']
         
-        print(f"✓ {len(self.rules)} règles générées")
+        if measure_latency:
+            self.compaction['recommend_latency'] = rule_compaction.measure_recommend_latency(before, self.rules)
         
         return self.rules
     
+    def compare_modes(self, basket_df, modes=MINING_MODES):
+        """
+        Comparer taille des résultats et temps d'exécution des modes d'extraction
+        
+        Chaque mode est exécuté sur un moteur séparé aux mêmes seuils ; l'état
+        de ce moteur n'est pas modifié.
+        
+        Returns:
+            dict {mode: {'itemsets', 'rules', 'mining_seconds', 'rules_seconds'}}
+        """
+        comparison = {}
+        for mode in modes:
+            engine = FPGrowthEngine(self.min_support, self.min_confidence, self.vocabulary)
+            
+            start = time.perf_counter()
+            if mode == 'closed':
+                itemsets = engine.find_closed_itemsets(basket_df)
+            elif mode == 'maximal':
+                itemsets = engine.find_maximal_itemsets(basket_df)
+            else:
+                itemsets = engine.find_frequent_itemsets(basket_df)
+            mining_seconds = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            rules = engine.generate_rules()
+            rules_seconds = time.perf_counter() - start
+            
+            comparison[mode] = {
+                'itemsets': len(itemsets),
+                'rules': len(rules),
+                'mining_seconds': round(mining_seconds, 4),
+                'rules_seconds': round(rules_seconds, 4)
+            }
+        
+        return comparison
+    
+    def preview(self, basket_df, epsilon=None, delta=0.05, verify=False, seed=42, n_invoices=None):
+        """
+        Aperçu des itemsets et règles sur un échantillon de factures
+        
+        La taille de l'échantillon découle de epsilon et delta ; l'état du
+        moteur (itemsets, règles) n'est pas modifié.
+        
+        Args:
+            basket_df: DataFrame one-hot encoding (factures × produits), ou
+                       l'échantillon déjà tiré si n_invoices est fourni
+            n_invoices: Nombre de factures de la matrice complète (échantillon fourni)
+            epsilon: Erreur tolérée sur un support proche de min_support
+                     (par défaut min_support / 4)
+            delta: Probabilité tolérée de dépasser epsilon
+            verify: Vérifier les candidats par une passe de comptage sur toutes les factures
+            seed: Graine de l'échantillonnage
+        
+        Returns:
+            dict avec itemsets (intervalles de support), règles et rapport
+        """
+        with timed_stage('preview', min_support=self.min_support, epsilon=epsilon, verify=verify) as info:
+            if n_invoices is None:
+                itemsets, report = sampling.preview_itemsets(
+                    basket_df, self.min_support, epsilon, delta, verify, seed
+                )
+            elif verify:
+                raise ValueError("La vérification compte toutes les factures : la matrice complète est requise")
+            else:
+                itemsets, report = sampling.preview_sample(
+                    basket_df, n_invoices, self.min_support, epsilon, delta
+                )
+            
+            if itemsets['itemsets'].apply(len).gt(1).any():
+                rules = association_rules(
+                    itemsets[['support', 'itemsets']],
+                    metric='confidence',
+                    min_threshold=self.min_confidence
+                ).sort_values(['confidence', 'lift'], ascending=False).reset_index(drop=True)
+            else:
+                rules = pd.DataFrame(columns=['antecedents', 'consequents', 'support', 'confidence', 'lift'])
+            
+            report['rules'] = len(rules)
+            info['rows'] = len(itemsets)
+            info['sample_size'] = report['sample_size']
+        
+        return {
+            'itemsets': itemsets,
+            'rules': rules,
+            'report': report
+        }
+    
     def get_itemsets_by_length(self, length):
         """Obtenir les itemsets d'une longueur spécifique"""
         if self.frequent_itemsets is None:
@@ -107,35 +587,123 @@ class FPGrowthEngine:
         
         return filtered.head(n)
     
-    def get_rules_for_item(self, item):
-        """Obtenir les règles contenant un item spécifique"""
+    def filter_itemsets(self, min_support=None, min_length=None, max_length=None):
+        """Positions (par support décroissant) des itemsets satisfaisant les seuils"""
+        if self.frequent_itemsets is None:
+            return np.empty(0, dtype=np.int64)
+        
+        itemsets = self.frequent_itemsets
+        mask = np.ones(len(itemsets), dtype=bool)
+        if min_support is not None:
+            mask &= itemsets['support'].to_numpy() >= min_support
+        if min_length is not None or max_length is not None:
+            lengths = np.fromiter((len(x) for x in itemsets['itemsets']), dtype=np.int32, count=len(itemsets))
+            if min_length is not None:
+                mask &= lengths >= min_length
+            if max_length is not None:
+                mask &= lengths <= max_length
+        return np.flatnonzero(mask)
+    
+    def filter_rules(self, min_lift=None, min_confidence=None, min_length=None, max_length=None):
+        """Positions (par confiance puis lift) des règles satisfaisant les seuils"""
+        if self.rules is None:
+            return np.empty(0, dtype=np.int64)
+        return self.rule_index.filter(min_lift, min_confidence, min_length, max_length)
+    
+    def item_id(self, item):
+        """Identifiant d'un nom d'item (None s'il est inconnu)"""
+        if self.vocabulary is None:
+            return item
+        return self.vocabulary.id_of(item)
+    
+    def get_rules_for_item(self, item, side='any', sort='confidence', offset=0, limit=None):
+        """
+        Obtenir les règles contenant un item spécifique
+        
+        Args:
+            item: Nom de l'item
+            side: 'any', 'antecedents' ou 'consequents'
+            sort: 'confidence' (ordre des règles) ou 'lift'
+            offset: Position de la première règle retournée
+            limit: Nombre maximum de règles (None = toutes)
+        
+        Returns:
+            DataFrame des règles
+        """
         if self.rules is None:
             return pd.DataFrame()
         
-        # Chercher dans les antécédents et conséquents
-        mask = self.rules['antecedents'].apply(lambda x: item in x) | \
-               self.rules['consequents'].apply(lambda x: item in x)
+        item = self.item_id(item)
+        if item is None:
+            return self.rules.iloc[0:0]
         
-        return self.rules[mask]
+        # Listes de positions : le coût ne dépend que des règles de l'item
+        positions, _ = self.rule_index.page(item, side, sort, offset, limit)
+        return self.rules.iloc[positions]
+    
+    def count_rules_for_item(self, item, side='any'):
+        """Nombre de règles contenant un item (du côté demandé)"""
+        if self.rules is None:
+            return 0
+        item = self.item_id(item)
+        if item is None:
+            return 0
+        return self.rule_index.count(item, side)
     
-    def analyze(self, basket_df):
+    def analyze(self, basket_df, top_k=None, min_length=1, mode='support', compact=None, window=None,
+                out_of_core=None):
         """
         Effectuer l'analyse complète FP-Growth
         
         Args:
             basket_df: DataFrame one-hot encoding
+            top_k: Si fourni, extraire les top_k itemsets les plus fréquents
+                   au lieu d'appliquer min_support
+            min_length: Longueur minimum des itemsets en mode top-K
+            mode: 'support' (tous les itemsets fréquents), 'closed' ou 'maximal'
+            compact: Options de compact_rules (dict), ou True pour les valeurs
+                     par défaut ; None pour servir toutes les règles
+            window: Arguments de find_windowed_itemsets (window_index, days,
+                    end, half_life_days) pour n'extraire que les derniers jours ;
+                    basket_df n'est alors pas utilisé
+            out_of_core: Arguments de find_out_of_core_itemsets (source,
+                         budget_bytes, spill_dir) pour une extraction par
+                         partitions ; basket_df n'est alors pas utilisé
         
         Returns:
             dict avec itemsets et règles
         """
+        if mode not in MINING_MODES:
+            raise ValueError(f"Mode d'extraction inconnu: {mode}")
+        if top_k and mode != 'support':
+            raise ValueError("top_k ne se combine pas avec un autre mode que support")
+        
         # Trouver les itemsets fréquents
-        itemsets = self.find_frequent_itemsets(basket_df)
+        self.window = None
+        self.out_of_core = None
+        if out_of_core:
+            itemsets = self.find_out_of_core_itemsets(**out_of_core)
+        elif window:
+            itemsets = self.find_windowed_itemsets(**window)
+        elif top_k:
+            itemsets = self.find_top_k_itemsets(basket_df, top_k, min_length)
+        elif mode == 'closed':
+            itemsets = self.find_closed_itemsets(basket_df)
+        elif mode == 'maximal':
+            itemsets = self.find_maximal_itemsets(basket_df)
+        else:
+            itemsets = self.find_frequent_itemsets(basket_df)
         
         # Générer les règles
         rules = self.generate_rules()
         
+        self.compaction = None
+        if compact:
+            rules = self.compact_rules(**(compact if isinstance(compact, dict) else {}))
+        
         # Statistiques
         stats = {
+            'mode': self.mode,
             'total_itemsets': len(itemsets),
             'itemsets_by_length': {
                 i: len(self.get_itemsets_by_length(i))
@@ -148,6 +716,15 @@ class FPGrowthEngine:
             'min_support_used': self.min_support,
             'min_confidence_used': self.min_confidence
         }
+        if top_k:
+            stats['top_k'] = top_k
+            stats['min_length'] = min_length
+        if self.compaction:
+            stats['compaction'] = self.compaction
+        if self.window:
+            stats['window'] = self.window
+        if self.out_of_core:
+            stats['out_of_core'] = self.out_of_core
         
         return {
             'itemsets': itemsets,
@@ -155,43 +732,45 @@ class FPGrowthEngine:
             'stats': stats
         }
     
-    def format_itemsets_for_json(self, itemsets_df=None):
-        """Formater les itemsets pour JSON"""
+    def _names(self, items):
+        """Noms des items d'un itemset (frontière API)"""
+        if self.vocabulary is None:
+            return list(items)
+        return self.vocabulary.decode(items)
+    
+    def format_itemsets_for_json(self, itemsets_df=None, positions=None, shape='rows'):
+        """
+        Formater les itemsets pour JSON
+        
+        Args:
+            itemsets_df: DataFrame des itemsets (frequent_itemsets par défaut)
+            positions: Positions à formater (None = toutes)
+            shape: 'rows' (une entrée par itemset) ou 'columnar'
+        """
         if itemsets_df is None:
             itemsets_df = self.frequent_itemsets
         
         if itemsets_df is None or len(itemsets_df) == 0:
-            return []
+            return serialization.itemsets_payload(pd.DataFrame(columns=['support', 'itemsets']), shape=shape)
         
-        return [
-            {
-                'items': list(row['itemsets']),
-                'support': float(row['support']),
-                'length': len(row['itemsets'])
-            }
-            for _, row in itemsets_df.iterrows()
-        ]
+        return serialization.itemsets_payload(itemsets_df, positions, self.vocabulary, shape)
     
-    def format_rules_for_json(self, rules_df=None):
-        """Formater les règles pour JSON"""
+    def format_rules_for_json(self, rules_df=None, positions=None, shape='rows'):
+        """
+        Formater les règles pour JSON
+        
+        Args:
+            rules_df: DataFrame des règles (rules par défaut)
+            positions: Positions à formater (None = toutes)
+            shape: 'rows' (une entrée par règle) ou 'columnar'
+        """
         if rules_df is None:
             rules_df = self.rules
         
         if rules_df is None or len(rules_df) == 0:
-            return []
-        
-        return [
-            {
-                'antecedents': list(row['antecedents']),
-                'consequents': list(row['consequents']),
-                'support': float(row['support']),
-                'confidence': float(row['confidence']),
-                'lift': float(row['lift']),
-                'leverage': float(row.get('leverage', 0)),
-                'conviction': float(row.get('conviction', 0))
-            }
-            for _, row in rules_df.iterrows()
-        ]
+            return serialization.rules_payload(pd.DataFrame(columns=['antecedents', 'consequents']), shape=shape)
+        
+        return serialization.rules_payload(rules_df, positions, self.vocabulary, shape)
 
 # Instance globale
-fpgrowth_engine = FPGrowthEngine()
+fpgrowth_engine = FPGrowthEngine(vocabulary=item_vocabulary)
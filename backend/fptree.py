@@ -0,0 +1,275 @@
+"""
+FP-tree et variantes d'extraction (top-K, fermés) sur transactions pondérées
+
+Les transactions sont des couples (tuple d'identifiants d'items, poids).
+Les transactions identiques sont agrégées : le poids est leur nombre
+d'occurrences (ou un poids réel, ex: décroissance temporelle).
+"""
+import heapq
+from collections import defaultdict, Counter
+
+import numpy as np
+
+
+class _Node:
+    __slots__ = ('item', 'count', 'parent', 'children')
+
+    def __init__(self, item, parent):
+        self.item = item
+        self.count = 0
+        self.parent = parent
+        self.children = {}
+
+
+def encode_transactions(basket_df):
+    """
+    Convertir une matrice panier (factures × produits) en transactions agrégées
+
+    Returns:
+        (liste de (tuple d'indices de colonnes, nombre), nombre de factures)
+    """
+    values = np.asarray(basket_df.values, dtype=bool)
+    rows, cols = np.nonzero(values)
+    bounds = np.searchsorted(rows, np.arange(values.shape[0] + 1))
+
+    counts = Counter(
+        tuple(cols[bounds[r]:bounds[r + 1]].tolist())
+        for r in range(values.shape[0])
+    )
+    counts.pop((), None)
+    return list(counts.items()), values.shape[0]
+
+
+def item_counts(transactions):
+    """Support (pondéré) de chaque item"""
+    counts = defaultdict(int)
+    for items, weight in transactions:
+        for item in items:
+            counts[item] += weight
+    return counts
+
+
+def build_tree(transactions, min_count, counts=None):
+    """
+    Construire un FP-tree
+
+    Args:
+        transactions: liste de (tuple d'items, poids)
+        min_count: Support minimum des items conservés
+        counts: Supports des items s'ils sont déjà connus
+
+    Returns:
+        (items fréquents par support décroissant, supports, table d'en-tête item -> noeuds)
+    """
+    if counts is None:
+        counts = item_counts(transactions)
+    frequent = {item: c for item, c in counts.items() if c >= min_count}
+    order = sorted(frequent, key=lambda item: (-frequent[item], item))
+    rank = {item: r for r, item in enumerate(order)}
+
+    root = _Node(None, None)
+    header = defaultdict(list)
+    for items, weight in transactions:
+        path = sorted((item for item in items if item in rank), key=rank.__getitem__)
+        node = root
+        for item in path:
+            child = node.children.get(item)
+            if child is None:
+                child = node.children[item] = _Node(item, node)
+                header[item].append(child)
+            child.count += weight
+            node = child
+
+    return order, frequent, header
+
+
+def conditional_base(nodes):
+    """Base conditionnelle d'un item : chemins préfixes pondérés par le compte du noeud"""
+    base = []
+    for node in nodes:
+        path = []
+        parent = node.parent
+        while parent.item is not None:
+            path.append(parent.item)
+            parent = parent.parent
+        if path:
+            base.append((tuple(path), node.count))
+    return base
+
+
+def mine_frequent(transactions, min_count, max_length=None):
+    """
+    Extraire tous les itemsets de support >= min_count
+
+    Returns:
+        liste de (tuple d'items, support)
+    """
+    results = []
+
+    def grow(base, suffix):
+        order, counts, header = build_tree(base, min_count)
+        for item in order:
+            itemset = suffix + (item,)
+            results.append((itemset, counts[item]))
+            if max_length and len(itemset) >= max_length:
+                continue
+            cond = conditional_base(header[item])
+            if cond:
+                grow(cond, itemset)
+
+    grow(transactions, ())
+    return results
+
+
+class _TopK:
+    """Tas des K meilleurs itemsets et borne de support courante"""
+
+    def __init__(self, k, min_length, initial_border=0):
+        self.k = k
+        self.min_length = min_length
+        self.initial_border = initial_border
+        self.heap = []
+        self._seq = 0
+
+    @property
+    def border(self):
+        return self.heap[0][0] if len(self.heap) >= self.k else self.initial_border
+
+    def accepts(self, count):
+        """Un itemset (ou une extension) de ce support peut-il encore entrer ?"""
+        if len(self.heap) >= self.k:
+            return count > self.heap[0][0]
+        return count >= self.initial_border
+
+    def offer(self, itemset, count):
+        if len(itemset) < self.min_length:
+            return
+        self._seq += 1
+        entry = (count, self._seq, itemset)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif count > self.heap[0][0]:
+            heapq.heapreplace(self.heap, entry)
+
+    def results(self):
+        return [(itemset, count) for count, _, itemset in sorted(self.heap, key=lambda e: (-e[0], e[1]))]
+
+
+def mine_top_k(transactions, k, min_length=1, max_length=None):
+    """
+    Extraire les K itemsets les plus fréquents (longueur >= min_length)
+
+    La borne de support part du support du K-ième meilleur item et remonte dès
+    que le tas est plein : les branches dont le support ne dépasse plus la
+    borne ne sont jamais explorées. Les items sont parcourus par support
+    décroissant pour remonter la borne au plus tôt.
+
+    Returns:
+        (liste de (tuple d'items, support) triée par support décroissant, borne finale)
+    """
+    if k <= 0:
+        return [], 0
+
+    supports = sorted(item_counts(transactions).values(), reverse=True)
+    if not supports:
+        return [], 0
+    guess = supports[min(k, len(supports)) - 1]
+    # Le support du K-ième item borne exactement le résultat si les singletons comptent
+    exact = min_length <= 1 and len(supports) >= k
+
+    while True:
+        state = _TopK(k, min_length, guess)
+        _grow_top_k(transactions, (), state, max_length)
+        if len(state.heap) >= k or exact or guess == 0:
+            return state.results(), state.border
+        # Borne devinée trop haute : la diviser par deux et recommencer
+        if isinstance(guess, int):
+            guess //= 2
+        else:
+            guess = guess / 2 if guess > 1e-6 else 0
+
+
+def _grow_top_k(base, suffix, state, max_length):
+    order, counts, header = build_tree(base, state.border)
+    for item in order:
+        count = counts[item]
+        # Items triés par support décroissant : la suite ne peut pas faire mieux
+        if not state.accepts(count):
+            break
+        itemset = suffix + (item,)
+        state.offer(itemset, count)
+        if max_length and len(itemset) >= max_length:
+            continue
+        cond = conditional_base(header[item])
+        if cond:
+            _grow_top_k(cond, itemset, state, max_length)
+
+
+class _ClosedIndex:
+    """Itemsets fermés trouvés, indexés par (support, item) pour le test d'inclusion"""
+
+    def __init__(self):
+        self.itemsets = []
+        self._by_count_item = defaultdict(list)
+
+    def subsumed(self, itemset, count):
+        """Existe-t-il un fermé déjà trouvé qui contient itemset avec le même support ?"""
+        candidates = None
+        for item in itemset:
+            bucket = self._by_count_item.get((count, item))
+            if not bucket:
+                return False
+            if candidates is None or len(bucket) < len(candidates):
+                candidates = bucket
+        return any(itemset <= self.itemsets[i][0] for i in candidates)
+
+    def add(self, itemset, count):
+        index = len(self.itemsets)
+        self.itemsets.append((itemset, count))
+        for item in itemset:
+            self._by_count_item[(count, item)].append(index)
+
+
+def mine_closed(transactions, min_count):
+    """
+    Extraire les itemsets fermés (aucun sur-ensemble de même support), style FPClose
+
+    Élagage pendant l'extraction :
+    - fusion d'items : les items présents dans toute la base conditionnelle
+      rejoignent le préfixe au lieu d'ouvrir une branche ;
+    - inclusion : un préfixe contenu dans un fermé déjà trouvé de même support
+      n'est pas exploré (les items sont parcourus du moins au plus fréquent,
+      ce qui garantit que ce fermé a été produit avant).
+
+    Returns:
+        liste de (frozenset d'items, support)
+    """
+    closed = _ClosedIndex()
+
+    def grow(base, prefix, base_counts=None):
+        order, counts, header = build_tree(base, min_count, base_counts)
+        for item in reversed(order):
+            count = counts[item]
+            cond = conditional_base(header[item])
+
+            cond_counts = item_counts(cond)
+            merged = {j for j, c in cond_counts.items() if c == count}
+            candidate = frozenset(prefix) | merged | {item}
+            if closed.subsumed(candidate, count):
+                continue
+            closed.add(candidate, count)
+
+            if merged:
+                cond = [
+                    (path, weight)
+                    for path, weight in (
+                        (tuple(j for j in path if j not in merged), weight) for path, weight in cond
+                    )
+                    if path
+                ]
+                cond_counts = {j: c for j, c in cond_counts.items() if j not in merged}
+            if cond:
+                grow(cond, candidate, cond_counts)
+
+    grow(transactions, frozenset())
+    return closed.itemsets
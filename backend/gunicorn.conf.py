@@ -0,0 +1,22 @@
+"""
+Configuration gunicorn du service multi-processus
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Les workers partagent le modèle publié dans MODEL_STORE_DIR (fichiers
+mappés en mémoire) au lieu d'en garder chacun une copie. Les modèles par
+segment et l'historique client restent propres au processus qui les
+construit : /api/recommend refuse segment et customer_id dans ce mode.
+Les sessions de panier fonctionnent sur le modèle partagé, mais chaque
+worker garde ses propres sessions : un répartiteur collant
+(session_id -> worker) conserve le calcul incrémental.
+Les micro-lots de /api/recommend sont formés dans chaque worker, sur les
+tableaux de score du modèle partagé.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_WORKERS', '4'))
+# Les analyses FP-Growth dépassent le délai par défaut de 30 s
+timeout = int(os.getenv('WEB_TIMEOUT', '300'))
+raw_env = ['SERVING_MODE=shared']
@@ -2,8 +2,24 @@
 Service d'intégration LLM via Groq API
 """
 import os
+import json
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import List, Dict, Optional
+from metrics import LLM_DURATION
+
+# Nombre maximum d'appels LLM simultanés pour une liste de recommandations
+LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', 8))
+
+# Exécuteur partagé par toutes les requêtes : au plus LLM_MAX_WORKERS appels
+# simultanés dans le processus, quel que soit le nombre de requêtes
+_explain_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix='llm-explain')
+
+
+class LLMError(Exception):
+    """Appel LLM en échec (clé absente, erreur HTTP ou réseau)"""
+
 
 class LLMService:
     def __init__(self):
@@ -15,9 +31,15 @@ class LLMService:
                               basket_items: List[str], 
                               recommended_item: str,
                               confidence: float,
-                              lift: float) -> str:
+                              lift: float,
+                              strict: bool = False,
+                              timeout: float = 15) -> str:
         """
         Génère une explication en langage naturel pour une recommandation
+
+        Args:
+            strict: Lever LLMError en cas d'échec au lieu de renvoyer le message d'erreur
+            timeout: Délai de l'appel HTTP en secondes
         """
         prompt = f"""
         En tant qu'expert en e-commerce, explique pourquoi ce produit est recommandé :
@@ -31,8 +53,126 @@ class LLMService:
         Mets en avant la synergie entre les produits.
         """
         
-        return self._call_llm(prompt)
+        return self._call_llm(prompt, timeout=timeout, strict=strict)
     
+    def explain_recommendations_batch(self,
+                                      basket_items: List[str],
+                                      recommendations: List[Dict],
+                                      max_workers: int = 4,
+                                      timeout: float = 20.0,
+                                      mode: str = 'auto') -> Dict:
+        """
+        Génère les explications d'une liste de recommandations en une seule fois
+
+        Args:
+            basket_items: Items du panier
+            recommendations: Sortie de recommender.recommend (item, confidence, lift)
+            max_workers: Nombre maximum d'appels LLM simultanés (borné à LLM_MAX_WORKERS)
+            timeout: Délai global en secondes
+            mode: 'parallel' (un prompt par item), 'combined' (un seul prompt
+                  structuré) ou 'auto' (combined si les items dépassent max_workers)
+
+        Returns:
+            dict avec les explications par item (None si non obtenue à temps
+            ou si l'appel LLM a échoué)
+        """
+        max_workers = min(max(1, int(max_workers)), LLM_MAX_WORKERS)
+        if mode == 'auto':
+            mode = 'combined' if len(recommendations) > max_workers else 'parallel'
+
+        start = time.perf_counter()
+        if mode == 'combined':
+            explanations = self._explain_combined(basket_items, recommendations, timeout)
+        else:
+            explanations = self._explain_parallel(basket_items, recommendations, max_workers, timeout)
+
+        return {
+            'mode': mode,
+            'explanations': [
+                {
+                    'item': rec['item'],
+                    'explanation': explanations.get(rec['item'])
+                }
+                for rec in recommendations
+            ],
+            'complete': all(explanations.get(rec['item']) for rec in recommendations),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+
+    def _explain_parallel(self, basket_items, recommendations, max_workers, timeout) -> Dict[str, str]:
+        """
+        Un appel LLM par recommandation, au plus max_workers en parallèle
+
+        Les appels passent par l'exécuteur partagé et sont soumis au fur et à
+        mesure ; chacun est borné par le temps restant, un appel en retard se
+        termine donc avec l'échéance au lieu d'occuper un thread.
+        """
+        deadline = time.monotonic() + timeout
+        queued = list(recommendations)
+        running = {}
+        explanations = {}
+
+        while queued or running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            while queued and len(running) < max_workers:
+                rec = queued.pop(0)
+                future = _explain_executor.submit(
+                    self.explain_recommendation,
+                    basket_items,
+                    rec['item'],
+                    float(rec.get('confidence', 0.0)),
+                    float(rec.get('lift', 0.0)),
+                    strict=True,
+                    timeout=remaining
+                )
+                running[future] = rec['item']
+
+            done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            # Les appels en échec lèvent LLMError et sont comptés comme manquants
+            for future in done:
+                item = running.pop(future)
+                if future.exception() is None:
+                    explanations[item] = future.result()
+
+        # Résultats partiels : les appels encore en file ne partent pas
+        for future in running:
+            future.cancel()
+
+        return explanations
+
+    def _explain_combined(self, basket_items, recommendations, timeout) -> Dict[str, str]:
+        """Un seul prompt structuré pour toutes les recommandations"""
+        lines = "\n".join([
+            f"- {rec['item']} (confiance {float(rec.get('confidence', 0.0)):.1%}, "
+            f"lift {float(rec.get('lift', 0.0)):.2f})"
+            for rec in recommendations
+        ])
+        prompt = f"""
+        En tant qu'expert en e-commerce, explique pourquoi chacun de ces produits est recommandé :
+        
+        Panier actuel : {', '.join(basket_items)}
+        Produits recommandés :
+        {lines}
+        
+        Pour chaque produit, fournis une explication courte (max 2 phrases) et engageante pour le client.
+        Mets en avant la synergie entre les produits.
+        
+        Réponds uniquement au format JSON, avec les noms de produits EXACTS comme clés :
+        {{"NOM DU PRODUIT": "explication", ...}}
+        """
+
+        try:
+            response = self._call_llm(prompt, max_tokens=120 * len(recommendations), timeout=timeout, strict=True)
+            parsed = json.loads(response[response.index('{'):response.rindex('}') + 1])
+        except (LLMError, ValueError):
+            return {}
+        if not isinstance(parsed, dict):
+            return {}
+
+        return {item: text for item, text in parsed.items() if isinstance(text, str)}
+
     def detect_shopping_context(self, basket_items: List[str]) -> Dict:
         """
         Détecte le contexte d'achat (événement, thème, besoin)
@@ -56,7 +196,6 @@ class LLMService:
         
         response = self._call_llm(prompt)
         try:
-            import json
             return json.loads(response)
         except:
             return {
@@ -165,13 +304,20 @@ Luna, réponds maintenant (RAPPEL: Priorise FP-Growth et sois PERSUASIVE !) :
         
         return self._call_llm(prompt, max_tokens=350)
     
-    def _call_llm(self, prompt: str, max_tokens: int = 250) -> str:
+    def _call_llm(self, prompt: str, max_tokens: int = 250, timeout: float = 15, strict: bool = False) -> str:
         """
         Appelle l'API Groq
+
+        Args:
+            strict: Lever LLMError en cas d'échec au lieu de renvoyer le message d'erreur
         """
         if not self.api_key:
+            if strict:
+                raise LLMError("LLM non configuré (API key manquante)")
             return "LLM non configuré (API key manquante)"
         
+        start = time.perf_counter()
+        status = 'ok'
         try:
             response = requests.post(
                 f"{self.base_url}/chat/completions",
@@ -190,17 +336,27 @@ Luna, réponds maintenant (RAPPEL: Priorise FP-Growth et sois PERSUASIVE !) :
                     "max_tokens": max_tokens,
                     "temperature": 0.8  # Plus de créativité pour Luna
                 },
-                timeout=15
+                timeout=timeout
             )
             
             if response.status_code == 200:
                 data = response.json()
                 return data['choices'][0]['message']['content'].strip()
             else:
+                status = f'http_{response.status_code}'
+                if strict:
+                    raise LLMError(f"Erreur LLM : {response.status_code}")
                 return f"Erreur LLM : {response.status_code}"
                 
+        except LLMError:
+            raise
         except Exception as e:
+            status = 'error'
+            if strict:
+                raise LLMError(f"Erreur lors de l'appel au LLM : {str(e)}") from e
             return f"Erreur lors de l'appel au LLM : {str(e)}"
+        finally:
+            LLM_DURATION.observe(time.perf_counter() - start, status=status)
 
 # Instance globale
 llm_service = LLMService()
@@ -0,0 +1,429 @@
+"""
+Recommandations matérialisées pour les paniers fréquents
+
+La plupart des paniers servis sont exactement un itemset fréquent déjà
+extrait. Après l'analyse, les top-N recommandations de chaque itemset
+fréquent de longueur au plus max_length sont calculées par lots vectorisés
+(produit creux paniers × antécédents), dans plusieurs processus et dans un
+budget de temps, puis rangées dans une table :
+
+- clé : tuple trié des identifiants d'items du panier ;
+- valeur : (item recommandé, position de la règle retenue), au format CSR
+  (tableaux concaténés et positions de début), publiés avec le modèle.
+
+Les top-N sont calculés sans seuil de confiance et triés comme dans
+Recommender.recommend : filtrer cette liste par min_confidence puis la
+tronquer à top_n donne exactement la sortie de recommend, pour tout
+top_n ≤ N (ou tout top_n si la liste a moins de N entrées).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import wait
+
+import numpy as np
+from scipy import sparse
+
+from process_pool import process_pool
+
+# Longueur maximum des itemsets matérialisés (0 = désactivé)
+MATERIALIZE_MAX_LENGTH = int(os.getenv('MATERIALIZE_MAX_LENGTH', 2))
+# Nombre de recommandations conservées par panier
+MATERIALIZE_TOP_N = int(os.getenv('MATERIALIZE_TOP_N', 10))
+# Budget de temps, en fraction de la durée de l'extraction
+MATERIALIZE_TIME_FRACTION = float(os.getenv('MATERIALIZE_TIME_FRACTION', 0.25))
+# Processus de calcul (0 = nombre de CPU)
+MATERIALIZE_WORKERS = int(os.getenv('MATERIALIZE_WORKERS', 0))
+
+# Paniers par lot (un produit creux par lot)
+CHUNK_SIZE = 512
+
+# Tableaux des règles dans un processus de calcul (transmis à son démarrage)
+_worker_rules = None
+
+
+def rule_arrays(rules_df):
+    """Antécédents (matrice creuse items × règles) et conséquents (CSR) en positions d'items"""
+    positions = {}
+    rows, columns = [], []
+    consequent_items, consequent_offsets = [], [0]
+    for rule, (antecedents, consequents) in enumerate(zip(rules_df['antecedents'], rules_df['consequents'])):
+        for item in antecedents:
+            rows.append(rule)
+            columns.append(positions.setdefault(item, len(positions)))
+        # Même ordre de parcours que Recommender.recommend (set des conséquents)
+        for item in set(consequents):
+            consequent_items.append(positions.setdefault(item, len(positions)))
+        consequent_offsets.append(len(consequent_items))
+
+    n_rules = len(rules_df)
+    antecedents = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, columns)), shape=(n_rules, len(positions))
+    )
+    consequent_offsets = np.asarray(consequent_offsets, dtype=np.int64)
+    return positions, {
+        'antecedents_t': antecedents.T.tocsr(),
+        'lengths': np.diff(antecedents.indptr),
+        'consequent_items': np.asarray(consequent_items, dtype=np.int64),
+        'consequent_offsets': consequent_offsets,
+        'pair_rules': np.repeat(np.arange(n_rules), np.diff(consequent_offsets)),
+        'confidence': rules_df['confidence'].to_numpy(dtype=float),
+        'lift': rules_df['lift'].to_numpy(dtype=float)
+    }
+
+
+def csr_rule_arrays(antecedent_items, antecedent_offsets, consequent_items, consequent_offsets, confidence, lift):
+    """
+    Tableaux de rule_arrays à partir des règles au format CSR (modèle publié)
+
+    Les conséquents gardent l'ordre publié, celui du parcours de
+    Recommender.recommend.
+
+    Returns:
+        (items par position, positions par item, tableaux)
+    """
+    universe = np.unique(np.concatenate([antecedent_items, consequent_items]))
+    n_rules = len(antecedent_offsets) - 1
+    antecedents = sparse.csr_matrix(
+        (
+            np.ones(len(antecedent_items), dtype=np.int32),
+            (np.repeat(np.arange(n_rules), np.diff(antecedent_offsets)), np.searchsorted(universe, antecedent_items))
+        ),
+        shape=(n_rules, len(universe))
+    )
+    consequent_offsets = np.asarray(consequent_offsets, dtype=np.int64)
+    items = universe.tolist()
+    return items, {item: position for position, item in enumerate(items)}, {
+        'antecedents_t': antecedents.T.tocsr(),
+        'lengths': np.diff(antecedent_offsets),
+        'consequent_items': np.searchsorted(universe, consequent_items).astype(np.int64),
+        'consequent_offsets': consequent_offsets,
+        'pair_rules': np.repeat(np.arange(n_rules), np.diff(consequent_offsets)),
+        'confidence': np.asarray(confidence, dtype=float),
+        'lift': np.asarray(lift, dtype=float)
+    }
+
+
+def _rank(arrays, basket, matched, top_n):
+    """Top-N (positions d'items, règles) d'un panier, à partir des règles qui s'y appliquent"""
+    offsets = arrays['consequent_offsets']
+    starts = offsets[matched]
+    counts = offsets[matched + 1] - starts
+    total = int(counts.sum())
+    empty = np.empty(0, dtype=np.int64)
+    if total == 0:
+        return empty, empty
+
+    # Positions des paires (règle, conséquent) dans les conséquents concaténés
+    pairs = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    items = arrays['consequent_items'][pairs]
+    keep = ~np.isin(items, basket)
+    pairs, items = pairs[keep], items[keep]
+    if len(pairs) == 0:
+        return empty, empty
+    rules = arrays['pair_rules'][pairs]
+
+    # Par item : première règle de confiance maximale, et première paire
+    # rencontrée (ordre d'insertion dans recommend, départage des égalités)
+    order = np.lexsort((pairs, -arrays['confidence'][rules], items))
+    sorted_items = items[order]
+    first = np.r_[True, sorted_items[1:] != sorted_items[:-1]]
+    best = rules[order][first]
+    inserted = np.minimum.reduceat(pairs[order], np.flatnonzero(first))
+
+    ranking = np.lexsort((inserted, -arrays['lift'][best], -arrays['confidence'][best]))[:top_n]
+    return sorted_items[first][ranking], best[ranking]
+
+
+def score_baskets(arrays, baskets, top_n, deadline=None):
+    """
+    Top-N de chaque panier d'un lot, en un produit creux
+
+    Args:
+        arrays: Tableaux de rule_arrays
+        baskets: Paniers en positions d'items (tableaux sans doublon)
+        top_n: Nombre de recommandations par panier
+        deadline: Échéance (time.time()) au-delà de laquelle le lot est abandonné
+
+    Returns:
+        Liste de (positions des items recommandés, positions des règles retenues),
+        ou None si l'échéance est atteinte
+    """
+    if deadline is not None and time.time() > deadline:
+        return None
+    n_items = arrays['antecedents_t'].shape[0]
+    sizes = np.fromiter((len(basket) for basket in baskets), dtype=np.int64, count=len(baskets))
+    indptr = np.zeros(len(baskets) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=indptr[1:])
+    indices = np.concatenate(baskets) if indptr[-1] else np.empty(0, dtype=np.int64)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.int32), indices, indptr), shape=(len(baskets), n_items)
+    )
+
+    # Nombre d'antécédents de chaque règle présents dans chaque panier
+    present = (matrix @ arrays['antecedents_t']).tocsr()
+    results = []
+    for row, basket in enumerate(baskets):
+        if deadline is not None and row % 64 == 0 and time.time() > deadline:
+            return None
+        start, end = present.indptr[row], present.indptr[row + 1]
+        rules = present.indices[start:end]
+        matched = rules[present.data[start:end] == arrays['lengths'][rules]]
+        results.append(_rank(arrays, basket, matched, top_n))
+    return results
+
+
+def _init_worker(arrays):
+    global _worker_rules
+    _worker_rules = arrays
+
+
+def _score_chunk(baskets, top_n, deadline):
+    return score_baskets(_worker_rules, baskets, top_n, deadline)
+
+
+class ModelRuleArrays:
+    """Tableaux des règles des modèles servis, construits une fois par version"""
+
+    def __init__(self, keep=2):
+        """
+        Args:
+            keep: Nombre de versions gardées (une requête ou un lot en cours
+                  peut encore servir le modèle précédent après une publication)
+        """
+        self.keep = max(1, keep)
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model):
+        """
+        Args:
+            model: ModelSnapshot servi, ou SharedModel (règles au format CSR)
+
+        Returns:
+            (items par position, positions par item, tableaux de rule_arrays)
+        """
+        entry = self._versions.get(model.version)
+        if entry is None:
+            with self._lock:
+                entry = self._versions.get(model.version)
+                if entry is None:
+                    build = getattr(model, 'rule_arrays', None)
+                    if build is not None:
+                        entry = build()
+                    else:
+                        positions, arrays = rule_arrays(model.rules)
+                        entry = (list(positions), positions, arrays)
+                    versions = OrderedDict(self._versions)
+                    versions[model.version] = entry
+                    while len(versions) > self.keep:
+                        versions.popitem(last=False)
+                    # Remplacement atomique : les lectures sans verrou restent cohérentes
+                    self._versions = versions
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._versions = OrderedDict()
+
+
+class MaterializedRecommendations:
+    """Table panier fréquent → top-N (item, règle)"""
+
+    def __init__(self, keys, items, rules, offsets, confidence, top_n, max_length, report=None):
+        """
+        Args:
+            keys: Tuples triés d'identifiants d'items, un par panier
+            items: Items recommandés concaténés
+            rules: Positions des règles retenues (alignées sur items)
+            offsets: Début des résultats de chaque panier (fin en dernier)
+            confidence: Confiance de chaque règle du modèle
+            top_n: Nombre de recommandations calculées par panier
+            max_length: Longueur maximum des paniers matérialisés
+            report: Mesures du calcul
+        """
+        self.items = items
+        self.rules = rules
+        self.offsets = offsets
+        self.confidence = confidence
+        self.top_n = top_n
+        self.max_length = max_length
+        self.report = report or {}
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, item_ids, top_n=5, min_confidence=0.5):
+        """
+        Recommandations matérialisées d'un panier
+
+        Args:
+            item_ids: Identifiants des items du panier
+            top_n: Nombre de recommandations
+            min_confidence: Confiance minimum
+
+        Returns:
+            Liste de (item, position de règle), ou None si le panier n'est pas dans la table
+        """
+        row = self._rows.get(tuple(sorted(item_ids)))
+        if row is not None:
+            start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+            # Liste tronquée à N : un top_n plus grand demande le calcul complet
+            if top_n > self.top_n and end - start == self.top_n:
+                row = None
+
+        with self._lock:
+            self.lookups += 1
+            self.hits += row is not None
+        if row is None:
+            return None
+
+        confidence = self.confidence
+        pairs = zip(self.items[start:end].tolist(), self.rules[start:end].tolist())
+        return [(item, rule) for item, rule in pairs if confidence[rule] >= min_confidence][:top_n]
+
+    def arrays(self):
+        """Tableaux à publier avec le modèle (clés au format CSR)"""
+        keys = list(self._rows)
+        key_offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum([len(key) for key in keys], out=key_offsets[1:])
+        return {
+            'materialized_key_items': np.fromiter(
+                (item for key in keys for item in key), dtype=np.int64, count=int(key_offsets[-1])
+            ),
+            'materialized_key_offsets': key_offsets,
+            'materialized_items': np.asarray(self.items, dtype=np.int64),
+            'materialized_rules': np.asarray(self.rules, dtype=np.int64),
+            'materialized_offsets': np.asarray(self.offsets, dtype=np.int64)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, confidence, top_n, max_length):
+        """Table reconstruite à partir des tableaux publiés par arrays()"""
+        key_items = arrays['materialized_key_items'].tolist()
+        key_offsets = arrays['materialized_key_offsets'].tolist()
+        keys = [tuple(key_items[start:end]) for start, end in zip(key_offsets[:-1], key_offsets[1:])]
+        return cls(
+            keys,
+            arrays['materialized_items'],
+            arrays['materialized_rules'],
+            arrays['materialized_offsets'],
+            confidence,
+            top_n,
+            max_length
+        )
+
+    def stats(self):
+        with self._lock:
+            lookups, hits = self.lookups, self.hits
+        return {
+            'entries': len(self),
+            'lookups': lookups,
+            'hits': hits,
+            'hit_rate': hits / lookups if lookups else None
+        }
+
+    def describe(self):
+        return {**self.stats(), 'top_n': self.top_n, 'max_length': self.max_length, **self.report}
+
+
+def materialize(rules_df, itemsets_df, max_length=None, top_n=None, time_budget=None, workers=None):
+    """
+    Calculer les recommandations des itemsets fréquents courts
+
+    Les lots sont répartis entre processus ; à l'échéance du budget, les lots
+    non terminés sont abandonnés (un lot en cours s'interrompt de lui-même) et
+    leurs paniers restent calculés à la demande.
+
+    Args:
+        rules_df: Règles du modèle, dans l'ordre utilisé par Recommender
+        itemsets_df: Itemsets fréquents (colonne 'itemsets')
+        max_length: Longueur maximum des itemsets (défaut MATERIALIZE_MAX_LENGTH)
+        top_n: Recommandations conservées par panier (défaut MATERIALIZE_TOP_N)
+        time_budget: Durée maximum en secondes (None = sans limite)
+        workers: Nombre de processus (défaut MATERIALIZE_WORKERS, 0 = CPU)
+
+    Returns:
+        MaterializedRecommendations
+    """
+    started = time.perf_counter()
+    max_length = MATERIALIZE_MAX_LENGTH if max_length is None else max_length
+    top_n = MATERIALIZE_TOP_N if top_n is None else top_n
+    workers = workers or MATERIALIZE_WORKERS or os.cpu_count() or 1
+
+    # Support décroissant : si le budget est atteint, les paniers les plus courants sont servis
+    keys = [
+        tuple(sorted(items))
+        for items in itemsets_df.sort_values('support', ascending=False, kind='stable')['itemsets']
+        if len(items) <= max_length
+    ] if itemsets_df is not None and max_length > 0 else []
+    positions, arrays = rule_arrays(rules_df)
+    universe = np.array(list(positions))
+
+    # Items absents des règles : ni antécédent ni conséquent possible
+    baskets = [
+        np.asarray([positions[item] for item in key if item in positions], dtype=np.int64)
+        for key in keys
+    ]
+    chunks = [range(start, min(start + CHUNK_SIZE, len(keys))) for start in range(0, len(keys), CHUNK_SIZE)]
+    # Horloge murale : l'échéance est comparée dans les processus de calcul
+    deadline = time.time() + time_budget if time_budget is not None else None
+
+    results = {}
+    if workers > 1 and len(chunks) > 1:
+        executor = process_pool(min(workers, len(chunks)), initializer=_init_worker, initargs=(arrays,))
+        futures = {
+            executor.submit(_score_chunk, [baskets[i] for i in chunk], top_n, deadline): chunk
+            for chunk in chunks
+        }
+        timeout = max(deadline - time.time(), 0) if deadline is not None else None
+        done, _ = wait(futures, timeout=timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future in done:
+            if future.result() is not None:
+                results[futures[future].start] = future.result()
+    else:
+        workers = 1
+        for chunk in chunks:
+            scored = score_baskets(arrays, [baskets[i] for i in chunk], top_n, deadline)
+            if scored is None:
+                break
+            results[chunk.start] = scored
+
+    # Assemblage dans l'ordre des itemsets
+    table_keys, items, rules, offsets = [], [], [], [0]
+    for chunk in chunks:
+        if chunk.start not in results:
+            continue
+        for i, (item_positions, rule_positions) in zip(chunk, results[chunk.start]):
+            table_keys.append(keys[i])
+            items.append(universe[item_positions])
+            rules.append(rule_positions)
+            offsets.append(offsets[-1] + len(rule_positions))
+
+    concat = lambda parts, dtype: np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+    return MaterializedRecommendations(
+        table_keys,
+        concat(items, universe.dtype),
+        concat(rules, np.int64),
+        np.asarray(offsets, dtype=np.int64),
+        rules_df['confidence'].to_numpy(dtype=float),
+        top_n,
+        max_length,
+        report={
+            'candidates': len(keys),
+            'complete': len(table_keys) == len(keys),
+            'workers': workers,
+            'seconds': round(time.perf_counter() - started, 4),
+            'time_budget': round(time_budget, 4) if time_budget is not None else None
+        }
+    )
+
+
+# Instance globale
+model_rule_arrays = ModelRuleArrays()
@@ -0,0 +1,320 @@
+"""
+Mesure de l'empreinte mémoire des données et du modèle
+"""
+import os
+import sys
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Estimations empiriques (CPython 3.11, mlxtend 0.23) pour la projection
+BYTES_PER_ITEMSET = 320
+BYTES_PER_RULE = 720
+
+_PROC_STATUS = '/proc/self/status'
+_PROC_STATM = '/proc/self/statm'
+_PROC_CLEAR_REFS = '/proc/self/clear_refs'
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Pic RSS par étape (réinitialisation du compteur du processus) : à activer
+# uniquement pour profiler, la réinitialisation touche tout le processus
+PROFILE_STAGE_MEMORY = os.getenv('PROFILE_STAGE_MEMORY', '0') == '1'
+
+# Dernière mesure mémoire de chaque étape du pipeline
+stage_memory = {}
+_stage_lock = threading.Lock()
+
+
+def process_memory():
+    """
+    RSS courant et pic du processus, en octets
+
+    Returns:
+        dict {'rss', 'peak_rss'} (None si indisponible sur la plateforme)
+    """
+    try:
+        values = {}
+        with open(_PROC_STATUS) as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    key, value = line.split(':', 1)
+                    values[key] = int(value.split()[0]) * 1024
+        return {'rss': values.get('VmRSS'), 'peak_rss': values.get('VmHWM')}
+    except OSError:
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss est en octets sur macOS, en kilo-octets ailleurs
+        peak = peak if sys.platform == 'darwin' else peak * 1024
+        return {'rss': None, 'peak_rss': peak}
+    except ImportError:
+        return {'rss': None, 'peak_rss': None}
+
+
+def process_rss():
+    """RSS courant du processus en octets (None si indisponible)"""
+    try:
+        with open(_PROC_STATM) as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def reset_peak():
+    """Réinitialiser le pic RSS du processus (Linux uniquement). Retourne True si possible."""
+    try:
+        with open(_PROC_CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def record_stage_memory(stage, rss_before, rss_after, peak_rss=None, peak_reset=False):
+    """
+    Conserver la mesure mémoire d'une étape
+
+    Args:
+        peak_rss: Pic RSS mesuré (None hors PROFILE_STAGE_MEMORY)
+        peak_reset: True si le pic a été réinitialisé au début de l'étape
+    """
+    entry = {
+        'rss_before': rss_before,
+        'rss_after': rss_after,
+        'rss_delta': (
+            rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        ),
+        # Sans réinitialisation possible, le pic est celui du processus depuis son démarrage
+        'peak_rss': peak_rss,
+        'peak_is_stage_local': peak_reset,
+        'timestamp': time.time()
+    }
+    with _stage_lock:
+        stage_memory[stage] = entry
+    return entry
+
+
+def _object_size(obj, seen):
+    """Taille profonde d'un objet Python (chaînes partagées comptées une fois)"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes + (0 if obj.dtype != object else sum(_object_size(x, seen) for x in obj.ravel()))
+    if isinstance(obj, dict):
+        return size + sum(_object_size(k, seen) + _object_size(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(_object_size(x, seen) for x in obj)
+    return size
+
+
+def deep_size(obj, seen=None):
+    """
+    Taille mémoire profonde d'une structure, en octets
+
+    Les DataFrames sont mesurés colonne par colonne : les colonnes objet
+    (frozensets d'items, chaînes) sont parcourues élément par élément, ce que
+    memory_usage(deep=True) ne fait pas pour les frozensets.
+    """
+    if seen is None:
+        seen = set()
+    if obj is None:
+        return 0
+
+    if isinstance(obj, pd.DataFrame):
+        if id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        total = int(obj.index.memory_usage(deep=True))
+        for name in obj.columns:
+            column = obj[name]
+            if column.dtype == object:
+                total += column.values.nbytes + sum(_object_size(x, seen) for x in column.values)
+            else:
+                total += int(column.memory_usage(index=False, deep=True))
+        return total
+
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+
+    return _object_size(obj, seen)
+
+
+def memory_report(data_loader, fpgrowth_engine, recommender):
+    """
+    Rapport mémoire des structures chargées
+
+    Returns:
+        dict avec la taille de chaque structure, le RSS du processus et
+        les pics mesurés pour chaque étape du pipeline
+    """
+    # Un seul ensemble 'seen' : une structure partagée n'est comptée qu'une fois
+    seen = set()
+    structures = {
+        'transactions_df': deep_size(data_loader.df, seen),
+        'frequent_itemsets': deep_size(fpgrowth_engine.frequent_itemsets, seen),
+        'engine_rules': deep_size(fpgrowth_engine.rules, seen),
+        'recommender_rules': deep_size(recommender.rules, seen),
+        'basket_matrix': fpgrowth_engine.last_basket_nbytes
+    }
+
+    with _stage_lock:
+        stages = {name: dict(entry) for name, entry in stage_memory.items()}
+
+    return {
+        'structures': structures,
+        'total_structures': sum(v for v in structures.values() if v),
+        'rules_shared': (
+            recommender.rules is not None and recommender.rules is fpgrowth_engine.rules
+        ),
+        'process': process_memory(),
+        'stages': stages
+    }
+
+
+class MemoryGuard:
+    """
+    Garde-fou mémoire pour l'analyse FP-Growth
+
+    Projette la mémoire nécessaire à partir du nombre d'items et de paires
+    fréquents (produit matriciel creux sur la matrice panier), puis refuse
+    l'analyse ou relève min_support jusqu'à tenir dans le budget.
+    """
+
+    def __init__(self, budget_bytes=None, mode='refuse', max_support=0.5):
+        self.budget_bytes = budget_bytes
+        self.mode = mode
+        self.max_support = max_support
+
+    @property
+    def enabled(self):
+        return bool(self.budget_bytes)
+
+    @staticmethod
+    def counts(basket_df, min_support):
+        """
+        Supports (nombres de factures) des items et des paires, calculés une fois
+
+        Le produit XᵀX est creux et entier, limité aux items fréquents à
+        min_support : les projections à un seuil plus élevé seuillent les
+        mêmes comptages.
+        """
+        values = basket_df.values
+        item_counts = values.sum(axis=0)
+        frequent = np.flatnonzero(item_counts >= min_support * max(1, values.shape[0]))
+
+        pair_counts = np.empty(0, dtype=np.int64)
+        if len(frequent) > 1:
+            rows, cols = np.nonzero(values[:, frequent])
+            x = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                shape=(values.shape[0], len(frequent))
+            )
+            pairs = sparse.triu(x.T @ x, k=1).tocoo()
+            pair_counts = pairs.data.astype(np.int64)
+
+        return {
+            'n_rows': max(1, values.shape[0]),
+            'nbytes': values.nbytes,
+            'item_counts': item_counts,
+            'pair_counts': pair_counts
+        }
+
+    def project(self, basket_df, min_support, counts=None):
+        """
+        Projeter la mémoire (octets) d'une analyse à ce seuil
+
+        Args:
+            counts: Résultat de counts() à un seuil inférieur ou égal (None = calculé ici)
+        """
+        if counts is None:
+            counts = self.counts(basket_df, min_support)
+        min_count = min_support * counts['n_rows']
+
+        n_items = int((counts['item_counts'] >= min_count).sum())
+        n_pairs = int((counts['pair_counts'] >= min_count).sum()) if n_items > 1 else 0
+
+        # Les niveaux supérieurs croissent comme les paires rapportées aux items
+        n_higher = int(n_pairs * n_pairs / max(n_items, 1))
+        n_itemsets = n_items + n_pairs + n_higher
+        n_rules = 2 * n_pairs + 6 * n_higher
+
+        return {
+            'min_support': min_support,
+            'frequent_items': n_items,
+            'frequent_pairs': n_pairs,
+            'estimated_itemsets': n_itemsets,
+            'estimated_rules': n_rules,
+            # mlxtend recopie la matrice panier pendant l'extraction
+            'projected_bytes': int(
+                2 * counts['nbytes']
+                + n_itemsets * BYTES_PER_ITEMSET
+                + n_rules * BYTES_PER_RULE
+            )
+        }
+
+    def check(self, basket_df, min_support):
+        """
+        Vérifier qu'une analyse tient dans le budget
+
+        Returns:
+            dict avec 'allowed', le min_support à utiliser et la projection
+        """
+        if not self.enabled:
+            return {'allowed': True, 'action': 'disabled', 'min_support': min_support}
+
+        current_rss = process_memory()['rss'] or 0
+        available = self.budget_bytes - current_rss
+        # Comptages au seuil demandé, réutilisés pour chaque seuil relevé
+        counts = self.counts(basket_df, min_support)
+        projection = self.project(basket_df, min_support, counts)
+        result = {
+            'allowed': True,
+            'action': 'none',
+            'requested_min_support': min_support,
+            'min_support': min_support,
+            'budget_bytes': self.budget_bytes,
+            'current_rss': current_rss,
+            'projection': projection
+        }
+
+        if projection['projected_bytes'] <= available:
+            return result
+
+        if self.mode != 'downgrade':
+            result.update({'allowed': False, 'action': 'refused'})
+            return result
+
+        support = min_support
+        while projection['projected_bytes'] > available and support < self.max_support:
+            support = min(self.max_support, support * 1.5)
+            projection = self.project(basket_df, support, counts)
+
+        result.update({
+            'allowed': projection['projected_bytes'] <= available,
+            'action': 'downgraded' if projection['projected_bytes'] <= available else 'refused',
+            'min_support': round(support, 6),
+            'projection': projection
+        })
+        return result
+
+
+def _budget_from_env():
+    value = os.getenv('MEMORY_BUDGET_MB')
+    return int(float(value) * 1024 * 1024) if value else None
+
+
+# Instance globale
+memory_guard = MemoryGuard(
+    budget_bytes=_budget_from_env(),
+    mode=os.getenv('MEMORY_GUARD_MODE', 'refuse')
+)
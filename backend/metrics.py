@@ -0,0 +1,268 @@
+"""
+Métriques du pipeline (compteurs, histogrammes, jauges) au format Prometheus
+"""
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from memory_report import (
+    PROFILE_STAGE_MEMORY, process_memory, process_rss, reset_peak, record_stage_memory
+)
+
+logger = logging.getLogger('fpgrowth')
+
+# Bornes par défaut des histogrammes de durée (secondes)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + body + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Labels attendus pour {self.name}: {self.label_names}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [compteurs par intervalle (+Inf inclus), somme, nombre]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.label_names, key, ('le', _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge, name, documentation, labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labels, buckets=buckets)
+
+    def render(self):
+        """Exporter toutes les métriques au format texte Prometheus (0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Registre global
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    'fpgrowth_stage_duration_seconds', 'Durée des étapes du pipeline', labels=('stage',)
+)
+STAGE_RUNS = registry.counter(
+    'fpgrowth_stage_runs_total', 'Exécutions des étapes du pipeline', labels=('stage', 'status')
+)
+STAGE_ROWS = registry.gauge(
+    'fpgrowth_stage_output_rows', 'Taille de la sortie de la dernière exécution', labels=('stage',)
+)
+HTTP_REQUESTS = registry.counter(
+    'fpgrowth_http_requests_total', 'Requêtes HTTP traitées', labels=('route', 'method', 'status')
+)
+HTTP_DURATION = registry.histogram(
+    'fpgrowth_http_request_duration_seconds', 'Durée des requêtes HTTP', labels=('route', 'method')
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    'fpgrowth_http_requests_in_flight', 'Requêtes HTTP en cours'
+)
+LLM_DURATION = registry.histogram(
+    'fpgrowth_llm_request_duration_seconds', 'Latence des appels LLM', labels=('status',)
+)
+DB_DURATION = registry.histogram(
+    'fpgrowth_db_operation_duration_seconds', 'Durée des opérations PostgreSQL', labels=('operation',)
+)
+DB_ERRORS = registry.counter(
+    'fpgrowth_db_errors_total', 'Erreurs PostgreSQL', labels=('operation',)
+)
+STAGE_RSS_DELTA = registry.gauge(
+    'fpgrowth_stage_rss_delta_bytes', 'Variation du RSS pendant la dernière exécution', labels=('stage',)
+)
+STAGE_PEAK_RSS = registry.gauge(
+    'fpgrowth_stage_peak_rss_bytes',
+    'Pic RSS du processus pendant la dernière exécution (PROFILE_STAGE_MEMORY=1)', labels=('stage',)
+)
+CHATBOT_STAGE_ABANDONED = registry.counter(
+    'fpgrowth_chatbot_stage_abandoned_total', 'Étapes chatbot abandonnées à l\'échéance et encore en cours',
+    labels=('stage',)
+)
+CHATBOT_STAGE_RUNNING = registry.gauge(
+    'fpgrowth_chatbot_stage_running', 'Étapes chatbot en cours (abandonnées comprises)', labels=('stage',)
+)
+MODEL_SIZE = registry.gauge(
+    'fpgrowth_model_size', 'Taille du modèle courant', labels=('kind',)
+)
+RECOMMEND_BATCH_SIZE = registry.histogram(
+    'fpgrowth_recommend_batch_size', 'Paniers évalués par micro-lot de /api/recommend',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+RECOMMEND_QUEUE_DELAY = registry.histogram(
+    'fpgrowth_recommend_queue_delay_seconds', 'Attente d\'une requête avant l\'évaluation de son micro-lot',
+    buckets=(0.0001, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+
+
+def log_event(event, **fields):
+    """Émettre un événement structuré (une ligne JSON) sur le logger 'fpgrowth'"""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({'event': event, **fields}, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def timed_stage(stage, **fields):
+    """
+    Chronométrer une étape du pipeline
+
+    Enregistre la durée dans l'histogramme, le statut dans le compteur, la
+    variation de RSS de l'étape et émet un événement 'stage' structuré. Le pic
+    RSS n'est mesuré qu'avec PROFILE_STAGE_MEMORY=1. Le dict retourné peut être
+    complété par l'appelant (ex: nombre de lignes produites) avant la fin du
+    bloc.
+    """
+    info = dict(fields)
+    rss_before = process_rss()
+    peak_reset = reset_peak() if PROFILE_STAGE_MEMORY else False
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield info
+    except Exception:
+        status = 'error'
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=stage)
+        STAGE_RUNS.inc(stage=stage, status=status)
+        if 'rows' in info:
+            STAGE_ROWS.set(info['rows'], stage=stage)
+        peak_rss = process_memory()['peak_rss'] if PROFILE_STAGE_MEMORY else None
+        memory = record_stage_memory(stage, rss_before, process_rss(), peak_rss, peak_reset)
+        if memory['rss_delta'] is not None:
+            STAGE_RSS_DELTA.set(memory['rss_delta'], stage=stage)
+        if memory['peak_rss']:
+            STAGE_PEAK_RSS.set(memory['peak_rss'], stage=stage)
+        log_event(
+            'stage', stage=stage, status=status, duration_ms=round(elapsed * 1000, 3),
+            rss_delta=memory['rss_delta'], peak_rss=memory['peak_rss'], **info
+        )
+
+
+@contextmanager
+def timed_db(operation):
+    """Chronométrer une opération PostgreSQL"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DB_ERRORS.inc(operation=operation)
+        raise
+    finally:
+        DB_DURATION.observe(time.perf_counter() - start, operation=operation)
@@ -0,0 +1,109 @@
+"""
+Instantanés immuables du modèle et échange atomique
+
+Chaque analyse construit un moteur neuf, puis publie un ModelSnapshot
+(itemsets, règles, index, recommender, paramètres, version) par une seule
+affectation de référence. Une requête lit model_registry.current une fois
+et garde cet instantané jusqu'à sa fin : elle ne voit jamais un modèle à
+moitié mis à jour, et les lecteurs ne prennent aucun verrou.
+"""
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+import pandas as pd
+
+from recommender import Recommender
+from rule_graph import RuleGraph
+
+
+@dataclass(frozen=True)
+class ModelSnapshot:
+    """Modèle publié ; ni l'instantané ni les objets qu'il référence ne sont modifiés ensuite"""
+    version: int
+    itemsets: pd.DataFrame
+    rules: pd.DataFrame
+    rule_index: Any
+    engine: Any
+    recommender: Recommender
+    cooccurrence: Any = None
+    materialized: Any = None
+    params: Mapping = field(default_factory=dict)
+    published_at: str = ''
+
+    @property
+    def vocabulary(self):
+        return self.engine.vocabulary
+
+    @property
+    def n_itemsets(self):
+        return len(self.itemsets)
+
+    @property
+    def n_rules(self):
+        return len(self.rules)
+
+    def rule_graph(self):
+        """Graphe complet des règles (RuleGraphCache le garde par version)"""
+        return RuleGraph(self.rules, self.itemsets)
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'itemsets': len(self.itemsets),
+            'rules': len(self.rules),
+            'cooccurrence': self.cooccurrence.describe() if self.cooccurrence is not None else None,
+            'materialized': self.materialized.describe() if self.materialized is not None else None,
+            'params': dict(self.params),
+            'published_at': self.published_at
+        }
+
+
+class ModelRegistry:
+    """Référence vers l'instantané courant"""
+
+    def __init__(self):
+        self.current: Optional[ModelSnapshot] = None
+        self._version = 0
+        # Sérialise les publications seulement ; les lecteurs n'en prennent aucun
+        self._publish_lock = threading.Lock()
+
+    def publish(self, engine, params=None, cooccurrence=None, materialized=None):
+        """
+        Publier le résultat d'une analyse
+
+        Args:
+            engine: FPGrowthEngine dont l'analyse est terminée (plus modifié ensuite)
+            params: Paramètres de l'analyse
+            cooccurrence: CooccurrenceModel de la même matrice panier (optionnel)
+            materialized: MaterializedRecommendations des règles du moteur (optionnel)
+
+        Returns:
+            ModelSnapshot publié
+        """
+        with self._publish_lock:
+            self._version += 1
+            snapshot = ModelSnapshot(
+                version=self._version,
+                itemsets=engine.frequent_itemsets,
+                rules=engine.rules,
+                rule_index=engine.rule_index,
+                engine=engine,
+                recommender=Recommender(engine.rules, engine.vocabulary, cooccurrence, materialized),
+                cooccurrence=cooccurrence,
+                materialized=materialized,
+                params=MappingProxyType(dict(params or {})),
+                published_at=datetime.now().isoformat()
+            )
+            # Échange atomique : une seule affectation de référence
+            self.current = snapshot
+        return snapshot
+
+    def clear(self):
+        self.current = None
+
+
+# Instance globale
+model_registry = ModelRegistry()
@@ -0,0 +1,559 @@
+"""
+Publication du modèle en fichiers mappés en mémoire pour un service multi-processus
+
+Le processus qui effectue l'analyse publie les règles et les itemsets sous
+forme de tableaux numpy (.npy) dans un dossier de génération, puis avance
+le compteur de génération (fichier CURRENT remplacé atomiquement). Les
+processus de service (workers gunicorn) attachent ces fichiers en lecture
+seule (np.load(mmap_mode='r')) : les pages sont partagées par le cache du
+système, la mémoire propre d'un worker ne grossit pas avec le modèle. Un
+worker qui voit le compteur avancer s'attache à la nouvelle génération.
+
+Les ensembles d'items sont stockés au format CSR : identifiants concaténés
+et positions de début de chaque règle/itemset. Les listes item → règles
+(RuleIndex) sont publiées au même format.
+
+SharedModel sert les routes de lecture (itemsets, règles, graphe, règles
+d'un item, similarité, explications) directement sur ces tableaux : seuls
+les itemsets et règles d'une page sont convertis en objets Python, et la
+réponse ne dépend pas du worker qui la traite. Les sessions de panier et
+les micro-lots utilisent les tableaux de score construits sur le même CSR ;
+leur état reste propre à chaque worker.
+"""
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import serialization
+from cooccurrence import CooccurrenceModel
+from materialized import MaterializedRecommendations, csr_rule_arrays
+from rule_graph import RuleGraph
+from rule_index import RuleIndex, csr_postings
+from vocabulary import item_vocabulary
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+RULE_METRICS = ('support', 'confidence', 'lift', 'leverage', 'conviction')
+
+# Générations conservées : un worker encore attaché à la précédente la garde lisible
+KEEP_GENERATIONS = 2
+
+
+def _csr(itemsets):
+    """(identifiants concaténés, positions de début avec la fin en dernier)"""
+    lengths = np.fromiter((len(items) for items in itemsets), dtype=np.int64, count=len(itemsets))
+    offsets = np.zeros(len(itemsets) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    items = np.fromiter(
+        (item for items in itemsets for item in items), dtype=np.int32, count=int(offsets[-1])
+    )
+    return items, offsets
+
+
+def _itemsets(items, offsets, positions):
+    """
+    Itemsets des positions demandées, à partir du format CSR
+
+    Tuples dans l'ordre publié (celui du frozenset d'origine) : la
+    sérialisation liste les items dans le même ordre que le modèle en mémoire.
+    """
+    return [tuple(items[offsets[p]:offsets[p + 1]].tolist()) for p in positions]
+
+
+class SharedModel:
+    """Génération du modèle attachée en lecture seule"""
+
+    def __init__(self, directory, vocabulary):
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.generation = self.manifest['generation']
+        self.vocabulary = vocabulary
+        self.arrays = {
+            name[:-4]: np.load(os.path.join(directory, name), mmap_mode='r')
+            for name in os.listdir(directory) if name.endswith('.npy')
+        }
+        self.materialized = None
+        if self.manifest.get('materialized'):
+            self.materialized = MaterializedRecommendations.from_arrays(
+                self.arrays, self.arrays['confidence'], **self.manifest['materialized']
+            )
+        self.cooccurrence = None
+        if self.manifest.get('cooccurrence'):
+            self.cooccurrence = CooccurrenceModel.from_arrays(
+                self.arrays, vocabulary, **self.manifest['cooccurrence']
+            )
+        self.rule_index = RuleIndex.from_arrays(self.arrays)
+
+    # Interface de ModelSnapshot : le modèle mappé sert de moteur (itemsets,
+    # règles) et de recommender
+    @property
+    def version(self):
+        # Numéro de génération : le même dans tous les workers (curseurs, caches par version)
+        return self.generation
+
+    @property
+    def engine(self):
+        return self
+
+    @property
+    def recommender(self):
+        return self
+
+    @property
+    def n_itemsets(self):
+        return self.manifest['itemsets']
+
+    @property
+    def n_rules(self):
+        return self.manifest['rules']
+
+    def __len__(self):
+        return self.manifest['rules']
+
+    def recommend(self, items, top_n=5, min_confidence=0.5):
+        """
+        Recommandations à partir des règles partagées (mêmes résultats que Recommender.recommend)
+
+        Les règles dont tous les antécédents sont dans le panier sont trouvées
+        en une passe vectorisée sur les antécédents concaténés.
+        """
+        if len(self) == 0:
+            return []
+
+        basket = set(self.vocabulary.encode(items))
+        a = self.arrays
+        in_basket = np.zeros(len(self.vocabulary), dtype=bool)
+        in_basket[list(basket)] = True
+
+        # Nombre d'antécédents présents dans le panier, par règle
+        present = np.add.reduceat(in_basket[a['antecedent_items']].astype(np.int32), a['antecedent_offsets'][:-1])
+        matched = np.flatnonzero(present == np.diff(a['antecedent_offsets']))
+
+        # Règles triées par confiance puis lift : la première règle d'un
+        # conséquent est celle que Recommender.recommend retient
+        recommendations = {}
+        starts, ends = a['consequent_offsets'][matched], a['consequent_offsets'][matched + 1]
+        for rule, start, end in zip(matched.tolist(), starts.tolist(), ends.tolist()):
+            for item in a['consequent_items'][start:end].tolist():
+                if item not in basket and item not in recommendations:
+                    recommendations[item] = rule
+
+        filtered = [
+            {
+                'item': item,
+                'confidence': float(a['confidence'][rule]),
+                'lift': float(a['lift'][rule]),
+                'support': float(a['support'][rule]),
+                'based_on': a['antecedent_items'][a['antecedent_offsets'][rule]:a['antecedent_offsets'][rule + 1]]
+            }
+            for item, rule in recommendations.items()
+            if a['confidence'][rule] >= min_confidence
+        ]
+        sorted_recs = sorted(filtered, key=lambda x: (x['confidence'], x['lift']), reverse=True)[:top_n]
+
+        for rec in sorted_recs:
+            rec['item'] = self.vocabulary.name_of(rec['item'])
+            rec['based_on'] = self.vocabulary.decode(rec['based_on'].tolist())
+        return sorted_recs
+
+    def recommend_materialized(self, items, top_n=5, min_confidence=0.5):
+        """Recommandations de la table des paniers fréquents (None si le panier n'y est pas)"""
+        if self.materialized is None:
+            return None
+        pairs = self.materialized.get(self.vocabulary.encode(items), top_n, min_confidence)
+        if pairs is None:
+            return None
+        return self.format_recommendations(pairs)
+
+    def format_recommendations(self, pairs):
+        """Recommandations au format de recommend, à partir de (item, position de la règle)"""
+        a = self.arrays
+        return [
+            {
+                'item': self.vocabulary.name_of(item),
+                'confidence': float(a['confidence'][rule]),
+                'lift': float(a['lift'][rule]),
+                'support': float(a['support'][rule]),
+                'based_on': self.vocabulary.decode(
+                    a['antecedent_items'][a['antecedent_offsets'][rule]:a['antecedent_offsets'][rule + 1]].tolist()
+                )
+            }
+            for item, rule in pairs
+        ]
+
+    def rule_arrays(self):
+        """Tableaux de score des règles (sessions de panier, micro-lots), sur le CSR publié"""
+        a = self.arrays
+        return csr_rule_arrays(
+            a['antecedent_items'], a['antecedent_offsets'], a['consequent_items'], a['consequent_offsets'],
+            a['confidence'], a['lift']
+        )
+
+    def _antecedents(self, rule):
+        a = self.arrays
+        return a['antecedent_items'][a['antecedent_offsets'][rule]:a['antecedent_offsets'][rule + 1]].tolist()
+
+    def _consequents(self, rule):
+        a = self.arrays
+        return a['consequent_items'][a['consequent_offsets'][rule]:a['consequent_offsets'][rule + 1]].tolist()
+
+    def rule_graph(self):
+        """Graphe complet des règles, construit sur les tableaux CSR"""
+        return RuleGraph.from_arrays(self.arrays)
+
+    def item_id(self, item):
+        """Identifiant d'un nom d'item (None s'il est inconnu)"""
+        return self.vocabulary.id_of(item)
+
+    def filter_itemsets(self, min_support=None, min_length=None, max_length=None):
+        """Positions (par support décroissant) des itemsets satisfaisant les seuils"""
+        a = self.arrays
+        mask = np.ones(self.n_itemsets, dtype=bool)
+        if min_support is not None:
+            mask &= a['itemset_support'] >= min_support
+        if min_length is not None or max_length is not None:
+            lengths = np.diff(a['itemset_offsets'])
+            if min_length is not None:
+                mask &= lengths >= min_length
+            if max_length is not None:
+                mask &= lengths <= max_length
+        return np.flatnonzero(mask)
+
+    def filter_rules(self, min_lift=None, min_confidence=None, min_length=None, max_length=None):
+        """Positions (par confiance puis lift) des règles satisfaisant les seuils"""
+        return self.rule_index.filter(min_lift, min_confidence, min_length, max_length)
+
+    def _itemsets_page(self, positions):
+        """Itemsets des positions demandées (format de FPGrowthEngine.frequent_itemsets)"""
+        a = self.arrays
+        return pd.DataFrame({
+            'support': a['itemset_support'][positions],
+            'itemsets': _itemsets(a['itemset_items'], a['itemset_offsets'], positions)
+        })
+
+    def _rules_page(self, positions):
+        """Règles des positions demandées (format de FPGrowthEngine.rules)"""
+        a = self.arrays
+        rules = pd.DataFrame({
+            'antecedents': _itemsets(a['antecedent_items'], a['antecedent_offsets'], positions),
+            'consequents': _itemsets(a['consequent_items'], a['consequent_offsets'], positions)
+        })
+        for metric in RULE_METRICS:
+            rules[metric] = a[metric][positions]
+        return rules
+
+    def format_itemsets_for_json(self, itemsets_df=None, positions=None, shape='rows'):
+        """Itemsets pour JSON (FPGrowthEngine.format_itemsets_for_json), page lue dans les tableaux"""
+        if itemsets_df is None:
+            itemsets_df = self._itemsets_page(np.arange(self.n_itemsets) if positions is None else positions)
+            positions = None
+        return serialization.itemsets_payload(itemsets_df, positions, self.vocabulary, shape)
+
+    def format_rules_for_json(self, rules_df=None, positions=None, shape='rows'):
+        """Règles pour JSON (FPGrowthEngine.format_rules_for_json), page lue dans les tableaux"""
+        if rules_df is None:
+            rules_df = self._rules_page(np.arange(self.n_rules) if positions is None else positions)
+            positions = None
+        return serialization.rules_payload(rules_df, positions, self.vocabulary, shape)
+
+    def get_rules_for_item(self, item, side='any', sort='confidence', offset=0, limit=None):
+        """Une page des règles contenant un item (FPGrowthEngine.get_rules_for_item)"""
+        item = self.item_id(item)
+        if item is None:
+            return self._rules_page([])
+        positions, _ = self.rule_index.page(item, side, sort, offset, limit)
+        return self._rules_page(positions)
+
+    def count_rules_for_item(self, item, side='any'):
+        """Nombre de règles contenant un item (du côté demandé)"""
+        item = self.item_id(item)
+        if item is None:
+            return 0
+        return self.rule_index.count(item, side)
+
+    def recommend_by_similarity(self, items, top_n=5):
+        """
+        Items similaires à un panier (Recommender.recommend_by_similarity)
+
+        Sans modèle de co-occurrence, seules les règles contenant un item du
+        panier (listes de RuleIndex) sont parcourues.
+        """
+        if self.cooccurrence is not None:
+            return self.cooccurrence.similar(items, top_n)
+
+        basket = set(self.vocabulary.encode(items))
+        rules = np.unique(np.concatenate(
+            [self.rule_index.positions(item) for item in basket] or [np.empty(0, dtype=np.int32)]
+        ))
+        a = self.arrays
+        similar_items = {}
+        for rule in rules.tolist():
+            for item in self._antecedents(rule) + self._consequents(rule):
+                if item in basket:
+                    continue
+                if item not in similar_items:
+                    similar_items[item] = {
+                        'item': item,
+                        'score': float(a['lift'][rule]),
+                        'support': float(a['support'][rule])
+                    }
+                else:
+                    similar_items[item]['score'] += float(a['lift'][rule])
+
+        sorted_items = sorted(similar_items.values(), key=lambda x: x['score'], reverse=True)[:top_n]
+        for rec in sorted_items:
+            rec['item'] = self.vocabulary.name_of(rec['item'])
+        return sorted_items
+
+    def get_frequently_bought_together(self, item, top_n=5):
+        """Items achetés avec un item (Recommender.get_frequently_bought_together), sur ses seules règles"""
+        item = self.item_id(item)
+        if item is None:
+            return []
+
+        a = self.arrays
+        antecedent_rules = set(self.rule_index.positions(item, 'antecedents').tolist())
+        together = {}
+        for rule in self.rule_index.positions(item).tolist():
+            confidence, lift = float(a['confidence'][rule]), float(a['lift'][rule])
+            if rule in antecedent_rules:
+                for other in self._consequents(rule):
+                    if other not in together:
+                        together[other] = {
+                            'item': other, 'confidence': confidence, 'lift': lift,
+                            'support': float(a['support'][rule])
+                        }
+                    elif confidence > together[other]['confidence']:
+                        together[other]['confidence'] = confidence
+                        together[other]['lift'] = lift
+            else:
+                for other in self._antecedents(rule):
+                    if other not in together:
+                        together[other] = {
+                            'item': other, 'confidence': confidence, 'lift': lift,
+                            'support': float(a['support'][rule])
+                        }
+
+        sorted_together = sorted(together.values(), key=lambda x: x['confidence'], reverse=True)[:top_n]
+        for rec in sorted_together:
+            rec['item'] = self.vocabulary.name_of(rec['item'])
+        return sorted_together
+
+    def explain_recommendation(self, item, based_on):
+        """Règle qui justifie une recommandation (Recommender.explain_recommendation)"""
+        based_on_set = set(self.vocabulary.encode(based_on))
+        item_id = self.item_id(item)
+        if item_id is None or len(based_on_set) != len(set(based_on)):
+            return {}
+
+        # Première règle (dans l'ordre des règles) de conséquent item et d'antécédents based_on
+        a = self.arrays
+        for rule in self.rule_index.positions(item_id, 'consequents').tolist():
+            if set(self._antecedents(rule)) == based_on_set:
+                confidence, lift = float(a['confidence'][rule]), float(a['lift'][rule])
+                return {
+                    'item': item,
+                    'based_on': based_on,
+                    'confidence': confidence,
+                    'lift': lift,
+                    'support': float(a['support'][rule]),
+                    'explanation': f"Les clients qui ont acheté {', '.join(based_on)} "
+                                   f"ont également acheté {item} dans {confidence*100:.1f}% des cas. "
+                                   f"Cette association est {lift:.2f}x plus forte que le hasard."
+                }
+        return {}
+
+    def explain_recommendations(self, recommendations):
+        """Explications d'une liste de recommandations, dans le même ordre"""
+        return [
+            self.explain_recommendation(rec['item'], list(rec['based_on']))
+            for rec in recommendations
+        ]
+
+    def describe(self):
+        return {
+            'generation': self.generation,
+            'rules': self.manifest['rules'],
+            'itemsets': self.manifest['itemsets'],
+            'mapped_bytes': int(sum(array.nbytes for array in self.arrays.values())),
+            'published_at': self.manifest['published_at']
+        }
+
+
+class ModelStore:
+    """Dossier des générations publiées et compteur de génération"""
+
+    def __init__(self, directory, vocabulary=None):
+        self.directory = directory
+        self.vocabulary = vocabulary if vocabulary is not None else item_vocabulary
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    @contextmanager
+    def _publish_lock(self):
+        """Verrou inter-processus : deux analyses simultanées n'écrivent pas la même génération"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path('.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _counter(self, name):
+        try:
+            with open(self._path(name), encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_counter(self, name, value):
+        tmp = self._path(f'{name}.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(str(value))
+        os.replace(tmp, self._path(name))
+
+    def generation(self):
+        """Génération courante publiée (0 si aucune)"""
+        return self._counter('CURRENT')
+
+    def publish(self, rules_df, itemsets_df, params=None, materialized=None, cooccurrence=None):
+        """
+        Publier une nouvelle génération du modèle
+
+        Args:
+            rules_df: Règles (identifiants d'items), triées par confiance puis lift
+            itemsets_df: Itemsets fréquents (identifiants d'items)
+            params: Paramètres de l'analyse (min_support, min_confidence...)
+            materialized: MaterializedRecommendations des mêmes règles (optionnel)
+            cooccurrence: CooccurrenceModel de la même matrice panier (optionnel)
+
+        Returns:
+            Numéro de la génération publiée
+        """
+        if self.vocabulary is None:
+            raise ValueError("La publication du modèle nécessite un vocabulaire d'items")
+
+        with self._publish_lock():
+            # LAST survit à clear() : un numéro de génération n'est jamais réutilisé
+            generation = max(self.generation(), self._counter('LAST')) + 1
+            final = self._path(f'gen_{generation}')
+            tmp = final + '.tmp'
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+
+            arrays = {}
+            arrays['antecedent_items'], arrays['antecedent_offsets'] = _csr(list(rules_df['antecedents']))
+            arrays['consequent_items'], arrays['consequent_offsets'] = _csr(list(rules_df['consequents']))
+            for metric in RULE_METRICS:
+                values = rules_df[metric] if metric in rules_df.columns else np.zeros(len(rules_df))
+                arrays[metric] = np.asarray(values, dtype=np.float64)
+            # Listes item → règles (RuleIndex), indexées par identifiant d'item
+            n_items = max(len(self.vocabulary), int(max(
+                arrays['antecedent_items'].max(initial=-1), arrays['consequent_items'].max(initial=-1)
+            )) + 1)
+            for side in ('antecedent', 'consequent'):
+                arrays[f'{side}_postings'], arrays[f'{side}_postings_offsets'] = csr_postings(
+                    arrays[f'{side}_items'], arrays[f'{side}_offsets'], n_items
+                )
+            arrays['rule_length'] = (
+                np.diff(arrays['antecedent_offsets']) + np.diff(arrays['consequent_offsets'])
+            ).astype(np.int32)
+            arrays['itemset_items'], arrays['itemset_offsets'] = _csr(list(itemsets_df['itemsets']))
+            arrays['itemset_support'] = itemsets_df['support'].to_numpy(dtype=np.float64)
+            if materialized is not None:
+                arrays.update(materialized.arrays())
+            if cooccurrence is not None:
+                arrays.update(cooccurrence.arrays())
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, f'{name}.npy'), array)
+
+            with open(os.path.join(tmp, 'manifest.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'generation': generation,
+                    'vocabulary_version': self.vocabulary.version,
+                    'rules': len(rules_df),
+                    'itemsets': len(itemsets_df),
+                    'params': params or {},
+                    'materialized': {
+                        'top_n': materialized.top_n, 'max_length': materialized.max_length
+                    } if materialized is not None else None,
+                    'cooccurrence': {
+                        'n_invoices': cooccurrence.n_invoices
+                    } if cooccurrence is not None else None,
+                    'published_at': datetime.now().isoformat()
+                }, f)
+
+            os.replace(tmp, final)
+            self._write_counter('LAST', generation)
+            self._write_counter('CURRENT', generation)
+
+            # Les workers attachés à une génération supprimée gardent leurs
+            # fichiers mappés lisibles (POSIX) jusqu'au détachement
+            for name in os.listdir(self.directory):
+                if name.startswith('gen_') and not name.endswith('.tmp'):
+                    if int(name[4:]) <= generation - KEEP_GENERATIONS:
+                        shutil.rmtree(self._path(name), ignore_errors=True)
+
+        return generation
+
+    def current(self):
+        """
+        Modèle de la génération courante, attaché à la première lecture
+
+        Un seul fichier est lu par appel (CURRENT) tant que la génération
+        ne change pas.
+
+        Returns:
+            SharedModel, ou None si aucune génération n'est publiée
+        """
+        generation = self.generation()
+        model = self._model
+        if model is not None and model.generation == generation:
+            return model
+        if generation == 0:
+            return None
+
+        with self._lock:
+            if self._model is None or self._model.generation != generation:
+                model = SharedModel(self._path(f'gen_{generation}'), self.vocabulary)
+                # Le vocabulaire persisté par le producteur peut être plus récent
+                if model.manifest['vocabulary_version'] > self.vocabulary.version:
+                    self.vocabulary.load(model.manifest['vocabulary_version'])
+                self._model = model
+            return self._model
+
+    def clear(self):
+        """Supprimer toutes les générations publiées"""
+        with self._publish_lock():
+            for name in os.listdir(self.directory):
+                if name.startswith('gen_') or name == 'CURRENT':
+                    path = self._path(name)
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        os.remove(path)
+        with self._lock:
+            self._model = None
+
+
+# Mode de service : 'single' (un processus, modèle en mémoire) ou 'shared'
+# (workers attachés aux générations publiées dans MODEL_STORE_DIR)
+SERVING_MODE = os.getenv('SERVING_MODE', 'single')
+
+# Instance globale
+model_store = ModelStore(os.getenv('MODEL_STORE_DIR', os.path.join('data', 'models')), item_vocabulary)
@@ -0,0 +1,278 @@
+"""
+Extraction hors mémoire par partitions (algorithme SON)
+
+Les factures sont lues en flux (PostgreSQL ou DataFrame), jamais chargées
+en entier. Trois passes sur la source :
+
+1. comptage des items et des factures (mémoire proportionnelle au vocabulaire) ;
+2. extraction locale des itemsets fréquents de chaque partition, dont la
+   taille est bornée par un budget mémoire ; les candidats locaux sont
+   déversés sur disque, triés, un fichier par partition ;
+3. comptage exact des candidats sur toutes les partitions.
+
+Une partition garde chaque panier distinct une fois, avec son nombre de
+factures : le budget est imputé par panier distinct, et les comptages
+(extraction locale et passe 3) sont pondérés par ces nombres sans
+développer les factures.
+
+Les fichiers de candidats sont fusionnés en flux (doublons retirés) et
+comptés par lots dont la taille estimée tient dans le même budget ; chaque
+lot supplémentaire coûte une relecture de la source. Seuls les itemsets
+retenus (le résultat) sont gardés en mémoire.
+
+Un itemset globalement fréquent est fréquent dans au moins une partition :
+le résultat est identique à celui de l'extraction en mémoire.
+"""
+import heapq
+import math
+import os
+import pickle
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+from fptree import mine_frequent
+
+# Coût mémoire estimé d'une facture en partition : tuple + entiers
+INVOICE_OVERHEAD_BYTES = 120
+ITEM_BYTES = 36
+
+# Budget mémoire d'une partition et dossier des candidats déversés
+DEFAULT_BUDGET_BYTES = int(os.getenv('OUT_OF_CORE_PARTITION_MB', '64')) * 1024 * 1024
+SPILL_DIR = os.getenv('OUT_OF_CORE_SPILL_DIR') or None
+
+# Même filtre que DataLoader.get_transaction_dataframe (produits < 0.5% des factures)
+MIN_ITEM_FRACTION = 0.005
+
+
+def frame_source(df, chunk_rows=50000):
+    """
+    Source de lignes (facture, description) à partir d'un DataFrame de transactions
+
+    Seul l'ordre des lignes est matérialisé ; les valeurs sont converties
+    par blocs de chunk_rows lignes.
+    """
+    def rows():
+        order = np.argsort(df['InvoiceNo'].astype(str).values, kind='stable')
+        for start in range(0, len(order), chunk_rows):
+            chunk = df.iloc[order[start:start + chunk_rows]]
+            yield from zip(chunk['InvoiceNo'].astype(str).tolist(), chunk['Description'].astype(str).tolist())
+    return rows
+
+
+def db_source(database, batch_size=10000):
+    """Source de lignes (facture, description) lues en flux depuis PostgreSQL"""
+    def rows():
+        return database.stream_transactions(batch_size)
+    return rows
+
+
+def _invoices(rows):
+    """Regrouper un flux de lignes triées par facture en ensembles de noms d'items"""
+    current = None
+    names = set()
+    for invoice, description in rows:
+        if invoice != current:
+            if names:
+                yield names
+            current = invoice
+            names = set()
+        names.add(description)
+    if names:
+        yield names
+
+
+def _partitions(rows, vocabulary, budget_bytes, keep):
+    """
+    Découper le flux de factures en partitions de taille bornée
+
+    Args:
+        keep: Identifiants des items conservés (les autres sont retirés des paniers)
+
+    Yields:
+        (Counter de tuples triés d'identifiants d'items, nombre de factures)
+    """
+    baskets = Counter()
+    n_invoices = 0
+    used = 0
+    for names in _invoices(rows):
+        basket = tuple(sorted(item for item in vocabulary.encode(names) if item in keep))
+        if not basket:
+            continue
+        if basket not in baskets:
+            used += INVOICE_OVERHEAD_BYTES + ITEM_BYTES * len(basket)
+        baskets[basket] += 1
+        n_invoices += 1
+        if used >= budget_bytes:
+            yield baskets, n_invoices
+            baskets = Counter()
+            n_invoices = 0
+            used = 0
+    if n_invoices:
+        yield baskets, n_invoices
+
+
+# Candidats écrits par bloc dans les fichiers déversés
+SPILL_BLOCK = 10000
+
+
+def _postings(baskets, items):
+    """
+    Paniers distincts de la partition contenant chaque item
+
+    Returns:
+        (positions triées des paniers par item, nombre de factures de chaque panier)
+    """
+    rows = {item: [] for item in items}
+    weights = np.empty(len(baskets), dtype=np.int64)
+    for row, (basket, count) in enumerate(baskets.items()):
+        weights[row] = count
+        for item in basket:
+            if item in rows:
+                rows[item].append(row)
+    return {item: np.array(positions, dtype=np.int64) for item, positions in rows.items()}, weights
+
+
+def _count(itemset, postings, weights):
+    """Nombre de factures de la partition contenant itemset"""
+    lists = sorted((postings[item] for item in itemset), key=len)
+    rows = lists[0]
+    for other in lists[1:]:
+        if not len(rows):
+            break
+        rows = np.intersect1d(rows, other, assume_unique=True)
+    return int(weights[rows].sum())
+
+
+def _spill(path, candidates):
+    """Écrire les candidats d'une partition, triés, par blocs"""
+    candidates = sorted(candidates)
+    with open(path, 'wb') as spill:
+        for start in range(0, len(candidates), SPILL_BLOCK):
+            pickle.dump(candidates[start:start + SPILL_BLOCK], spill, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_spill(path):
+    with open(path, 'rb') as spill:
+        while True:
+            try:
+                yield from pickle.load(spill)
+            except EOFError:
+                return
+
+
+def _merged_candidates(paths):
+    """Candidats de toutes les partitions, triés et sans doublon (fusion en flux)"""
+    previous = None
+    for itemset in heapq.merge(*(_read_spill(path) for path in paths)):
+        if itemset != previous:
+            yield itemset
+            previous = itemset
+
+
+def _chunks(candidates, budget_bytes):
+    """Lots de candidats dont la taille estimée tient dans budget_bytes"""
+    chunk = []
+    used = 0
+    for itemset in candidates:
+        chunk.append(itemset)
+        used += INVOICE_OVERHEAD_BYTES + ITEM_BYTES * len(itemset)
+        if used >= budget_bytes:
+            yield chunk
+            chunk = []
+            used = 0
+    if chunk:
+        yield chunk
+
+
+def mine_out_of_core(source, vocabulary, min_support, budget_bytes=None, spill_dir=None):
+    """
+    Extraire les itemsets fréquents d'une source trop grande pour la mémoire
+
+    Args:
+        source: Fonction retournant un nouvel itérateur de (facture, description)
+                triés par facture (appelée une fois par passe)
+        vocabulary: ItemVocabulary partagé
+        min_support: Support minimum
+        budget_bytes: Mémoire maximum d'une partition (OUT_OF_CORE_PARTITION_MB par défaut)
+        spill_dir: Dossier des candidats déversés (OUT_OF_CORE_SPILL_DIR, ou
+                   le dossier temporaire du système)
+
+    Returns:
+        (liste de (frozenset d'identifiants d'items, support), rapport)
+    """
+    budget_bytes = budget_bytes or DEFAULT_BUDGET_BYTES
+    spill_dir = spill_dir or SPILL_DIR
+    start = time.perf_counter()
+
+    # Passe 1 : supports des items et nombre de factures
+    item_counts = Counter()
+    n_invoices = 0
+    for names in _invoices(source()):
+        item_counts.update(names)
+        n_invoices += 1
+    # Une seule extension du vocabulaire pour tous les items rencontrés
+    vocabulary.update(item_counts)
+    min_occurrences = int(n_invoices * MIN_ITEM_FRACTION)
+    keep = set(vocabulary.encode(name for name, count in item_counts.items() if count >= min_occurrences))
+    count_seconds = time.perf_counter() - start
+
+    report = {
+        'invoices': n_invoices,
+        'items': len(item_counts),
+        'items_kept': len(keep),
+        'budget_bytes': budget_bytes
+    }
+
+    # Passe 2 : itemsets fréquents de chaque partition, déversés sur disque
+    local_start = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=spill_dir, prefix='son_') as directory:
+        paths = []
+        n_basket_invoices = 0
+        for baskets, n_part in _partitions(source(), vocabulary, budget_bytes, keep):
+            local = mine_frequent(list(baskets.items()), min_support * n_part)
+            path = os.path.join(directory, f'candidates_{len(paths)}.pkl')
+            _spill(path, [tuple(sorted(items)) for items, _ in local])
+            paths.append(path)
+            n_basket_invoices += n_part
+        spill_bytes = sum(os.path.getsize(path) for path in paths)
+        local_seconds = time.perf_counter() - local_start
+
+        # Passe 3 : supports exacts des candidats, par lots tenant dans le budget
+        verify_start = time.perf_counter()
+        # Les factures sans produit conservé sont absentes de la matrice panier en mémoire
+        total = max(n_basket_invoices, 1)
+        min_count = math.ceil(min_support * total)
+        itemsets = []
+        n_candidates = 0
+        n_chunks = 0
+        for chunk in _chunks(_merged_candidates(paths), budget_bytes):
+            n_candidates += len(chunk)
+            n_chunks += 1
+            counts = np.zeros(len(chunk), dtype=np.int64)
+            chunk_items = set().union(*chunk)
+            for baskets, _ in _partitions(source(), vocabulary, budget_bytes, keep):
+                postings, weights = _postings(baskets, chunk_items)
+                for position, itemset in enumerate(chunk):
+                    counts[position] += _count(itemset, postings, weights)
+            itemsets.extend(
+                (frozenset(itemset), int(count) / total)
+                for itemset, count in zip(chunk, counts.tolist())
+                if count >= min_count
+            )
+
+    report.update({
+        'basket_invoices': n_basket_invoices,
+        'partitions': len(paths),
+        'candidates': n_candidates,
+        'count_passes': n_chunks,
+        'spill_bytes': spill_bytes,
+        'itemsets': len(itemsets),
+        'count_seconds': round(count_seconds, 4),
+        'local_seconds': round(local_seconds, 4),
+        'verify_seconds': round(time.perf_counter() - verify_start, 4),
+        'elapsed_seconds': round(time.perf_counter() - start, 4)
+    })
+    return itemsets, report
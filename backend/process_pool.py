@@ -0,0 +1,36 @@
+"""
+Pools de processus de calcul (modèles par segment, recommandations matérialisées)
+
+Les pools sont créés depuis les threads des requêtes Flask : un fork y
+copierait l'état des autres threads (verrous tenus par le logging, les
+pools de threads, les connexions) dans les processus fils. Les processus
+sont donc démarrés par un serveur forkserver, qui précharge les modules de
+calcul, ou par spawn là où forkserver n'existe pas.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Modules importés une fois par le serveur forkserver plutôt que par chaque processus
+PRELOAD_MODULES = ['numpy', 'pandas', 'scipy.sparse', 'fptree', 'materialized', 'segments']
+
+_context = None
+_lock = threading.Lock()
+
+
+def process_context():
+    """Contexte multiprocessing des pools de calcul (forkserver, sinon spawn)"""
+    global _context
+    with _lock:
+        if _context is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                _context = multiprocessing.get_context('forkserver')
+                _context.set_forkserver_preload(PRELOAD_MODULES)
+            else:
+                _context = multiprocessing.get_context('spawn')
+        return _context
+
+
+def process_pool(max_workers, **kwargs):
+    """ProcessPoolExecutor sans fork du processus de service"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=process_context(), **kwargs)
@@ -0,0 +1,177 @@
+"""
+Micro-lots de requêtes /api/recommend
+
+Sous charge, chaque requête concurrente évalue seule les règles. Le
+planificateur regroupe les paniers arrivés dans une courte fenêtre
+(RECOMMEND_BATCH_WINDOW_MS après le premier, ou RECOMMEND_BATCH_MAX_SIZE
+paniers) et les évalue en un seul produit creux paniers × antécédents
+(materialized.score_baskets), puis rend à chaque appelant son résultat.
+
+Le lot est évalué avec le plus grand top_n demandé et sans seuil de
+confiance : la liste de chaque requête, filtrée par son min_confidence
+puis tronquée à son top_n, est exactement celle de Recommender.recommend.
+La taille des lots et l'attente de chaque requête sont publiées dans
+/metrics. Une requête dont le lot n'est pas évalué dans
+RECOMMEND_BATCH_TIMEOUT_MS est servie directement par
+Recommender.recommend.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+import numpy as np
+
+from materialized import model_rule_arrays, score_baskets
+from metrics import RECOMMEND_BATCH_SIZE, RECOMMEND_QUEUE_DELAY
+
+# Fenêtre de regroupement (0 = désactivé) et taille maximum d'un lot
+BATCH_WINDOW_MS = float(os.getenv('RECOMMEND_BATCH_WINDOW_MS', 0))
+BATCH_MAX_SIZE = int(os.getenv('RECOMMEND_BATCH_MAX_SIZE', 64))
+# Attente maximum du résultat d'un lot avant repli sur l'évaluation directe
+BATCH_TIMEOUT_MS = float(os.getenv('RECOMMEND_BATCH_TIMEOUT_MS', 1000))
+
+
+class _Request:
+    __slots__ = ('model', 'basket', 'top_n', 'min_confidence', 'future', 'enqueued')
+
+    def __init__(self, model, basket, top_n, min_confidence):
+        self.model = model
+        self.basket = basket
+        self.top_n = top_n
+        self.min_confidence = min_confidence
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class RecommendBatcher:
+    """File des requêtes de recommandation et fil d'évaluation par lots"""
+
+    def __init__(self, window_ms=BATCH_WINDOW_MS, max_batch=BATCH_MAX_SIZE, timeout_ms=BATCH_TIMEOUT_MS):
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.timeout = max(timeout_ms / 1000.0, self.window)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.timeouts = 0
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def _ensure_thread(self):
+        # Démarré à la première requête (et relancé dans un worker issu d'un fork)
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='recommend-batcher', daemon=True)
+                    self._thread.start()
+
+    def recommend(self, model, items, top_n=5, min_confidence=0.5):
+        """
+        Recommandations d'un panier, évaluées dans le prochain lot
+
+        Args:
+            model: ModelSnapshot ou SharedModel servi
+            items: Items du panier (noms)
+            top_n: Nombre de recommandations
+            min_confidence: Confiance minimum
+
+        Returns:
+            Liste de recommandations (format de Recommender.recommend)
+        """
+        universe, positions, _ = model_rule_arrays.get(model)
+        vocabulary = model.vocabulary
+        ids = set(vocabulary.encode(items)) if vocabulary is not None else set(items)
+        basket = np.array(sorted(positions[item] for item in ids if item in positions), dtype=np.int64)
+
+        request = _Request(model, basket, top_n, min_confidence)
+        self._ensure_thread()
+        self._queue.put(request)
+        try:
+            pairs = request.future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Fil d'évaluation bloqué ou en retard : ne pas faire attendre la requête
+            request.future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            return model.recommender.recommend(items, top_n=top_n, min_confidence=min_confidence)
+
+        # Mise en forme dans le fil de la requête, hors du fil d'évaluation
+        return model.recommender.format_recommendations(
+            [(universe[item], rule) for item, rule in pairs]
+        )
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0].enqueued + self.window
+            while len(batch) < self.max_batch:
+                # Requêtes déjà en attente d'abord, même si la fenêtre est écoulée
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        started = time.perf_counter()
+        RECOMMEND_BATCH_SIZE.observe(len(batch))
+        for request in batch:
+            RECOMMEND_QUEUE_DELAY.observe(started - request.enqueued)
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+
+        # Un lot peut chevaucher la publication d'un nouveau modèle
+        by_version = {}
+        for request in batch:
+            by_version.setdefault(request.model.version, []).append(request)
+
+        for requests in by_version.values():
+            # Requêtes déjà servies par le repli après expiration du délai
+            requests = [request for request in requests if request.future.set_running_or_notify_cancel()]
+            if not requests:
+                continue
+            try:
+                _, _, arrays = model_rule_arrays.get(requests[0].model)
+                confidence = arrays['confidence']
+                results = score_baskets(
+                    arrays, [request.basket for request in requests], max(r.top_n for r in requests)
+                )
+                for request, (items, rules) in zip(requests, results):
+                    pairs = [
+                        (item, rule) for item, rule in zip(items.tolist(), rules.tolist())
+                        if confidence[rule] >= request.min_confidence
+                    ]
+                    request.future.set_result(pairs[:request.top_n])
+            except Exception as e:
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def stats(self):
+        with self._lock:
+            batches, requests, timeouts = self.batches, self.requests, self.timeouts
+        return {
+            'enabled': self.enabled,
+            'window_ms': self.window * 1000.0,
+            'max_batch': self.max_batch,
+            'timeout_ms': self.timeout * 1000.0,
+            'batches': batches,
+            'requests': requests,
+            'timeouts': timeouts,
+            'mean_batch_size': requests / batches if batches else None
+        }
+
+
+# Instance globale
+recommend_batcher = RecommendBatcher()
@@ -3,14 +3,56 @@ Système de recommandation basé sur les règles d'association
 """
 import pandas as pd
 from typing import List, Dict, Tuple
+from vocabulary import item_vocabulary
 
 class Recommender:
-    def __init__(self, rules_df=None):
-        self.rules = rules_df
+    def __init__(self, rules_df=None, vocabulary=None, cooccurrence=None, materialized=None):
+        # Si fourni, les règles sont exprimées en identifiants d'items :
+        # les noms reçus sont encodés à l'entrée et reconstitués en sortie
+        self.vocabulary = vocabulary
+        # Modèle de co-occurrence (XᵀX) utilisé par recommend_by_similarity
+        self.cooccurrence = cooccurrence
+        # Recommandations pré-calculées des paniers fréquents (MaterializedRecommendations)
+        self.materialized = materialized
+        self.set_rules(rules_df)
     
     def set_rules(self, rules_df):
         """Définir les règles d'association"""
         self.rules = rules_df
+        self._index_rules()
+    
+    def _index_rules(self):
+        """Index (antécédents, conséquent) → position de la règle, pour les explications"""
+        self._rule_lookup = {}
+        if self.rules is None or len(self.rules) == 0:
+            return
+        
+        # La première règle dans l'ordre du DataFrame l'emporte, comme l'ancien parcours
+        lookup = self._rule_lookup
+        for position, (antecedents, consequents) in enumerate(
+            zip(self.rules['antecedents'], self.rules['consequents'])
+        ):
+            antecedents = frozenset(antecedents)
+            for consequent in consequents:
+                lookup.setdefault((antecedents, consequent), position)
+        
+        self._rule_metrics = {
+            metric: self.rules[metric].to_numpy(dtype=float)
+            for metric in ('confidence', 'lift', 'support')
+        }
+    
+    def _encode(self, items):
+        if self.vocabulary is None:
+            return set(items)
+        return set(self.vocabulary.encode(items))
+    
+    def _names(self, items):
+        if self.vocabulary is None:
+            return list(items)
+        return self.vocabulary.decode(items)
+    
+    def _name(self, item):
+        return item if self.vocabulary is None else self.vocabulary.name_of(item)
     
     def recommend(self, items: List[str], top_n: int = 5, min_confidence: float = 0.5) -> List[Dict]:
         """
@@ -27,7 +69,7 @@ class Recommender:
         if self.rules is None or len(self.rules) == 0:
             return []
         
-        items_set = set(items)
+        items_set = self._encode(items)
         recommendations = {}
         
         # Parcourir les règles
@@ -46,7 +88,7 @@ class Recommender:
                                 'confidence': float(rule['confidence']),
                                 'lift': float(rule['lift']),
                                 'support': float(rule['support']),
-                                'based_on': list(antecedents)
+                                'based_on': antecedents
                             }
                         else:
                             # Garder la règle avec la meilleure confiance
@@ -56,7 +98,7 @@ class Recommender:
                                     'confidence': float(rule['confidence']),
                                     'lift': float(rule['lift']),
                                     'support': float(rule['support']),
-                                    'based_on': list(antecedents)
+                                    'based_on': antecedents
                                 }
         
         # Filtrer par confiance minimum
@@ -70,14 +112,58 @@ class Recommender:
             filtered,
             key=lambda x: (x['confidence'], x['lift']),
             reverse=True
-        )
+        )[:top_n]
         
-        return sorted_recs[:top_n]
+        # Noms reconstitués pour les seules recommandations retournées
+        for rec in sorted_recs:
+            rec['item'] = self._name(rec['item'])
+            rec['based_on'] = self._names(rec['based_on'])
+        
+        return sorted_recs
+    
+    def recommend_materialized(self, items: List[str], top_n: int = 5, min_confidence: float = 0.5):
+        """
+        Recommandations lues dans la table des paniers fréquents
+        
+        Returns:
+            Même résultat que recommend, ou None si le panier n'est pas matérialisé
+        """
+        if self.materialized is None or self.rules is None:
+            return None
+        
+        pairs = self.materialized.get(self._encode(items), top_n, min_confidence)
+        if pairs is None:
+            return None
+        return self.format_recommendations(pairs)
+    
+    def format_recommendations(self, pairs) -> List[Dict]:
+        """
+        Recommandations au format de recommend
+        
+        Args:
+            pairs: (item recommandé, position de la règle retenue), dans l'ordre voulu
+        """
+        antecedents = self.rules['antecedents']
+        metrics = self._rule_metrics
+        return [
+            {
+                'item': self._name(item),
+                'confidence': float(metrics['confidence'][rule]),
+                'lift': float(metrics['lift'][rule]),
+                'support': float(metrics['support'][rule]),
+                'based_on': self._names(set(antecedents.iat[rule]))
+            }
+            for item, rule in pairs
+        ]
     
     def recommend_by_similarity(self, items: List[str], top_n: int = 5) -> List[Dict]:
         """
         Recommander des items similaires basés sur la co-occurrence
         
+        Avec un modèle de co-occurrence, le score est la somme des lifts des
+        paires (item du panier, candidat) ; sinon, la somme des lifts des
+        règles qui contiennent un item du panier.
+        
         Args:
             items: Liste des items
             top_n: Nombre de recommandations
@@ -85,10 +171,13 @@ class Recommender:
         Returns:
             Liste de recommandations
         """
+        if self.cooccurrence is not None:
+            return self.cooccurrence.similar(items, top_n)
+        
         if self.rules is None or len(self.rules) == 0:
             return []
         
-        items_set = set(items)
+        items_set = self._encode(items)
         similar_items = {}
         
         # Trouver les items qui apparaissent fréquemment avec les items fournis
@@ -115,9 +204,12 @@ class Recommender:
             similar_items.values(),
             key=lambda x: x['score'],
             reverse=True
-        )
+        )[:top_n]
+        
+        for rec in sorted_items:
+            rec['item'] = self._name(rec['item'])
         
-        return sorted_items[:top_n]
+        return sorted_items
     
     def get_frequently_bought_together(self, item: str, top_n: int = 5) -> List[Dict]:
         """
@@ -133,6 +225,10 @@ class Recommender:
         if self.rules is None or len(self.rules) == 0:
             return []
         
+        encoded = self._encode([item])
+        if not encoded:
+            return []
+        item = next(iter(encoded))
         together = {}
         
         for _, rule in self.rules.iterrows():
@@ -171,9 +267,12 @@ class Recommender:
             together.values(),
             key=lambda x: x['confidence'],
             reverse=True
-        )
+        )[:top_n]
+        
+        for rec in sorted_together:
+            rec['item'] = self._name(rec['item'])
         
-        return sorted_together[:top_n]
+        return sorted_together
     
     def explain_recommendation(self, item: str, based_on: List[str]) -> Dict:
         """
@@ -189,23 +288,44 @@ class Recommender:
         if self.rules is None:
             return {}
         
-        based_on_set = set(based_on)
+        based_on_set = self._encode(based_on)
+        item_ids = self._encode([item])
+        if not item_ids or len(based_on_set) != len(set(based_on)):
+            return {}
+        item_id = next(iter(item_ids))
         
-        # Trouver la règle correspondante
-        for _, rule in self.rules.iterrows():
-            if set(rule['antecedents']) == based_on_set and item in rule['consequents']:
-                return {
-                    'item': item,
-                    'based_on': based_on,
-                    'confidence': float(rule['confidence']),
-                    'lift': float(rule['lift']),
-                    'support': float(rule['support']),
-                    'explanation': f"Les clients qui ont acheté {', '.join(based_on)} "
-                                 f"ont également acheté {item} dans {rule['confidence']*100:.1f}% des cas. "
-                                 f"Cette association est {rule['lift']:.2f}x plus forte que le hasard."
-                }
-        
-        return {}
+        # Trouver la règle correspondante (recherche dans l'index)
+        position = self._rule_lookup.get((frozenset(based_on_set), item_id))
+        if position is None:
+            return {}
+        
+        confidence = self._rule_metrics['confidence'][position]
+        lift = self._rule_metrics['lift'][position]
+        return {
+            'item': item,
+            'based_on': based_on,
+            'confidence': float(confidence),
+            'lift': float(lift),
+            'support': float(self._rule_metrics['support'][position]),
+            'explanation': f"Les clients qui ont acheté {', '.join(based_on)} "
+                         f"ont également acheté {item} dans {confidence*100:.1f}% des cas. "
+                         f"Cette association est {lift:.2f}x plus forte que le hasard."
+        }
+    
+    def explain_recommendations(self, recommendations: List[Dict]) -> List[Dict]:
+        """
+        Expliquer une liste de recommandations en un appel
+        
+        Args:
+            recommendations: Entrées {'item', 'based_on'} (sortie de recommend)
+        
+        Returns:
+            Explications dans le même ordre ({} si aucune règle ne correspond)
+        """
+        return [
+            self.explain_recommendation(rec['item'], list(rec['based_on']))
+            for rec in recommendations
+        ]
 
 # Instance globale
-recommender = Recommender()
+recommender = Recommender(vocabulary=item_vocabulary)
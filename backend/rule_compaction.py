@@ -0,0 +1,113 @@
+"""
+Compaction des règles d'association (règles non productives et redondantes)
+"""
+import time
+from itertools import combinations
+
+import numpy as np
+
+from recommender import Recommender
+
+DEFAULT_CRITERIA = ('confidence', 'lift')
+
+
+def compact_rules(rules_df, min_lift=1.0, criteria=DEFAULT_CRITERIA, min_improvement=0.0):
+    """
+    Supprimer les règles non productives et celles dominées par une règle plus simple
+
+    Une règle A → C est :
+    - non productive si son lift est <= min_lift (pas mieux que le hasard) ;
+    - redondante s'il existe une règle A' → C avec A' ⊂ A strictement, qui fait
+      au moins aussi bien sur chaque métrique de criteria, à min_improvement près.
+
+    Les règles sont indexées par (antécédent, conséquent) : chaque règle ne
+    teste que les sous-ensembles de son antécédent, soit un temps linéaire en
+    nombre de règles pour des antécédents de longueur bornée.
+
+    Args:
+        rules_df: DataFrame des règles (format mlxtend)
+        min_lift: Lift minimum d'une règle productive
+        criteria: Métriques sur lesquelles une règle plus longue doit faire mieux
+        min_improvement: Gain minimum exigé sur au moins un critère
+
+    Returns:
+        (DataFrame compacté, rapport)
+    """
+    start = time.perf_counter()
+    total = len(rules_df)
+    if total == 0:
+        return rules_df, {
+            'rules_before': 0, 'rules_after': 0,
+            'removed_non_productive': 0, 'removed_redundant': 0, 'elapsed_ms': 0.0
+        }
+
+    for metric in criteria:
+        if metric not in rules_df.columns:
+            raise ValueError(f"Critère de dominance inconnu: {metric}")
+
+    antecedents = rules_df['antecedents'].values
+    consequents = rules_df['consequents'].values
+    metrics = np.column_stack([rules_df[m].to_numpy(dtype=float) for m in criteria])
+
+    index = {(a, c): i for i, (a, c) in enumerate(zip(antecedents, consequents))}
+
+    non_productive = rules_df['lift'].to_numpy(dtype=float) <= min_lift
+    redundant = np.zeros(total, dtype=bool)
+
+    for i in range(total):
+        if non_productive[i]:
+            continue
+        antecedent = antecedents[i]
+        if len(antecedent) < 2:
+            continue
+        consequent = consequents[i]
+        threshold = metrics[i] - min_improvement
+        for size in range(len(antecedent) - 1, 0, -1):
+            for subset in combinations(antecedent, size):
+                j = index.get((frozenset(subset), consequent))
+                if j is not None and np.all(metrics[j] >= threshold):
+                    redundant[i] = True
+                    break
+            if redundant[i]:
+                break
+
+    keep = ~(non_productive | redundant)
+    compacted = rules_df[keep].reset_index(drop=True)
+
+    return compacted, {
+        'rules_before': total,
+        'rules_after': int(keep.sum()),
+        'removed_non_productive': int(non_productive.sum()),
+        'removed_redundant': int(redundant.sum()),
+        'criteria': list(criteria),
+        'min_lift': min_lift,
+        'min_improvement': min_improvement,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+    }
+
+
+def measure_recommend_latency(rules_before, rules_after, n_queries=20, seed=42):
+    """
+    Comparer la latence de Recommender.recommend avant/après compaction
+
+    Les paniers de requête sont les antécédents de règles tirées au hasard.
+
+    Returns:
+        dict avec la latence moyenne (ms) de chaque jeu de règles
+    """
+    if len(rules_before) == 0:
+        return {'queries': 0}
+
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(rules_before), size=min(n_queries, len(rules_before)), replace=False)
+    baskets = [list(rules_before['antecedents'].iloc[row]) for row in rows]
+
+    result = {'queries': len(baskets)}
+    for name, rules in (('before', rules_before), ('after', rules_after)):
+        recommender = Recommender(rules)
+        start = time.perf_counter()
+        for basket in baskets:
+            recommender.recommend(basket, 5, 0.0)
+        result[f'{name}_mean_ms'] = round((time.perf_counter() - start) * 1000 / len(baskets), 3)
+
+    return result
@@ -0,0 +1,301 @@
+"""
+Graphe agrégé des règles d'association (page network.html)
+
+Chaque règle A → C ajoute un arc a → c pour tout a de A et c de C ; les arcs
+multiples sont agrégés (lift et confiance maximum, nombre de règles). Les
+nœuds portent le support de l'item, leur degré et une communauté
+(propagation d'étiquettes pondérée par le lift).
+
+Le graphe complet est construit une seule fois par version du modèle ; les
+vues élaguées (top arcs par nœud, communauté, voisinage d'un item) en sont
+dérivées et mises en cache avec leur ETag.
+"""
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+import serialization
+
+EDGE_METRICS = ('lift', 'confidence')
+
+
+def _communities(n_nodes, sources, targets, weights, max_iterations=20):
+    """Propagation d'étiquettes (déterministe) sur le graphe non orienté pondéré"""
+    neighbors = [defaultdict(float) for _ in range(n_nodes)]
+    for s, t, w in zip(sources.tolist(), targets.tolist(), weights.tolist()):
+        neighbors[s][t] += w
+        neighbors[t][s] += w
+
+    labels = list(range(n_nodes))
+    for _ in range(max_iterations):
+        changed = False
+        for node in range(n_nodes):
+            if not neighbors[node]:
+                continue
+            scores = defaultdict(float)
+            for other, weight in neighbors[node].items():
+                scores[labels[other]] += weight
+            # À score égal, la plus petite étiquette l'emporte
+            best = min(scores, key=lambda label: (-scores[label], label))
+            if best != labels[node]:
+                labels[node] = best
+                changed = True
+        if not changed:
+            break
+
+    # Communautés renumérotées par taille décroissante
+    sizes = pd.Series(labels).value_counts(sort=False)
+    order = sorted(sizes.index, key=lambda label: (-sizes[label], label))
+    renumber = {label: i for i, label in enumerate(order)}
+    return np.array([renumber[label] for label in labels], dtype=np.int32)
+
+
+class RuleGraph:
+    """Graphe complet d'une version du modèle (arcs et nœuds sous forme de tableaux)"""
+
+    def __init__(self, rules_df, itemsets_df=None):
+        sources, targets, lifts, confidences = [], [], [], []
+        for antecedents, consequents, lift, confidence in zip(
+            rules_df['antecedents'], rules_df['consequents'], rules_df['lift'], rules_df['confidence']
+        ):
+            for a in antecedents:
+                for c in consequents:
+                    sources.append(a)
+                    targets.append(c)
+                    lifts.append(lift)
+                    confidences.append(confidence)
+
+        singles = {}
+        if itemsets_df is not None and len(itemsets_df) > 0:
+            singles = {
+                next(iter(items)): support
+                for items, support in zip(itemsets_df['itemsets'], itemsets_df['support'])
+                if len(items) == 1
+            }
+        self._build(sources, targets, lifts, confidences, singles)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Graphe construit directement sur les tableaux CSR publiés (model_store)
+
+        Les paires antécédent × conséquent de chaque règle sont énumérées en
+        vectoriel, sans reconstituer les règles en objets Python.
+        """
+        antecedent_offsets = np.asarray(arrays['antecedent_offsets'])
+        consequent_offsets = np.asarray(arrays['consequent_offsets'])
+        n_antecedents = np.diff(antecedent_offsets)
+        n_consequents = np.diff(consequent_offsets)
+        pairs = n_antecedents * n_consequents
+
+        # Paire k de la règle r : antécédent k // |C|, conséquent k % |C|
+        rules = np.repeat(np.arange(len(pairs)), pairs)
+        starts = np.zeros(len(pairs) + 1, dtype=np.int64)
+        np.cumsum(pairs, out=starts[1:])
+        k = np.arange(int(starts[-1])) - starts[rules]
+        sources = arrays['antecedent_items'][antecedent_offsets[rules] + k // n_consequents[rules]]
+        targets = arrays['consequent_items'][consequent_offsets[rules] + k % n_consequents[rules]]
+
+        itemset_offsets = np.asarray(arrays['itemset_offsets'])
+        single = np.flatnonzero(np.diff(itemset_offsets) == 1)
+        singles = dict(zip(
+            arrays['itemset_items'][itemset_offsets[single]].tolist(),
+            arrays['itemset_support'][single].tolist()
+        ))
+
+        graph = cls.__new__(cls)
+        graph._build(sources, targets, arrays['lift'][rules], arrays['confidence'][rules], singles)
+        return graph
+
+    def _build(self, sources, targets, lifts, confidences, singles):
+        """Arcs agrégés, nœuds et communautés à partir des paires (item source, item cible)"""
+        edges = pd.DataFrame({
+            'source': sources, 'target': targets, 'lift': lifts, 'confidence': confidences
+        }).groupby(['source', 'target'], sort=True).agg(
+            lift=('lift', 'max'), confidence=('confidence', 'max'), rules=('lift', 'size')
+        ).reset_index()
+
+        # Nœuds indexés de 0 à n-1 : les arcs référencent des positions
+        self.items = np.unique(np.concatenate([
+            edges['source'].to_numpy(), edges['target'].to_numpy()
+        ])) if len(edges) else np.empty(0, dtype=np.int64)
+        self.sources = np.searchsorted(self.items, edges['source'].to_numpy()).astype(np.int32)
+        self.targets = np.searchsorted(self.items, edges['target'].to_numpy()).astype(np.int32)
+        self.lift = edges['lift'].to_numpy(dtype=float)
+        self.confidence = edges['confidence'].to_numpy(dtype=float)
+        self.rules = edges['rules'].to_numpy(dtype=np.int32)
+
+        n_nodes = len(self.items)
+        self.support = np.array([singles.get(item, np.nan) for item in self.items.tolist()], dtype=float)
+        self.community = _communities(n_nodes, self.sources, self.targets, self.lift)
+
+    def __len__(self):
+        return len(self.items)
+
+    def select(self, top_edges=None, metric='lift', min_lift=None, community=None, item=None, depth=1):
+        """
+        Arcs d'une vue élaguée du graphe
+
+        Args:
+            top_edges: Garder pour chaque nœud ses top_edges meilleurs arcs (selon metric)
+            metric: 'lift' ou 'confidence'
+            min_lift: Lift minimum d'un arc
+            community: Ne garder que les arcs internes à une communauté
+            item: Identifiant d'item : sous-graphe induit par les nœuds à au
+                  plus depth arcs de cet item (ego-réseau)
+            depth: Rayon du voisinage (en nombre d'arcs)
+
+        Returns:
+            Positions des arcs retenus
+        """
+        if metric not in EDGE_METRICS:
+            raise ValueError(f"metric doit être l'un de {', '.join(EDGE_METRICS)}")
+
+        mask = np.ones(len(self.sources), dtype=bool)
+        if min_lift is not None:
+            mask &= self.lift >= min_lift
+        if community is not None:
+            mask &= (self.community[self.sources] == community) & (self.community[self.targets] == community)
+
+        if item is not None:
+            position = np.searchsorted(self.items, item)
+            if position >= len(self.items) or self.items[position] != item:
+                return np.empty(0, dtype=np.int64)
+            reached = np.zeros(len(self.items), dtype=bool)
+            reached[position] = True
+            for _ in range(depth):
+                touching = mask & (reached[self.sources] | reached[self.targets])
+                reached[self.sources[touching]] = True
+                reached[self.targets[touching]] = True
+            mask &= reached[self.sources] & reached[self.targets]
+
+        selected = np.flatnonzero(mask)
+        if top_edges:
+            # Un arc est gardé s'il est parmi les meilleurs de l'une de ses extrémités
+            values = getattr(self, metric)[selected]
+            order = selected[np.argsort(-values, kind='stable')]
+            kept = np.zeros(len(self.sources), dtype=bool)
+            for endpoint in (self.sources, self.targets):
+                nodes = endpoint[order]
+                rank = pd.Series(nodes).groupby(nodes).cumcount().to_numpy()
+                kept[order[rank < top_edges]] = True
+            selected = np.flatnonzero(kept)
+        return selected
+
+    def payload(self, edges, vocabulary=None):
+        """Nœuds et arcs sélectionnés, prêts pour JSON (noms d'items en identifiants de nœuds)"""
+        nodes = np.unique(np.concatenate([self.sources[edges], self.targets[edges]]))
+        degree = np.bincount(self.sources[edges], minlength=len(self.items)) + \
+            np.bincount(self.targets[edges], minlength=len(self.items))
+        names = self.items[nodes].tolist()
+        if vocabulary is not None:
+            names = vocabulary.decode(names)
+        label = dict(zip(nodes.tolist(), names))
+
+        return {
+            'nodes': [
+                {'id': name, 'support': support, 'degree': int(d), 'community': int(c)}
+                for name, support, d, c in zip(
+                    names,
+                    serialization.floats(self.support[nodes]),
+                    degree[nodes],
+                    self.community[nodes]
+                )
+            ],
+            'edges': [
+                {'from': label[s], 'to': label[t], 'lift': lift, 'confidence': confidence, 'rules': int(r)}
+                for s, t, lift, confidence, r in zip(
+                    self.sources[edges].tolist(),
+                    self.targets[edges].tolist(),
+                    serialization.floats(self.lift[edges]),
+                    serialization.floats(self.confidence[edges]),
+                    self.rules[edges]
+                )
+            ]
+        }
+
+    def describe(self):
+        return {
+            'nodes': len(self.items),
+            'edges': len(self.sources),
+            'communities': int(self.community.max()) + 1 if len(self.items) else 0
+        }
+
+
+class RuleGraphCache:
+    """Graphe de la version courante du modèle et réponses déjà encodées"""
+
+    def __init__(self, max_views=64):
+        self.max_views = max_views
+        self.version = None
+        self.graph = None
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self.version = None
+            self.graph = None
+            self._views = OrderedDict()
+
+    def get(self, version, build):
+        """
+        Graphe complet de version (construit au premier appel pour cette version)
+
+        Args:
+            version: Version du modèle servi
+            build: Fonction sans argument qui construit le RuleGraph (rule_graph du modèle)
+        """
+        with self._lock:
+            if self.version != version or self.graph is None:
+                self.graph = build()
+                self.version = version
+                self._views = OrderedDict()
+            return self.graph
+
+    def view(self, version, build, vocabulary=None, **params):
+        """
+        Vue élaguée encodée en JSON et son ETag
+
+        L'ETag est l'empreinte du contenu de la vue, hors numéro de version
+        (propre au processus) : deux workers servant les mêmes règles
+        renvoient le même ETag.
+
+        Returns:
+            (octets JSON, ETag)
+        """
+        graph = self.get(version, build)
+        key = tuple(sorted(params.items()))
+        with self._lock:
+            cached = self._views.get(key)
+            if cached is not None and self.version == version:
+                self._views.move_to_end(key)
+                return cached
+
+        edges = graph.select(**params)
+        payload = graph.payload(edges, vocabulary)
+        echoed = {name: value for name, value in params.items() if value is not None}
+        if vocabulary is not None and 'item' in echoed:
+            echoed['item'] = vocabulary.name_of(echoed['item'])
+        payload.update({
+            'success': True,
+            'total': graph.describe(),
+            'params': echoed
+        })
+        etag = hashlib.sha1(serialization.dumps(payload)).hexdigest()[:20]
+        payload['version'] = version
+        body = serialization.dumps(payload)
+
+        with self._lock:
+            if self.version == version:
+                self._views[key] = (body, etag)
+                if len(self._views) > self.max_views:
+                    self._views.popitem(last=False)
+        return body, etag
+
+
+# Instance globale
+rule_graph_cache = RuleGraphCache()
@@ -0,0 +1,152 @@
+"""
+Index item -> règles (listes de positions) pour la recherche des règles d'un item
+
+Les listes sont construites une fois par jeu de règles, côté antécédents et
+côté conséquents. Les règles du moteur étant triées par confiance puis lift,
+chaque liste est déjà dans l'ordre de confiance ; un tri par lift ne porte
+que sur les règles de l'item. Le coût d'une requête dépend du nombre de
+règles de l'item, pas du nombre total de règles.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+RULE_SIDES = ('any', 'antecedents', 'consequents')
+RULE_SORTS = ('confidence', 'lift')
+
+
+def _postings(itemsets):
+    postings = defaultdict(list)
+    for position, items in enumerate(itemsets):
+        for item in items:
+            postings[item].append(position)
+    return {item: np.array(positions, dtype=np.int32) for item, positions in postings.items()}
+
+
+def csr_postings(items, offsets, n_items):
+    """
+    Listes de positions au format CSR à partir d'itemsets au format CSR
+
+    Args:
+        items: Identifiants concaténés des itemsets
+        offsets: Début de chaque itemset (fin en dernier)
+        n_items: Nombre d'identifiants (taille de l'index)
+
+    Returns:
+        (positions concaténées par identifiant, début de chaque liste avec la fin en dernier)
+    """
+    items = np.asarray(items, dtype=np.int64)
+    owners = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+    # Tri stable : chaque liste reste dans l'ordre des positions
+    order = np.argsort(items, kind='stable')
+    starts = np.zeros(n_items + 1, dtype=np.int64)
+    np.cumsum(np.bincount(items, minlength=n_items), out=starts[1:])
+    return owners[order], starts
+
+
+class _CSRPostings:
+    """Listes de positions par identifiant d'item, sur des tableaux CSR (éventuellement mappés)"""
+
+    def __init__(self, positions, offsets):
+        self.positions = positions
+        self.offsets = offsets
+
+    def get(self, item, default=None):
+        if not 0 <= item < len(self.offsets) - 1:
+            return default
+        start, end = self.offsets[item], self.offsets[item + 1]
+        return self.positions[start:end] if end > start else default
+
+    def __len__(self):
+        return int(np.count_nonzero(np.diff(self.offsets)))
+
+
+class RuleIndex:
+    """Listes de positions des règles par item, côté antécédents et conséquents"""
+
+    def __init__(self, rules_df):
+        """
+        Args:
+            rules_df: DataFrame des règles (format mlxtend), trié par confiance puis lift
+        """
+        self.n_rules = len(rules_df)
+        self.antecedents = _postings(rules_df['antecedents'])
+        self.consequents = _postings(rules_df['consequents'])
+        self.lift = rules_df['lift'].to_numpy(dtype=float)
+        self.confidence = rules_df['confidence'].to_numpy(dtype=float)
+        self.length = np.fromiter(
+            (len(a) + len(c) for a, c in zip(rules_df['antecedents'], rules_df['consequents'])),
+            dtype=np.int32, count=self.n_rules
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Index attaché aux tableaux publiés avec le modèle (csr_postings, sans copie)"""
+        index = cls.__new__(cls)
+        index.n_rules = len(arrays['rule_length'])
+        index.antecedents = _CSRPostings(arrays['antecedent_postings'], arrays['antecedent_postings_offsets'])
+        index.consequents = _CSRPostings(arrays['consequent_postings'], arrays['consequent_postings_offsets'])
+        index.lift = arrays['lift']
+        index.confidence = arrays['confidence']
+        index.length = arrays['rule_length']
+        return index
+
+    def positions(self, item, side='any'):
+        """Positions (croissantes) des règles contenant item du côté demandé"""
+        if side not in RULE_SIDES:
+            raise ValueError(f"side doit être l'un de {', '.join(RULE_SIDES)}")
+        empty = np.empty(0, dtype=np.int32)
+        if side == 'antecedents':
+            return self.antecedents.get(item, empty)
+        if side == 'consequents':
+            return self.consequents.get(item, empty)
+        # Un item n'est jamais des deux côtés d'une même règle
+        return np.sort(np.concatenate([
+            self.antecedents.get(item, empty),
+            self.consequents.get(item, empty)
+        ]))
+
+    def count(self, item, side='any'):
+        """Nombre de règles contenant item du côté demandé"""
+        if side == 'any':
+            return self.count(item, 'antecedents') + self.count(item, 'consequents')
+        return len(self.positions(item, side))
+
+    def page(self, item, side='any', sort='confidence', offset=0, limit=None):
+        """
+        Une page des règles d'un item
+
+        Args:
+            limit: Taille de la page (None = jusqu'à la fin)
+
+        Returns:
+            (positions des règles de la page, nombre total de règles de l'item)
+        """
+        if sort not in RULE_SORTS:
+            raise ValueError(f"sort doit être l'un de {', '.join(RULE_SORTS)}")
+        positions = self.positions(item, side)
+        if sort == 'lift':
+            # Tri stable : à lift égal, l'ordre de confiance est conservé
+            positions = positions[np.argsort(-self.lift[positions], kind='stable')]
+        end = None if limit is None else offset + limit
+        return positions[offset:end], len(positions)
+
+    def filter(self, min_lift=None, min_confidence=None, min_length=None, max_length=None):
+        """Positions (dans l'ordre des règles) des règles satisfaisant les seuils"""
+        mask = np.ones(self.n_rules, dtype=bool)
+        if min_lift is not None:
+            mask &= self.lift >= min_lift
+        if min_confidence is not None:
+            mask &= self.confidence >= min_confidence
+        if min_length is not None:
+            mask &= self.length >= min_length
+        if max_length is not None:
+            mask &= self.length <= max_length
+        return np.flatnonzero(mask)
+
+    def describe(self):
+        return {
+            'rules': self.n_rules,
+            'antecedent_items': len(self.antecedents),
+            'consequent_items': len(self.consequents)
+        }
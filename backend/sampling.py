@@ -0,0 +1,215 @@
+"""
+Aperçu rapide par échantillonnage (méthode de Toivonen)
+
+Un échantillon aléatoire de factures est extrait à un seuil abaissé ; les
+supports estimés sont accompagnés d'un intervalle de confiance
+(approximation normale de la proportion échantillonnée).
+Une passe de comptage optionnelle sur toutes les factures vérifie les
+candidats et leur bordure négative : si aucun itemset de la bordure n'est
+fréquent, aucun itemset fréquent n'a été manqué.
+"""
+import math
+import time
+from itertools import combinations
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from fptree import encode_transactions, mine_frequent
+
+
+def z_score(delta):
+    """Quantile normal bilatéral pour un niveau de confiance 1 - delta"""
+    return NormalDist().inv_cdf(1 - delta / 2)
+
+
+def half_width(support, n, delta):
+    """Demi-largeur de l'intervalle de confiance d'un support estimé sur n factures"""
+    support = np.asarray(support, dtype=float)
+    return z_score(delta) * np.sqrt(support * (1 - support) / n)
+
+
+def sample_size(min_support, epsilon, delta):
+    """
+    Taille d'échantillon pour estimer un support proche de min_support
+    à ±epsilon près, avec probabilité 1 - delta
+    """
+    if not 0 < epsilon < 1 or not 0 < delta < 1:
+        raise ValueError("epsilon et delta doivent être compris entre 0 et 1")
+    variance = min_support * (1 - min_support)
+    return max(1, math.ceil(z_score(delta) ** 2 * variance / epsilon ** 2))
+
+
+def negative_border(itemsets, items):
+    """
+    Bordure négative : itemsets non candidats dont tous les sous-ensembles directs sont candidats
+
+    Args:
+        itemsets: Ensemble (fermé par sous-ensemble) de frozensets candidats
+        items: Tous les items
+    """
+    border = {frozenset([item]) for item in items} - itemsets
+    by_length = {}
+    for itemset in itemsets:
+        by_length.setdefault(len(itemset), []).append(itemset)
+
+    # Jointure de type Apriori sur les candidats de même longueur
+    for length, level in by_length.items():
+        level = sorted(tuple(sorted(itemset)) for itemset in level)
+        for i, first in enumerate(level):
+            for second in level[i + 1:]:
+                if first[:-1] != second[:-1]:
+                    break
+                candidate = frozenset(first + second[-1:])
+                if candidate in itemsets:
+                    continue
+                if all(frozenset(subset) in itemsets for subset in combinations(candidate, length)):
+                    border.add(candidate)
+    return border
+
+
+def _column_bitmaps(values):
+    """Une passe sur la matrice panier : bitmap (entier Python) des factures de chaque colonne"""
+    packed = np.packbits(values, axis=0)
+    return [int.from_bytes(packed[:, j].tobytes(), 'big') for j in range(values.shape[1])]
+
+
+def _count(itemset, bitmaps):
+    bits = None
+    for item in itemset:
+        bits = bitmaps[item] if bits is None else bits & bitmaps[item]
+    return bits.bit_count()
+
+
+def plan_sample(n_rows, min_support, epsilon=None, delta=0.05):
+    """
+    Erreur tolérée et taille d'échantillon pour n_rows factures
+
+    Returns:
+        (epsilon, nombre de factures à tirer)
+    """
+    if epsilon is None:
+        epsilon = min_support / 4
+    return epsilon, min(sample_size(min_support, epsilon, delta), n_rows)
+
+
+def preview_itemsets(basket_df, min_support, epsilon=None, delta=0.05, verify=False, seed=42):
+    """
+    Extraire les itemsets probablement fréquents sur un échantillon de factures
+
+    Args:
+        basket_df: DataFrame one-hot encoding (factures × produits)
+        min_support: Support minimum visé
+        epsilon: Erreur tolérée sur un support proche de min_support
+                 (par défaut min_support / 4)
+        delta: Probabilité tolérée de dépasser epsilon
+        verify: Compter les candidats et leur bordure négative sur toutes les factures
+        seed: Graine de l'échantillonnage
+
+    Returns:
+        (DataFrame support/itemsets/support_low/support_high/status, rapport)
+    """
+    start = time.perf_counter()
+    values = np.asarray(basket_df.values, dtype=bool)
+    n_rows = values.shape[0]
+
+    epsilon, n_sample = plan_sample(n_rows, min_support, epsilon, delta)
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(n_rows, size=n_sample, replace=False))
+
+    return _preview(
+        values[rows], basket_df.columns.tolist(), n_rows, min_support, epsilon, delta,
+        values if verify else None, start
+    )
+
+
+def preview_sample(sample_df, n_rows, min_support, epsilon=None, delta=0.05):
+    """
+    Aperçu sur un échantillon déjà tiré parmi n_rows factures
+
+    Seul l'échantillon est encodé par l'appelant : aucune passe de
+    vérification n'est possible (voir preview_itemsets).
+
+    Args:
+        sample_df: DataFrame one-hot encoding de l'échantillon
+        n_rows: Nombre de factures de la matrice complète
+    """
+    start = time.perf_counter()
+    if epsilon is None:
+        epsilon = min_support / 4
+    return _preview(
+        np.asarray(sample_df.values, dtype=bool), sample_df.columns.tolist(),
+        n_rows, min_support, epsilon, delta, None, start
+    )
+
+
+def _preview(sample, columns, n_rows, min_support, epsilon, delta, values, start):
+    """Extraction à seuil abaissé sur l'échantillon, puis vérification si values est fourni"""
+    n_sample = sample.shape[0]
+    exhaustive = n_sample == n_rows
+
+    # Seuil abaissé (Toivonen) : un itemset fréquent a peu de chances d'être manqué
+    margin = 0.0 if exhaustive else float(half_width(min_support, n_sample, delta))
+    lowered = max(min_support - margin, 1.0 / n_sample)
+
+    transactions, _ = encode_transactions(pd.DataFrame(sample))
+    mined = mine_frequent(transactions, lowered * n_sample)
+    candidates = {frozenset(items): count / n_sample for items, count in mined}
+    sampling_seconds = time.perf_counter() - start
+
+    report = {
+        'invoices': n_rows,
+        'sample_size': n_sample,
+        'sample_fraction': round(n_sample / max(n_rows, 1), 4),
+        'epsilon': epsilon,
+        'delta': delta,
+        'threshold_margin': round(margin, 6),
+        'lowered_min_support': round(lowered, 6),
+        'candidates': len(candidates),
+        'verified': False,
+        'sampling_seconds': round(sampling_seconds, 4)
+    }
+
+    if values is not None:
+        verify_start = time.perf_counter()
+        bitmaps = _column_bitmaps(values)
+        border = negative_border(set(candidates), range(values.shape[1]))
+        exact = {itemset: _count(itemset, bitmaps) / n_rows for itemset in candidates}
+        missed = [itemset for itemset in border if _count(itemset, bitmaps) / n_rows >= min_support]
+
+        frequent = {itemset: support for itemset, support in exact.items() if support >= min_support}
+        frame = pd.DataFrame({
+            'support': list(frequent.values()),
+            'itemsets': [frozenset(columns[i] for i in itemset) for itemset in frequent],
+            'support_low': list(frequent.values()),
+            'support_high': list(frequent.values()),
+            'status': 'exact'
+        }, columns=['support', 'itemsets', 'support_low', 'support_high', 'status'])
+
+        report.update({
+            'verified': True,
+            'negative_border': len(border),
+            # Toivonen : un itemset fréquent de la bordure signale de possibles oublis
+            'complete': not missed,
+            'missed_border_itemsets': len(missed),
+            'false_candidates': len(exact) - len(frequent),
+            'verification_seconds': round(time.perf_counter() - verify_start, 4)
+        })
+    else:
+        supports = np.array(list(candidates.values()), dtype=float)
+        width = 0.0 if exhaustive else half_width(supports, n_sample, delta)
+        low = np.clip(supports - width, 0, 1)
+        high = np.clip(supports + width, 0, 1)
+        frame = pd.DataFrame({
+            'support': supports,
+            'itemsets': [frozenset(columns[i] for i in itemset) for itemset in candidates],
+            'support_low': low,
+            'support_high': high,
+            'status': np.where(low >= min_support, 'likely', 'uncertain')
+        }, columns=['support', 'itemsets', 'support_low', 'support_high', 'status'])
+
+    frame = frame.sort_values('support', ascending=False).reset_index(drop=True)
+    report['itemsets'] = len(frame)
+    report['elapsed_seconds'] = round(time.perf_counter() - start, 4)
+    return frame, report
@@ -0,0 +1,192 @@
+"""
+Modèles FP-Growth par segment (pays, cohorte de clients)
+
+Chaque segment ayant assez de factures est extrait dans un processus
+séparé. Les paniers sont envoyés aux processus sous forme de tuples
+d'identifiants d'items, selon un vocabulaire commun à tous les segments ;
+les règles des segments restent exprimées en identifiants et ne sont
+traduites en noms qu'au moment de la recommandation.
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from mlxtend.frequent_patterns import association_rules
+
+from fptree import mine_frequent
+from recommender import Recommender
+from memory_report import deep_size
+from process_pool import process_pool
+from vocabulary import ItemVocabulary, item_vocabulary
+
+# Colonnes de segmentation acceptées ('cohort' = mois du premier achat du client)
+SEGMENT_COLUMNS = ('Country', 'cohort')
+
+# Colonnes des règles conservées par segment (celles utilisées par Recommender)
+RULE_COLUMNS = ['antecedents', 'consequents', 'support', 'confidence', 'lift']
+
+# Nombre minimum de factures d'un itemset de segment : dans un petit segment,
+# min_support × factures tombe à 1 ou 2 et chaque sous-ensemble des paniers
+# deviendrait fréquent
+MIN_SEGMENT_COUNT = 5
+
+
+def segment_keys(df, column):
+    """Valeur de segment de chaque ligne de transactions"""
+    if column not in SEGMENT_COLUMNS:
+        raise ValueError(f"Colonne de segmentation inconnue: {column}")
+
+    if column == 'cohort':
+        dates = pd.to_datetime(df['InvoiceDate'])
+        first_purchase = dates.groupby(df['CustomerID']).transform('min')
+        return first_purchase.dt.strftime('%Y-%m').where(df['CustomerID'].notna(), None)
+
+    return df[column].astype(str).where(df[column].notna(), None)
+
+
+def _mine_segment(transactions, n_invoices, min_support, min_confidence, max_length):
+    """Extraire itemsets et règles d'un segment (exécuté dans un processus de travail)"""
+    start = time.perf_counter()
+    itemsets = mine_frequent(transactions, max(min_support * n_invoices, MIN_SEGMENT_COUNT), max_length)
+    frequent = pd.DataFrame({
+        'support': [count / n_invoices for _, count in itemsets],
+        'itemsets': [frozenset(items) for items, _ in itemsets]
+    }, columns=['support', 'itemsets'])
+
+    if any(len(items) > 1 for items in frequent['itemsets']):
+        rules = association_rules(frequent, metric='confidence', min_threshold=min_confidence)
+        rules = rules[RULE_COLUMNS].sort_values(['confidence', 'lift'], ascending=False).reset_index(drop=True)
+    else:
+        rules = pd.DataFrame(columns=RULE_COLUMNS)
+
+    return len(frequent), rules, time.perf_counter() - start
+
+
+class SegmentModels:
+    """Règles d'association par segment, sur un vocabulaire d'items partagé"""
+
+    def __init__(self, max_workers=None, max_length=None, vocabulary=None):
+        self.max_workers = max_workers
+        # Longueur maximum des itemsets : borne la mémoire des petits segments
+        self.max_length = max_length
+        self.vocabulary = vocabulary if vocabulary is not None else ItemVocabulary()
+        self.column = None
+        self.models = {}
+        self.summary = {}
+        self._lock = threading.Lock()
+
+    def _encode(self, df, column):
+        """Paniers agrégés par segment : {segment: (Counter de tuples d'ids, nombre de factures)}"""
+        codes, names = pd.factorize(df['Description'].astype(str))
+        self.vocabulary.update(names)
+        codes = np.where(codes >= 0, self.vocabulary.encode_values(names)[codes], -1)
+        frame = pd.DataFrame({
+            'segment': segment_keys(df, column).values,
+            'invoice': df['InvoiceNo'].astype(str).values,
+            'code': codes
+        })
+        frame = frame[frame['segment'].notna() & (frame['code'] >= 0)]
+        frame = frame.drop_duplicates(['invoice', 'code']).sort_values(['invoice', 'code'], kind='stable')
+
+        invoices = frame['invoice'].values
+        segments = frame['segment'].values
+        codes = frame['code'].values
+        starts = np.flatnonzero(np.r_[True, invoices[1:] != invoices[:-1]])
+        ends = np.r_[starts[1:], len(invoices)]
+
+        baskets = {}
+        for start, end in zip(starts, ends):
+            # Une facture appartient au segment de sa première ligne
+            counter = baskets.setdefault(segments[start], Counter())
+            counter[tuple(codes[start:end].tolist())] += 1
+
+        return {
+            segment: (counter, sum(counter.values()))
+            for segment, counter in baskets.items()
+        }
+
+    def analyze(self, df, column='Country', min_support=0.01, min_confidence=0.5, min_invoices=200):
+        """
+        Extraire un modèle par segment ayant au moins min_invoices factures
+
+        Args:
+            df: DataFrame des transactions nettoyées
+            column: Colonne de segmentation (voir SEGMENT_COLUMNS)
+            min_support: Support minimum, relatif aux factures du segment
+            min_confidence: Confiance minimum des règles
+            min_invoices: Nombre minimum de factures pour modéliser un segment
+
+        Returns:
+            dict résumé par segment
+        """
+        baskets = self._encode(df, column)
+
+        eligible = {s: b for s, b in baskets.items() if b[1] >= min_invoices}
+        skipped = {s: b[1] for s, b in baskets.items() if b[1] < min_invoices}
+
+        models = {}
+        summary = {}
+        if eligible:
+            workers = self.max_workers or os.cpu_count() or 1
+            with process_pool(min(workers, len(eligible))) as executor:
+                futures = {
+                    segment: executor.submit(
+                        _mine_segment, list(counter.items()), n_invoices, min_support, min_confidence,
+                        self.max_length
+                    )
+                    for segment, (counter, n_invoices) in eligible.items()
+                }
+                for segment, future in futures.items():
+                    n_itemsets, rules, elapsed = future.result()
+                    models[segment] = Recommender(rules, self.vocabulary)
+                    summary[segment] = {
+                        'invoices': eligible[segment][1],
+                        'itemsets': n_itemsets,
+                        'rules': len(rules),
+                        'mining_seconds': round(elapsed, 4)
+                    }
+
+        with self._lock:
+            self.column = column
+            self.models = models
+            self.summary = summary
+
+        return {
+            'column': column,
+            'min_invoices': min_invoices,
+            'segments': summary,
+            'skipped_segments': len(skipped),
+            'skipped_invoices': int(sum(skipped.values())),
+            'vocabulary_size': len(self.vocabulary),
+            'rules_bytes': sum(deep_size(m.rules) for m in models.values())
+        }
+
+    def recommend(self, segment, items, top_n=5, min_confidence=0.5):
+        """
+        Recommandations du modèle d'un segment
+
+        Returns:
+            Liste de recommandations (noms d'items), ou None si le segment n'a pas de modèle
+        """
+        with self._lock:
+            model = self.models.get(segment)
+        if model is None:
+            return None
+        return model.recommend(items, top_n, min_confidence)
+
+    def clear(self):
+        with self._lock:
+            self.column = None
+            self.models = {}
+            self.summary = {}
+
+
+# Instance globale
+segment_models = SegmentModels(
+    max_workers=int(os.getenv('SEGMENT_WORKERS', '0')) or None,
+    max_length=int(os.getenv('MAX_ITEMSET_LENGTH', '5')) or None,
+    vocabulary=item_vocabulary
+)
@@ -0,0 +1,179 @@
+"""
+Sérialisation JSON rapide des itemsets et des règles
+
+Les réponses sont construites directement à partir des colonnes (tableaux
+numpy convertis en listes en un appel), sans dictionnaire intermédiaire par
+ligne de DataFrame, puis encodées avec orjson lorsqu'il est installé.
+
+Deux formes de réponse :
+- 'rows' : une entrée par itemset/règle (forme historique de l'API) ;
+- 'columnar' : tableaux parallèles, les items étant des indices dans un
+  dictionnaire 'items' partagé par toute la page.
+"""
+import base64
+import binascii
+import json
+import math
+
+import numpy as np
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RESPONSE_FORMATS = ('rows', 'columnar')
+RULE_METRICS = ('support', 'confidence', 'lift', 'leverage', 'conviction')
+
+
+def dumps(payload):
+    """Encoder payload en JSON (octets UTF-8)"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Réponse Flask JSON encodée par dumps"""
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def encode_cursor(version, offset):
+    """Curseur opaque : version du modèle et position dans le résultat filtré"""
+    raw = f'{version}|{offset}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor, version):
+    """
+    Position encodée dans un curseur
+
+    Raises:
+        ValueError: Curseur illisible ou émis pour une autre version du modèle
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        cursor_version, offset = raw.rsplit('|', 1)
+        offset = int(offset)
+    except (ValueError, binascii.Error, UnicodeError):
+        raise ValueError("Curseur invalide")
+    if cursor_version != str(version) or offset < 0:
+        raise ValueError("Curseur périmé : le modèle a changé depuis la page précédente")
+    return offset
+
+
+def floats(values):
+    """Liste de floats ; les valeurs non finies (conviction infinie) deviennent null"""
+    values = np.asarray(values, dtype=float)
+    result = values.tolist()
+    if not np.isfinite(values).all():
+        result = [value if math.isfinite(value) else None for value in result]
+    return result
+
+
+def _decoder(vocabulary):
+    if vocabulary is None:
+        return list
+    names = vocabulary.names
+    return lambda ids: [names[i] for i in ids]
+
+
+def _take(frame, column, positions):
+    values = frame[column].to_numpy()
+    return values if positions is None else values[positions]
+
+
+def rules_payload(rules_df, positions=None, vocabulary=None, shape='rows'):
+    """
+    Règles prêtes pour JSON
+
+    Args:
+        rules_df: DataFrame des règles (format mlxtend)
+        positions: Positions des règles à sérialiser (None = toutes)
+        vocabulary: Vocabulaire des identifiants d'items (None = noms)
+        shape: 'rows' ou 'columnar'
+
+    Returns:
+        Liste d'entrées ('rows') ou dict de tableaux parallèles ('columnar')
+    """
+    n = len(rules_df) if positions is None else len(positions)
+    antecedents = _take(rules_df, 'antecedents', positions)
+    consequents = _take(rules_df, 'consequents', positions)
+    metrics = {
+        metric: floats(_take(rules_df, metric, positions)) if metric in rules_df.columns else [0.0] * n
+        for metric in RULE_METRICS
+    }
+
+    if shape == 'columnar':
+        local = {}
+        index = lambda items: [local.setdefault(item, len(local)) for item in items]
+        columns = {
+            'antecedents': [index(items) for items in antecedents],
+            'consequents': [index(items) for items in consequents]
+        }
+        columns.update(metrics)
+        columns['items'] = _decoder(vocabulary)(list(local))
+        return columns
+
+    decode = _decoder(vocabulary)
+    return [
+        {
+            'antecedents': decode(a),
+            'consequents': decode(c),
+            'support': support,
+            'confidence': confidence,
+            'lift': lift,
+            'leverage': leverage,
+            'conviction': conviction
+        }
+        for a, c, support, confidence, lift, leverage, conviction in zip(
+            antecedents, consequents, *(metrics[metric] for metric in RULE_METRICS)
+        )
+    ]
+
+
+def itemsets_payload(itemsets_df, positions=None, vocabulary=None, shape='rows'):
+    """
+    Itemsets prêts pour JSON (avec intervalle de support et statut pour un aperçu)
+
+    Args:
+        itemsets_df: DataFrame support/itemsets
+        positions: Positions des itemsets à sérialiser (None = tous)
+        vocabulary: Vocabulaire des identifiants d'items (None = noms)
+        shape: 'rows' ou 'columnar'
+    """
+    itemsets = _take(itemsets_df, 'itemsets', positions)
+    support = floats(_take(itemsets_df, 'support', positions))
+    lengths = [len(items) for items in itemsets]
+    with_interval = 'support_low' in itemsets_df.columns
+    if with_interval:
+        intervals = list(zip(
+            floats(_take(itemsets_df, 'support_low', positions)),
+            floats(_take(itemsets_df, 'support_high', positions))
+        ))
+        status = _take(itemsets_df, 'status', positions).tolist()
+
+    if shape == 'columnar':
+        local = {}
+        columns = {
+            'itemsets': [[local.setdefault(item, len(local)) for item in items] for items in itemsets],
+            'support': support,
+            'length': lengths
+        }
+        if with_interval:
+            columns['support_interval'] = [list(interval) for interval in intervals]
+            columns['status'] = status
+        columns['items'] = _decoder(vocabulary)(list(local))
+        return columns
+
+    decode = _decoder(vocabulary)
+    formatted = [
+        {'items': decode(items), 'support': s, 'length': length}
+        for items, s, length in zip(itemsets, support, lengths)
+    ]
+    if with_interval:
+        for entry, interval, state in zip(formatted, intervals, status):
+            entry['support_interval'] = list(interval)
+            entry['status'] = state
+    return formatted
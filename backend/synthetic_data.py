@@ -0,0 +1,205 @@
+"""
+Générateur de transactions synthétiques au format Online Retail
+"""
+import numpy as np
+import pandas as pd
+
+# Dimensions approximatives du jeu Online Retail (facteur d'échelle 1.0)
+BASE_INVOICES = 25900
+BASE_PRODUCTS = 4000
+BASE_CUSTOMERS = 4400
+
+# Répartition des pays (Royaume-Uni largement majoritaire)
+COUNTRIES = {
+    'United Kingdom': 0.89,
+    'Germany': 0.025,
+    'France': 0.022,
+    'EIRE': 0.018,
+    'Spain': 0.007,
+    'Netherlands': 0.005,
+    'Belgium': 0.005,
+    'Switzerland': 0.004,
+    'Portugal': 0.004,
+    'Australia': 0.003,
+    'Norway': 0.003,
+    'Italy': 0.004,
+    'Channel Islands': 0.003,
+    'Finland': 0.003,
+    'Sweden': 0.002,
+    'Japan': 0.002,
+    'Poland': 0.001,
+}
+
+_WORDS = [
+    'WHITE', 'RED', 'PINK', 'BLUE', 'GREEN', 'IVORY', 'VINTAGE', 'RETROSPOT',
+    'HEART', 'CHRISTMAS', 'PAISLEY', 'SPACEBOY', 'WOODLAND', 'ROSE', 'POLKADOT',
+    'HANGING', 'GLASS', 'METAL', 'WOODEN', 'CERAMIC', 'LARGE', 'SMALL', 'JUMBO',
+]
+_OBJECTS = [
+    'T-LIGHT HOLDER', 'LUNCH BAG', 'CAKESTAND', 'BUNTING', 'MUG', 'TEA SET',
+    'ALARM CLOCK', 'DOORMAT', 'SIGN', 'LANTERN', 'CAKE CASES', 'NAPKINS',
+    'STORAGE TIN', 'GIFT WRAP', 'PHOTO FRAME', 'CANDLE', 'BOX', 'SHOPPER BAG',
+]
+
+
+def _product_catalog(n_products, rng):
+    """Générer des codes, descriptions et prix uniques"""
+    descriptions = set()
+    while len(descriptions) < n_products:
+        k = rng.integers(1, 4)
+        words = rng.choice(_WORDS, size=k, replace=False)
+        descriptions.add(f"{' '.join(words)} {rng.choice(_OBJECTS)} {rng.integers(1, 10_000)}")
+
+    descriptions = np.array(sorted(descriptions))
+    rng.shuffle(descriptions)
+    stock_codes = np.array([f"{20000 + i}" for i in range(n_products)])
+    prices = np.round(rng.lognormal(mean=1.0, sigma=0.8, size=n_products), 2) + 0.1
+    return stock_codes, descriptions, prices
+
+
+def generate_transactions(scale=0.1,
+                          seed=42,
+                          zipf_exponent=1.1,
+                          zipf_offset=80,
+                          mean_basket_size=18,
+                          n_groups=None,
+                          group_probability=0.35,
+                          noise_fraction=0.02,
+                          start_date='2010-12-01',
+                          end_date='2011-12-09'):
+    """
+    Générer un DataFrame de transactions reproduisant la forme d'Online Retail
+
+    Args:
+        scale: Facteur d'échelle (1.0 ≈ 26 000 factures, 4 000 produits)
+        seed: Graine aléatoire (même graine = mêmes données)
+        zipf_exponent, zipf_offset: Popularité Zipf-Mandelbrot p(k) ∝ 1/(k+offset)^s
+        mean_basket_size: Taille moyenne des paniers (distribution log-normale)
+        n_groups: Nombre de groupes d'items corrélés (≈ produits/40 par défaut)
+        group_probability: Probabilité qu'une facture contienne un groupe
+        noise_fraction: Part de lignes à nettoyer (annulations, valeurs manquantes...)
+        start_date, end_date: Période des factures
+
+    Returns:
+        DataFrame avec les colonnes InvoiceNo, StockCode, Description, Quantity,
+        InvoiceDate, UnitPrice, CustomerID, Country
+    """
+    rng = np.random.default_rng(seed)
+    n_invoices = max(50, int(BASE_INVOICES * scale))
+    n_products = max(50, int(BASE_PRODUCTS * min(1.0, scale ** 0.5)))
+    n_customers = max(20, int(BASE_CUSTOMERS * min(1.0, scale ** 0.5)))
+    if n_groups is None:
+        n_groups = max(5, n_products // 40)
+
+    stock_codes, descriptions, prices = _product_catalog(n_products, rng)
+
+    # Popularité Zipf-Mandelbrot
+    ranks = np.arange(1, n_products + 1)
+    popularity = 1.0 / (ranks + zipf_offset) ** zipf_exponent
+    popularity /= popularity.sum()
+
+    # Tailles de panier log-normales (queue lourde comme les grossistes du jeu réel)
+    sigma = 0.9
+    mu = np.log(mean_basket_size) - sigma ** 2 / 2
+    basket_sizes = np.clip(rng.lognormal(mu, sigma, n_invoices).astype(int), 1, 500)
+
+    invoice_idx = np.repeat(np.arange(n_invoices), basket_sizes)
+    product_idx = rng.choice(n_products, size=len(invoice_idx), p=popularity)
+
+    # Groupes d'items corrélés (ensembles achetés ensemble), tirés parmi les produits populaires
+    group_pool = max(n_groups * 3, n_products // 4)
+    groups = [
+        rng.choice(group_pool, size=rng.integers(2, 6), replace=False)
+        for _ in range(n_groups)
+    ]
+    group_weights = 1.0 / np.arange(1, n_groups + 1)
+    group_weights /= group_weights.sum()
+
+    with_group = np.flatnonzero(rng.random(n_invoices) < group_probability)
+    chosen_groups = rng.choice(n_groups, size=len(with_group), p=group_weights)
+    extra_invoices, extra_products = [], []
+    for inv, g in zip(with_group, chosen_groups):
+        members = groups[g][rng.random(len(groups[g])) < 0.8]
+        extra_invoices.append(np.full(len(members), inv))
+        extra_products.append(members)
+
+    if extra_invoices:
+        invoice_idx = np.concatenate([invoice_idx] + extra_invoices)
+        product_idx = np.concatenate([product_idx] + extra_products)
+
+    lines = pd.DataFrame({'invoice': invoice_idx, 'product': product_idx}).drop_duplicates()
+    lines = lines.sort_values(['invoice', 'product'], kind='stable').reset_index(drop=True)
+    n_lines = len(lines)
+
+    # Dates : saisonnalité (pic en novembre) et heures d'ouverture
+    start = pd.Timestamp(start_date)
+    span_days = (pd.Timestamp(end_date) - start).days + 1
+    day_offsets = np.arange(span_days)
+    month = (start + pd.to_timedelta(day_offsets, unit='D')).month.values
+    day_weights = np.where(month >= 9, 1.0 + 0.35 * (month - 8), 1.0)
+    day_weights /= day_weights.sum()
+    invoice_days = np.sort(rng.choice(span_days, size=n_invoices, p=day_weights))
+    invoice_seconds = rng.integers(8 * 3600, 20 * 3600, size=n_invoices)
+    invoice_dates = (
+        start
+        + pd.to_timedelta(invoice_days, unit='D')
+        + pd.to_timedelta(invoice_seconds, unit='s')
+    )
+
+    # Clients et pays (un pays par client)
+    country_names = np.array(list(COUNTRIES.keys()))
+    country_weights = np.array(list(COUNTRIES.values()))
+    country_weights /= country_weights.sum()
+    customer_countries = rng.choice(country_names, size=n_customers, p=country_weights)
+    invoice_customers = rng.integers(0, n_customers, size=n_invoices)
+    customer_ids = (12346 + invoice_customers).astype(float)
+    # ~25% de factures sans client identifié, comme dans le jeu réel
+    customer_ids[rng.random(n_invoices) < 0.25] = np.nan
+
+    inv = lines['invoice'].values
+    prod = lines['product'].values
+    df = pd.DataFrame({
+        'InvoiceNo': (536365 + inv).astype(str),
+        'StockCode': stock_codes[prod],
+        'Description': descriptions[prod].astype(object),
+        'Quantity': np.maximum(1, rng.geometric(0.12, size=n_lines)),
+        'InvoiceDate': invoice_dates[inv],
+        'UnitPrice': prices[prod],
+        'CustomerID': customer_ids[inv],
+        'Country': customer_countries[invoice_customers[inv]],
+    })
+
+    # Bruit à nettoyer : annulations, descriptions manquantes ou mal formatées, prix nuls
+    n_noise = int(n_lines * noise_fraction)
+    if n_noise:
+        noisy = rng.choice(n_lines, size=n_noise, replace=False)
+        kinds = rng.integers(0, 4, size=n_noise)
+        desc = df['Description'].values
+        qty = df['Quantity'].values
+        price = df['UnitPrice'].values
+        cancelled = noisy[kinds == 0]
+        df.loc[cancelled, 'InvoiceNo'] = 'C' + df.loc[cancelled, 'InvoiceNo']
+        qty[cancelled] = -qty[cancelled]
+        desc[noisy[kinds == 1]] = None
+        price[noisy[kinds == 2]] = 0.0
+        padded = noisy[kinds == 3]
+        desc[padded] = [f"  {d.lower()} " for d in desc[padded]]
+        df['Description'] = desc
+        df['Quantity'] = qty
+        df['UnitPrice'] = price
+
+    return df
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Générer des transactions synthétiques')
+    parser.add_argument('--scale', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='data/synthetic_retail.csv')
+    args = parser.parse_args()
+
+    df = generate_transactions(scale=args.scale, seed=args.seed)
+    df.to_csv(args.output, index=False)
+    print(f"✓ {len(df)} lignes ({df['InvoiceNo'].nunique()} factures) écrites dans {args.output}")
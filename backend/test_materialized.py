@@ -0,0 +1,61 @@
+"""
+Équivalence des recommandations matérialisées et de Recommender.recommend
+
+Règles issues de paniers aléatoires (confiances et lifts à égalité
+fréquents) ; chaque panier matérialisé, filtré par min_confidence et
+tronqué à top_n, doit donner exactement la sortie de recommend.
+"""
+import random
+
+import pandas as pd
+import pytest
+from mlxtend.frequent_patterns import association_rules
+
+from fptree import mine_frequent
+from materialized import materialize
+from recommender import Recommender
+from vocabulary import ItemVocabulary
+
+
+def random_model(seed, n_invoices=300, n_items=12, min_support=0.04):
+    """Itemsets et règles (identifiants d'items) triés comme FPGrowthEngine, et leur vocabulaire"""
+    rng = random.Random(seed)
+    names = [f'ITEM {i:02d}' for i in range(n_items)]
+    vocabulary = ItemVocabulary()
+    vocabulary.update(names)
+    ids = vocabulary.encode(names)
+    weights = [rng.uniform(0.05, 0.5) for _ in ids]
+    baskets = []
+    for _ in range(n_invoices):
+        basket = tuple(sorted(item for item, p in zip(ids, weights) if rng.random() < p))
+        if basket:
+            baskets.append((basket, 1))
+
+    mined = mine_frequent(baskets, min_support * len(baskets))
+    itemsets = pd.DataFrame({
+        'support': [count / len(baskets) for _, count in mined],
+        'itemsets': [frozenset(items) for items, _ in mined]
+    })
+    rules = association_rules(itemsets, metric='confidence', min_threshold=0.1)
+    rules = rules.sort_values(['confidence', 'lift'], ascending=False).reset_index(drop=True)
+    return itemsets, rules, vocabulary
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('workers', [1, 2])
+def test_materialized_matches_recommend(seed, workers):
+    itemsets, rules, vocabulary = random_model(seed)
+    recommender = Recommender(rules, vocabulary)
+    table = materialize(rules, itemsets, max_length=3, top_n=8, workers=workers)
+    assert table.report['complete']
+
+    rng = random.Random(seed)
+    for items in itemsets['itemsets']:
+        if len(items) > 3:
+            continue
+        top_n = rng.randint(1, 8)
+        min_confidence = rng.choice([0.0, 0.2, 0.5, 0.8])
+        pairs = table.get(list(items), top_n, min_confidence)
+        assert pairs is not None
+        names = vocabulary.decode(list(items))
+        assert recommender.format_recommendations(pairs) == recommender.recommend(names, top_n, min_confidence)
@@ -0,0 +1,62 @@
+"""
+Équivalence de l'extraction hors mémoire et de l'extraction en mémoire
+
+Paniers aléatoires (avec paniers répétés), budgets minuscules : plusieurs
+partitions déversées et plusieurs passes de comptage.
+"""
+import math
+import random
+from collections import Counter
+
+import pytest
+
+import out_of_core
+from fptree import mine_frequent
+from vocabulary import ItemVocabulary
+
+
+def _random_rows(seed, n_invoices=400, n_items=15):
+    rng = random.Random(seed)
+    items = [f'ITEM {i}' for i in range(n_items)]
+    # Probabilités >= 5 % : aucun item n'est écarté par MIN_ITEM_FRACTION
+    weights = [rng.uniform(0.05, 0.4) for _ in items]
+    common = [rng.sample(items, rng.randint(1, 4)) for _ in range(5)]
+    rows = []
+    for invoice in range(n_invoices):
+        if rng.random() < 0.3:
+            basket = set(rng.choice(common))
+        else:
+            basket = {item for item, p in zip(items, weights) if rng.random() < p} or {rng.choice(items)}
+        rows.extend((f'{invoice:06d}', item) for item in sorted(basket))
+    return rows
+
+
+def _in_memory(rows, vocabulary, min_support):
+    baskets = Counter()
+    for invoice in sorted({invoice for invoice, _ in rows}):
+        names = {item for number, item in rows if number == invoice}
+        baskets[tuple(sorted(vocabulary.encode(names)))] += 1
+    total = sum(baskets.values())
+    return {
+        frozenset(items): count / total
+        for items, count in mine_frequent(list(baskets.items()), math.ceil(min_support * total))
+    }
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('budget_bytes', [600, 4000, 1 << 20])
+def test_out_of_core_matches_in_memory(seed, budget_bytes, tmp_path):
+    rows = _random_rows(seed)
+    vocabulary = ItemVocabulary()
+    min_support = random.Random(seed).choice([0.02, 0.05, 0.1])
+
+    itemsets, report = out_of_core.mine_out_of_core(
+        lambda: iter(rows), vocabulary, min_support, budget_bytes=budget_bytes, spill_dir=str(tmp_path)
+    )
+
+    expected = _in_memory(rows, vocabulary, min_support)
+    assert dict(itemsets) == pytest.approx(expected)
+    assert len(itemsets) == len(expected)
+    if budget_bytes == 600:
+        assert report['partitions'] > 1
+        assert report['count_passes'] > 1
@@ -0,0 +1,226 @@
+"""
+Extraction sur fenêtre glissante de jours, avec décroissance exponentielle
+
+Les transactions sont résumées une seule fois par jour (InvoiceDate) :
+nombre de factures, supports des items et paniers identiques agrégés.
+Extraire les N derniers jours combine les résumés des partitions de la
+fenêtre ; faire glisser la fenêtre ajoute ou retire des partitions sans
+relire la table des transactions.
+"""
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from fptree import mine_frequent
+from vocabulary import ItemVocabulary, item_vocabulary
+
+
+class _DayPartition:
+    """Résumé des factures d'un jour"""
+    __slots__ = ('n_invoices', 'item_counts', 'baskets', 'invoices')
+
+    def __init__(self):
+        self.n_invoices = 0
+        self.item_counts = Counter()
+        # tuple trié d'identifiants d'items -> nombre de factures
+        self.baskets = Counter()
+        # Numéros des factures indexées (dédoublonnage), retirés avec la partition
+        self.invoices = set()
+
+    def add(self, invoice, basket):
+        self.invoices.add(invoice)
+        self.n_invoices += 1
+        self.item_counts.update(basket)
+        self.baskets[basket] += 1
+
+
+class TimeWindowIndex:
+    """Partitions journalières des transactions"""
+
+    def __init__(self, vocabulary=None):
+        self.partitions = {}
+        self.vocabulary = vocabulary if vocabulary is not None else ItemVocabulary()
+        # Limite de rétention du dernier evict_before : les jours antérieurs sont ignorés
+        self.retained_from = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.partitions)
+
+    def clear(self):
+        with self._lock:
+            self.partitions = {}
+            self.retained_from = None
+
+    def add_transactions(self, df):
+        """
+        Ajouter des lignes de transactions aux partitions de leur jour
+
+        Seuls les jours présents dans df sont touchés. Une facture déjà indexée
+        dans la partition de son jour est ignorée (rechargement partiel), de
+        même que les jours antérieurs à la limite de rétention.
+
+        Args:
+            df: DataFrame avec InvoiceNo, Description et InvoiceDate
+
+        Returns:
+            Nombre de factures ajoutées
+        """
+        if df is None or len(df) == 0:
+            return 0
+
+        descriptions = df['Description'].astype(str).str.strip().str.upper()
+        codes, names = pd.factorize(descriptions)
+        frame = pd.DataFrame({
+            'invoice': df['InvoiceNo'].astype(str).values,
+            'day': pd.to_datetime(df['InvoiceDate']).dt.normalize().values,
+            'code': codes
+        })
+        frame = frame[frame['code'] >= 0].drop_duplicates(['invoice', 'code'])
+        frame = frame.sort_values(['invoice', 'code'], kind='stable')
+
+        invoices = frame['invoice'].values
+        days = frame['day'].values
+        starts = np.flatnonzero(np.r_[True, invoices[1:] != invoices[:-1]])
+        ends = np.r_[starts[1:], len(invoices)]
+
+        self.vocabulary.update(names)
+        ids = self.vocabulary.encode_values(names)
+        items = ids[frame['code'].values]
+
+        added = 0
+        with self._lock:
+            for start, end in zip(starts, ends):
+                invoice = invoices[start]
+                # Une facture à cheval sur minuit reste dans son premier jour
+                day = pd.Timestamp(days[start])
+                if self.retained_from is not None and day < self.retained_from:
+                    continue
+                partition = self.partitions.get(day)
+                if partition is None:
+                    partition = self.partitions[day] = _DayPartition()
+                elif invoice in partition.invoices:
+                    continue
+                partition.add(invoice, tuple(sorted(items[start:end].tolist())))
+                added += 1
+
+        return added
+
+    def rebuild(self, df):
+        """Reconstruire toutes les partitions à partir des transactions"""
+        self.clear()
+        return self.add_transactions(df)
+
+    def evict_before(self, day):
+        """
+        Retirer les partitions antérieures à day (rétention), avec leurs numéros de facture
+
+        Returns:
+            Nombre de partitions retirées
+        """
+        day = pd.Timestamp(day).normalize()
+        with self._lock:
+            self.retained_from = max(day, self.retained_from) if self.retained_from is not None else day
+            old = [d for d in self.partitions if d < day]
+            for d in old:
+                del self.partitions[d]
+        return len(old)
+
+    def window_weights(self, days, end=None, half_life_days=None):
+        """
+        Poids des partitions de la fenêtre [end - days + 1, end]
+
+        Args:
+            days: Taille de la fenêtre en jours
+            end: Dernier jour inclus (par défaut le jour le plus récent indexé)
+            half_life_days: Demi-vie de la décroissance ; None pour des poids égaux
+
+        Returns:
+            (liste de (jour, partition, poids), premier jour, dernier jour)
+        """
+        if days <= 0:
+            raise ValueError("La taille de la fenêtre doit être un nombre de jours positif")
+        if half_life_days is not None and half_life_days <= 0:
+            raise ValueError("La demi-vie doit être positive")
+
+        with self._lock:
+            if not self.partitions:
+                raise ValueError("Aucune partition journalière : les données doivent être chargées d'abord")
+            end = pd.Timestamp(end).normalize() if end is not None else max(self.partitions)
+            start = end - pd.Timedelta(days=days - 1)
+            selected = sorted((d, p) for d, p in self.partitions.items() if start <= d <= end)
+
+        weighted = []
+        for day, partition in selected:
+            age = (end - day).days
+            weight = 0.5 ** (age / half_life_days) if half_life_days else 1.0
+            weighted.append((day, partition, weight))
+        return weighted, start, end
+
+    def mine(self, min_support, days, end=None, half_life_days=None, max_length=None):
+        """
+        Extraire les itemsets fréquents de la fenêtre
+
+        Le support d'un itemset est la somme pondérée des factures qui le
+        contiennent, rapportée au nombre pondéré de factures de la fenêtre.
+        Les supports d'items des partitions éliminent les items rares avant
+        la fusion des paniers.
+
+        Returns:
+            (liste de (frozenset d'identifiants d'items, support), résumé de la fenêtre)
+        """
+        weighted, start, end = self.window_weights(days, end, half_life_days)
+
+        total = sum(partition.n_invoices * weight for _, partition, weight in weighted)
+        summary = {
+            'start': start.strftime('%Y-%m-%d'),
+            'end': end.strftime('%Y-%m-%d'),
+            'days': days,
+            'half_life_days': half_life_days,
+            'partitions': len(weighted),
+            'invoices': sum(partition.n_invoices for _, partition, _ in weighted),
+            'weighted_invoices': round(total, 4)
+        }
+        if total == 0:
+            return [], summary
+
+        min_count = min_support * total
+        counts = Counter()
+        for _, partition, weight in weighted:
+            for item, count in partition.item_counts.items():
+                counts[item] += count * weight
+        frequent = {item for item, count in counts.items() if count >= min_count}
+
+        combined = Counter()
+        for _, partition, weight in weighted:
+            for basket, count in partition.baskets.items():
+                projected = tuple(item for item in basket if item in frequent)
+                if projected:
+                    combined[projected] += count * weight
+        summary['distinct_baskets'] = len(combined)
+
+        itemsets = [
+            (frozenset(items), count / total)
+            for items, count in mine_frequent(list(combined.items()), min_count, max_length)
+        ]
+        return itemsets, summary
+
+    def describe(self):
+        """Résumé des partitions indexées"""
+        with self._lock:
+            if not self.partitions:
+                return {'partitions': 0}
+            return {
+                'partitions': len(self.partitions),
+                'first_day': min(self.partitions).strftime('%Y-%m-%d'),
+                'last_day': max(self.partitions).strftime('%Y-%m-%d'),
+                'invoices': sum(p.n_invoices for p in self.partitions.values()),
+                'distinct_baskets': sum(len(p.baskets) for p in self.partitions.values()),
+                'items': len(self.vocabulary)
+            }
+
+
+# Instance globale
+time_window = TimeWindowIndex(item_vocabulary)
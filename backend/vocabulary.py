@@ -0,0 +1,130 @@
+"""
+Vocabulaire d'items partagé : correspondance stable nom de produit <-> identifiant entier
+
+Les identifiants sont attribués une fois pour toutes : un nouvel item reçoit
+le prochain identifiant libre et un item connu garde le sien. Chaque
+extension du vocabulaire crée une nouvelle version, persistée en JSON pour
+que les identifiants restent stables après un redémarrage.
+
+Les modules du pipeline (encodage des paniers, extraction, règles,
+recommandations) manipulent des identifiants ; les noms ne sont
+reconstitués qu'aux frontières (API, base de données).
+"""
+import json
+import os
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+_VERSION_FILE = re.compile(r'^items_v(\d+)\.json$')
+
+
+class ItemVocabulary:
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory: Dossier des versions persistées (None = en mémoire uniquement)
+        """
+        self.directory = directory
+        self.names = []
+        self.version = 0
+        self._ids = {}
+        self._index = pd.Index([], dtype=object)
+        self._lock = threading.Lock()
+
+        if directory and self.versions():
+            self.load()
+
+    def __len__(self):
+        return len(self.names)
+
+    def update(self, names):
+        """
+        Ajouter les noms inconnus (dans l'ordre trié, pour un résultat déterministe)
+
+        Returns:
+            Nombre d'items ajoutés
+        """
+        with self._lock:
+            new = sorted({str(name) for name in names} - self._ids.keys())
+            if not new:
+                return 0
+            for name in new:
+                self._ids[name] = len(self.names)
+                self.names.append(name)
+            self._index = pd.Index(self.names, dtype=object)
+            self.version += 1
+            if self.directory:
+                self._save()
+            return len(new)
+
+    def id_of(self, name):
+        """Identifiant d'un nom, ou None s'il est inconnu"""
+        return self._ids.get(name)
+
+    def encode(self, names):
+        """Identifiants des noms connus (les inconnus sont ignorés)"""
+        ids = self._ids
+        return [ids[name] for name in names if name in ids]
+
+    def encode_values(self, values):
+        """Encoder un tableau de noms en int32 (-1 pour les inconnus)"""
+        return self._index.get_indexer(pd.Index(values, dtype=object)).astype(np.int32)
+
+    def name_of(self, item_id):
+        return self.names[item_id]
+
+    def decode(self, ids):
+        """Noms d'une collection d'identifiants"""
+        names = self.names
+        return [names[i] for i in ids]
+
+    def versions(self):
+        """Versions persistées disponibles, par ordre croissant"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        matches = (_VERSION_FILE.match(name) for name in os.listdir(self.directory))
+        return sorted(int(m.group(1)) for m in matches if m)
+
+    def _path(self, version):
+        return os.path.join(self.directory, f'items_v{version}.json')
+
+    def _save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(self.version)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': self.version,
+                'created_at': datetime.now().isoformat(),
+                'items': self.names
+            }, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def load(self, version=None):
+        """Charger une version persistée (la plus récente par défaut)"""
+        if version is None:
+            versions = self.versions()
+            if not versions:
+                raise ValueError("Aucune version persistée du vocabulaire")
+            version = versions[-1]
+
+        with open(self._path(version), encoding='utf-8') as f:
+            data = json.load(f)
+
+        with self._lock:
+            self.names = list(data['items'])
+            self._ids = {name: i for i, name in enumerate(self.names)}
+            self._index = pd.Index(self.names, dtype=object)
+            self.version = data['version']
+        return self.version
+
+    def describe(self):
+        return {'version': self.version, 'items': len(self.names)}
+
+
+# Instance globale
+item_vocabulary = ItemVocabulary(directory=os.getenv('VOCABULARY_DIR', os.path.join('data', 'vocabulary')))